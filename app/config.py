@@ -34,6 +34,11 @@
 DONATE_URL = os_getenv('DONATE_URL')
 DEBUG = os_getenv('DEBUG', 'false').lower() == 'true'  # True only if 'True' passed
 
+# GRASPIL ANALYTICS (updates are sent in batches)
+GRASPIL_BUFFER_SIZE = int(os_getenv('GRASPIL_BUFFER_SIZE', 10_000))  # Updates above are dropped
+GRASPIL_FLUSH_INTERVAL = float(os_getenv('GRASPIL_FLUSH_INTERVAL', 5))  # Seconds, if a batch is not full earlier
+GRASPIL_SPOOL_MAX_BYTES = int(os_getenv('GRASPIL_SPOOL_MAX_BYTES', 50 * 1024 * 1024))
+
 # TG
 API_ID = os_environ['API_ID']
 API_HASH = os_environ['API_HASH']
@@ -45,9 +50,49 @@
 TG_POSTS_STORE_MANAGER = int(os_environ["TG_POSTS_STORE_MANAGER"])
 TG_POSTS_CHANNEL_LINK = os_environ["TG_POSTS_CHANNEL_LINK"]
 
-CREATE_PERSONAL_DEFAULT_COLLECTIONS = os_getenv('CREATE_PERSONAL_DEFAULT_COLLECTIONS', 'false', ).lower() == 'true'
-CREATE_PUBLIC_DEFAULT_COLLECTIONS = os_getenv('CREATE_PUBLIC_DEFAULT_COLLECTIONS', 'false', ).lower() == 'true'
+# SHARDING (python -m app --workers N): the supervisor receives updates and routes them to N worker processes
+WORKERS = int(os_getenv('WORKERS', 1))
+SHARD_ID = os_getenv('SHARD_ID')  # Set by the supervisor for every worker process, None if not sharded
+SHARDS_NUM = int(os_getenv('SHARDS_NUM', 1))  # Set by the supervisor too, the bot-wide rate limits are divided by it
+IS_MAIN_SHARD = SHARD_ID in (None, '0', )  # Owns the bot-wide data (inline data) and creates defaults on startup
+SHARD_SUFFIX = f'_shard_{SHARD_ID}' if SHARD_ID is not None else ''  # For files which can't be shared
+
+CREATE_PERSONAL_DEFAULT_COLLECTIONS = (
+        os_getenv('CREATE_PERSONAL_DEFAULT_COLLECTIONS', 'false', ).lower() == 'true' and IS_MAIN_SHARD
+)
+CREATE_PUBLIC_DEFAULT_COLLECTIONS = (
+        os_getenv('CREATE_PUBLIC_DEFAULT_COLLECTIONS', 'false', ).lower() == 'true' and IS_MAIN_SHARD
+)
 PERSISTENT = not DEBUG
+# pickle (single file, rewritten on every change) | postgres | sqlite (local file, for a single node)
+# The state of the pickle file is not moved to the postgres | sqlite storage, switching starts with the empty state
+PERSISTENCE_BACKEND = os_getenv('PERSISTENCE_BACKEND', 'pickle', )
+PERSISTENCE_BATCH_SIZE = int(os_getenv('PERSISTENCE_BATCH_SIZE', 500))  # Changed records per write
+# Idle users lose the rebuildable parts of user_data (model, connection, stale forms), rebuilt on the next update
+USER_DATA_IDLE_TTL = float(os_getenv('USER_DATA_IDLE_TTL', 30 * 60))  # Seconds without updates
+USER_DATA_MAX_HYDRATED = int(os_getenv('USER_DATA_MAX_HYDRATED', 10_000))  # Least recently active evicted above it
+USER_DATA_EVICTION_INTERVAL = float(os_getenv('USER_DATA_EVICTION_INTERVAL', 60))  # Seconds
+SHARE_POSTS_CHAT_CONCURRENCY = int(os_getenv('SHARE_POSTS_CHAT_CONCURRENCY', 4))  # Deletions of the old posts at once
+VOTE_KEYBOARDS_CACHE_SIZE = int(os_getenv('VOTE_KEYBOARDS_CACHE_SIZE', 10_000))  # Per keyboard kind, LRU
+# Results of the stored posts existence probes, the posts deleted through the bot are marked without a probe
+MESSAGES_EXISTENCE_TTL = float(os_getenv('MESSAGES_EXISTENCE_TTL', 60 * 60))  # Seconds
+MESSAGES_EXISTENCE_CACHE_SIZE = int(os_getenv('MESSAGES_EXISTENCE_CACHE_SIZE', 100_000))  # LRU
+# Outbound requests limits (Telegram flood limits), waiting requests are served by priority
+RATE_LIMIT_OVERALL = float(os_getenv('RATE_LIMIT_OVERALL', 30))  # Requests per second for the whole bot
+# Per second to a private chat, not limited if empty: the replies to the user (e.g. collection posts) go at once
+RATE_LIMIT_CHAT = float(os_getenv('RATE_LIMIT_CHAT')) if os_getenv('RATE_LIMIT_CHAT') else None
+RATE_LIMIT_CHAT_BURST = float(os_getenv('RATE_LIMIT_CHAT_BURST', 3))  # Sent at once to an idle private chat
+RATE_LIMIT_GROUP = float(os_getenv('RATE_LIMIT_GROUP', 20))  # Per minute to a group or a channel
+RATE_LIMIT_MAX_RETRIES = int(os_getenv('RATE_LIMIT_MAX_RETRIES', 10))  # On 429
+# Upload of the default collections posts to the store channel
+BOOTSTRAP_MESSAGES_PER_SECOND = float(os_getenv('BOOTSTRAP_MESSAGES_PER_SECOND', 1))  # Per chat limit of Telegram
+BOOTSTRAP_CONCURRENCY = int(os_getenv('BOOTSTRAP_CONCURRENCY', 4))  # Posts read and sent at once
+# Check of the stored photos file_ids (get_file), in the background after the start
+PHOTOS_VALIDATION_MAX_AGE = float(os_getenv('PHOTOS_VALIDATION_MAX_AGE', 24 * 60 * 60))  # Seconds, older are checked
+PHOTOS_VALIDATION_CONCURRENCY = int(os_getenv('PHOTOS_VALIDATION_CONCURRENCY', 8))  # get_file requests at once
+# Restore the inline data from the DB in the background after the start (main shard only)
+INLINE_WARM_START = os_getenv('INLINE_WARM_START', 'true', ).lower() == 'true' and IS_MAIN_SHARD
+INLINE_WARM_START_PAGE_SIZE = int(os_getenv('INLINE_WARM_START_PAGE_SIZE', 1000))  # Rows per fetch
 
 # PATHS
 PROJECT_ROOT_PATH = Path(f'{Path(__file__).parent.parent}')
@@ -61,9 +106,45 @@
 LOG_ERROR_FILEPATH = Path(f'{LOGS_PATH}/{LOG_ERROR_FILENAME}')
 LOG_KNOWN_EXCEPTIONS_FILEPATH = Path(f'{LOGS_PATH}/known_exceptions.log')
 
+# Batches not delivered to Graspil (the endpoint was unreachable), sent again later
+GRASPIL_SPOOL_PATH = Path(f'{PROJECT_ROOT_PATH}/graspil_spool{SHARD_SUFFIX}.jsonl')
 # This folder will contain pickled bot data (CH?) if bot unexpectedly stopped
-PICKLE_PATH = Path(f'{PROJECT_ROOT_PATH}/pickle_persistence.pkl')
+PICKLE_PATH = Path(f'{PROJECT_ROOT_PATH}/pickle_persistence{SHARD_SUFFIX}.pkl')
+PERSISTENCE_SQLITE_PATH = Path(f'{PROJECT_ROOT_PATH}/persistence{SHARD_SUFFIX}.sqlite3')
 DEFAULT_PHOTO_PATH = PROJECT_ROOT_PATH / 'app/assets/photos/default_photo.png'
 DONATE_IMAGE_PATH = PROJECT_ROOT_PATH / 'app/assets/photos/donate_qr.png'
 # https://docs.telethon.dev/en/stable/modules/client.html#telethon.client.telegramclient.TelegramClient
-TELETHON_AUTH_CACHE_PATH = PROJECT_ROOT_PATH / 'app/tg/telethon_auth_cache'
+TELETHON_AUTH_CACHE_PATH = PROJECT_ROOT_PATH / f'app/tg/telethon_auth_cache{SHARD_SUFFIX}'
+
+# WEBHOOK (python -m app --webhook)
+WEBHOOK_URL = os_getenv('WEBHOOK_URL')  # Public url of the bot without the path, e.g. https://example.com
+WEBHOOK_PATH = os_getenv('WEBHOOK_PATH', 'webhook', )
+WEBHOOK_LISTEN = os_getenv('WEBHOOK_LISTEN', '127.0.0.1', )  # Behind reverse proxy / load balancer
+WEBHOOK_PORT = int(os_getenv('WEBHOOK_PORT', 8443))
+# 1-256 chars: A-Z, a-z, 0-9, _ and -. Telegram sends it in the "X-Telegram-Bot-Api-Secret-Token" header
+WEBHOOK_SECRET_TOKEN = os_getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_MAX_CONNECTIONS = int(os_getenv('WEBHOOK_MAX_CONNECTIONS', 40))  # Parallel requests from Telegram
+# Received but not yet processed updates; if full - the request handling waits (Telegram will retry on timeout)
+UPDATE_QUEUE_MAXSIZE = int(os_getenv('UPDATE_QUEUE_MAXSIZE', 1000))
+
+# DB
+# psycopg2 - sync pool (rubik_core), queries run in the DB executor threads;
+# psycopg3 - additional native async pool for the app queries, awaited right on the event loop
+DB_BACKEND = os_getenv('DB_BACKEND', 'psycopg2', ).lower()
+DB_NAME = os_getenv('DB_NAME')
+DB_USER = os_getenv('DB_USER')
+DB_PASSWORD = os_getenv('DB_PASSWORD')
+DB_HOST = os_getenv('DB_HOST')
+DB_PORT = os_getenv('DB_PORT')
+DB_MAX_CONNECTIONS = int(os_getenv('DB_MAX_CONNECTIONS', 10))
+DB_ASYNC_MIN_CONNECTIONS = int(os_getenv('DB_ASYNC_MIN_CONNECTIONS', 2))  # Opened on startup (warm pool)
+
+# Updates of different users are processed concurrently, of the same user - sequentially.
+# Every update in progress may hold a pooled DB connection and the exhausted pool raises PoolError,
+# so the default is the pool size, set it higher only if the most of the updates don't touch the DB
+MAX_CONCURRENT_UPDATES = int(os_getenv('MAX_CONCURRENT_UPDATES', DB_MAX_CONNECTIONS))
+
+# DB EXECUTOR (blocking DB calls are run off the event loop in a bounded thread pool)
+DB_EXECUTOR_MAX_WORKERS = int(os_getenv('DB_EXECUTOR_MAX_WORKERS', 16))
+DB_EXECUTOR_MAX_QUEUE = int(os_getenv('DB_EXECUTOR_MAX_QUEUE', 256))  # Calls waiting for a free worker
+DB_EXECUTOR_TIMEOUT = float(os_getenv('DB_EXECUTOR_TIMEOUT', 10))  # Seconds, per call
@@ -0,0 +1,174 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import partial
+from enum import Enum
+
+from psycopg.conninfo import make_conninfo
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg_pool import AsyncConnectionPool
+from rubik_core.db.manager import Postgres, Params as DbParams
+
+from app.config import (
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_HOST,
+    DB_PORT,
+    DB_MAX_CONNECTIONS,
+    DB_ASYNC_MIN_CONNECTIONS,
+)
+from .executor import db_executor
+
+if TYPE_CHECKING:
+    from rubik_core.db.manager import connection_type
+
+
+class Backend(str, Enum):
+    PSYCOPG2 = 'psycopg2'
+    PSYCOPG3 = 'psycopg3'
+
+
+@dataclass(slots=True, )
+class AsyncParams:
+    """Async analog of DbParams, the connection is taken from the pool per query"""
+    pool: AsyncConnectionPool
+
+
+class AsyncPostgres:
+    pool: AsyncConnectionPool | None = None
+
+    @classmethod
+    async def init(
+            cls,
+            min_size: int = DB_ASYNC_MIN_CONNECTIONS,
+            max_size: int = DB_MAX_CONNECTIONS,
+            timeout: float = 30,
+    ) -> AsyncConnectionPool:
+        """Open the pool and wait until min_size connections are ready (warm pool)"""
+        if cls.pool is None:
+            cls.pool = AsyncConnectionPool(
+                conninfo=make_conninfo(
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                ),
+                min_size=min_size,
+                max_size=max_size,
+                open=False,  # Opening in the constructor is deprecated for the async pool
+                name='app_async',
+            )
+            await cls.pool.open(wait=True, timeout=timeout, )
+        return cls.pool
+
+    @classmethod
+    async def close(cls, ) -> None:
+        if cls.pool is not None:
+            await cls.pool.close()
+            cls.pool = None
+
+    @classmethod
+    def get_params(cls, ) -> AsyncParams:
+        return AsyncParams(pool=cls.pool, )
+
+    @staticmethod
+    async def create(statement: str, values: tuple | None, db_params: AsyncParams, ) -> None:
+        async with db_params.pool.connection() as connection:  # Commits on exit
+            await connection.execute(statement, values, )
+
+    @staticmethod
+    async def read(statement: str, values: tuple | None, db_params: AsyncParams, ) -> Any:
+        """Return the first column of the first row (like the sync Postgres.read) or None"""
+        async with db_params.pool.connection() as connection:
+            cursor = await connection.execute(statement, values, )
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    async def read_all(statement: str, values: tuple | None, db_params: AsyncParams, ) -> list[tuple]:
+        async with db_params.pool.connection() as connection:
+            cursor = await connection.execute(statement, values, )
+            return await cursor.fetchall()
+
+
+def read_all(statement: str, values: tuple | None, db_params: DbParams, ) -> list[tuple]:
+    """
+    Blocking, all the rows (the sync Postgres.read returns only the first value).
+    The transaction opened by the read is ended, so the connection isn't left idle in transaction,
+    an already opened transaction of the caller is left as is.
+    """
+    connection = db_params.connection
+    is_idle = connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(statement, values, )
+            return cursor.fetchall()
+    finally:
+        if is_idle:
+            connection.rollback()  # Nothing to commit after a read
+
+
+class Db:
+    """
+    Single async entry point for the app queries.
+    The backend is chosen by the type of passed params, so the callers are the same for both backends.
+    """
+
+    @staticmethod
+    @asynccontextmanager
+    async def get_connection() -> AsyncIterator[connection_type]:
+        """Own pooled psycopg2 connection for the blocking calls in the DB executor"""
+        connection = Postgres.connection_pool.getconn()
+        try:
+            yield connection
+        finally:  # Deferred if a timed out DB call still uses the connection
+            db_executor.release_connection(
+                connection=connection,
+                release=partial(Postgres.connection_pool.putconn, conn=connection, ),
+            )
+
+    @classmethod
+    @asynccontextmanager
+    async def get_params(cls, ) -> AsyncIterator[DbParams | AsyncParams]:
+        """For the queries outside of the updates (no context.db_params)"""
+        if AsyncPostgres.pool is not None:
+            yield AsyncPostgres.get_params()
+            return
+        async with cls.get_connection() as connection:
+            yield DbParams(connection=connection, )
+
+    @staticmethod
+    async def create(statement: str, values: tuple | None, db_params: DbParams | AsyncParams, ) -> None:
+        if isinstance(db_params, AsyncParams, ):
+            return await AsyncPostgres.create(statement=statement, values=values, db_params=db_params, )
+        return await db_executor.run(Postgres.create, statement=statement, values=values, db_params=db_params, )
+
+    @staticmethod
+    async def read(statement: str, values: tuple | None, db_params: DbParams | AsyncParams, ) -> Any:
+        if isinstance(db_params, AsyncParams, ):
+            return await AsyncPostgres.read(statement=statement, values=values, db_params=db_params, )
+        return await db_executor.run(Postgres.read, statement=statement, values=values, db_params=db_params, )
+
+    @staticmethod
+    async def read_all(statement: str, values: tuple | None, db_params: DbParams | AsyncParams, ) -> list[tuple]:
+        if isinstance(db_params, AsyncParams, ):
+            return await AsyncPostgres.read_all(statement=statement, values=values, db_params=db_params, )
+        return await db_executor.run(read_all, statement=statement, values=values, db_params=db_params, )
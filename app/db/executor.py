@@ -0,0 +1,201 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, TypeVar
+from asyncio import (
+    Semaphore as asyncio_Semaphore,
+    wait_for as asyncio_wait_for,
+    wrap_future as asyncio_wrap_future,
+    get_running_loop as asyncio_get_running_loop,
+    TimeoutError as asyncio_TimeoutError,
+)
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from threading import Lock
+from time import perf_counter
+
+from app.config import DB_EXECUTOR_MAX_WORKERS, DB_EXECUTOR_MAX_QUEUE, DB_EXECUTOR_TIMEOUT
+from app.entities.shared.exceptions import DbCallTimeout
+from app.metrics import registry as metrics_registry
+
+if TYPE_CHECKING:
+    from asyncio import AbstractEventLoop
+    from concurrent.futures import Future
+
+T = TypeVar('T')
+
+
+class DbExecutor:
+    """
+    Runs blocking (psycopg2) DB calls in a bounded thread pool, so the event loop is never blocked by the DB.
+    At most `max_workers` calls are executed at once and at most `max_queue` calls wait for a free worker,
+    the rest of the callers are suspended (backpressure) until a place in the queue is available.
+    Every call is limited by timeout (including the time spent in the queue).
+    A timed out call still uses its connection, so the connection is returned to the pool
+    (closed, its transaction state is unknown) only when the call finished, see release_connection.
+    """
+
+    @dataclass(slots=True, )
+    class Metrics:
+        submitted: int = 0
+        completed: int = 0
+        failed: int = 0
+        timed_out: int = 0  # Callers which stopped waiting, the call itself may still be running
+        waiting: int = 0  # Callers suspended cuz the queue is full
+        queued: int = 0  # Submitted to the pool but not started yet
+        running: int = 0
+        max_queue_depth: int = 0  # Peak of waiting + queued
+        busy_time: float = 0  # Total seconds spent by the workers
+        abandoned: int = 0  # Connections still used by the timed out calls
+
+        @property
+        def queue_depth(self, ) -> int:
+            return self.waiting + self.queued
+
+    def __init__(
+            self,
+            max_workers: int = DB_EXECUTOR_MAX_WORKERS,
+            max_queue: int = DB_EXECUTOR_MAX_QUEUE,
+            timeout: float = DB_EXECUTOR_TIMEOUT,
+            name: str = 'db_executor',
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.name = name
+        self.metrics = self.Metrics()
+        self._lock = Lock()  # Metrics are changed from the worker threads too
+        self._slots = asyncio_Semaphore(value=max_workers + max_queue, )
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name, )
+        self._abandoned: dict[int, int] = {}  # id(connection) -> number of the timed out calls still running
+        self._deferred: dict[int, Callable[..., None]] = {}  # id(connection) -> release
+
+    @staticmethod
+    def get_connection(func: Callable, kwargs: dict, ) -> object | None:
+        """The connection used by the call: passed directly, inside db_params or of the model (bound method)"""
+        if (connection := kwargs.get('connection', )) is not None:
+            return connection
+        if (connection := getattr(kwargs.get('db_params', ), 'connection', None, )) is not None:
+            return connection
+        return getattr(getattr(func, '__self__', None, ), 'connection', None, )
+
+    def release_connection(self, connection: object, release: Callable[..., None], ) -> None:
+        """
+        Call instead of the direct return of the connection to the pool (putconn).
+        If a timed out call still uses the connection, release(close=True) is called when the call finished,
+        otherwise the connection could be taken by the next update in the middle of the transaction.
+        """
+        with self._lock:
+            if id(connection) in self._abandoned:
+                self._deferred[id(connection)] = release
+                return
+        release()
+
+    def _abandon(self, connection: object, future: Future, ) -> None:
+        with self._lock:
+            self._abandoned[id(connection)] = self._abandoned.get(id(connection), 0, ) + 1
+            self.metrics.abandoned += 1
+        future.add_done_callback(lambda _: self._release_abandoned(connection=connection, ), )
+
+    def _release_abandoned(self, connection: object, ) -> None:
+        with self._lock:
+            self.metrics.abandoned -= 1
+            self._abandoned[id(connection)] -= 1
+            if self._abandoned[id(connection)]:
+                return
+            del self._abandoned[id(connection)]
+            release = self._deferred.pop(id(connection), None, )
+        if release is not None:
+            release(close=True, )
+
+    def get_metrics(self, ) -> dict[str, int | float]:
+        with self._lock:
+            return asdict(self.metrics) | {'queue_depth': self.metrics.queue_depth, }
+
+    def _update_max_queue_depth(self, ) -> None:
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self.metrics.queue_depth, )
+
+    def _call(self, func: Callable[..., T], args: tuple, kwargs: dict, ) -> T:
+        """Executed inside the worker thread"""
+        with self._lock:
+            self.metrics.queued -= 1
+            self.metrics.running += 1
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.metrics.running -= 1
+                self.metrics.busy_time += perf_counter() - start
+
+    def _on_done(self, future: Future, loop: AbstractEventLoop, ) -> None:
+        """Free the slot only when the thread really finished (not when the caller stopped waiting on timeout)"""
+        with self._lock:
+            if future.cancelled():  # Cancelled before start (timeout or shutdown), so _call was never executed
+                self.metrics.queued -= 1
+            elif future.exception() is not None:
+                self.metrics.failed += 1
+            else:
+                self.metrics.completed += 1
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._slots.release, )
+
+    async def _run(self, func: Callable[..., T], args: tuple, kwargs: dict, submitted: list[Future], ) -> T:
+        with self._lock:
+            self.metrics.waiting += 1
+            self._update_max_queue_depth()
+        try:
+            await self._slots.acquire()
+        finally:
+            with self._lock:
+                self.metrics.waiting -= 1
+        loop = asyncio_get_running_loop()
+        with self._lock:
+            self.metrics.queued += 1
+            self._update_max_queue_depth()
+        future = self._pool.submit(self._call, func, args, kwargs, )
+        submitted.append(future, )
+        future.add_done_callback(lambda f: self._on_done(future=f, loop=loop, ), )
+        return await asyncio_wrap_future(future, loop=loop, )
+
+    async def run(self, func: Callable[..., T], /, *args, timeout: float | None = None, **kwargs, ) -> T:
+        """
+        Run `func(*args, **kwargs)` in the pool and await the result.
+        On timeout the not started call is cancelled, the already started call can't be interrupted,
+        it will finish in background but the result will be dropped, its connection is kept until then.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self.metrics.submitted += 1
+        submitted = []
+        try:
+            return await asyncio_wait_for(
+                self._run(func=func, args=args, kwargs=kwargs, submitted=submitted, ),
+                timeout=timeout,
+            )
+        except asyncio_TimeoutError:
+            with self._lock:
+                self.metrics.timed_out += 1
+            if submitted and not submitted[0].done() and (connection := self.get_connection(func, kwargs, )):
+                self._abandon(connection=connection, future=submitted[0], )
+            raise DbCallTimeout(func=func, timeout=timeout, ) from None
+
+    def shutdown(self, wait: bool = True, ) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True, )
+
+
+db_executor = DbExecutor()
+metrics_registry.register(name=db_executor.name, source=db_executor.get_metrics, )
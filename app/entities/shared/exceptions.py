@@ -97,3 +97,9 @@ class DevException(Exception):
 
 class ConnectionNotPassed(DevException):
     pass
+
+
+class DbCallTimeout(UnexpectedException, TimeoutError, ):
+    def __init__(self, func: object, timeout: float, ):
+        name = getattr(func, '__qualname__', repr(func), )
+        super(DbCallTimeout, self).__init__(f'DB call {name} not finished in {timeout} seconds')
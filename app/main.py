@@ -1,15 +1,68 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+from argparse import ArgumentParser
+
+from app.config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    UPDATE_QUEUE_MAXSIZE,
+    WORKERS,
+)
 from app.postconfig import app_logger
 from app.tg.ptb import bot
 from app.tg.ptb.app import create_ptb_app
+from app.tg.ptb.sharding import Supervisor
+
+if TYPE_CHECKING:
+    from argparse import Namespace
+
+
+def parse_args(args: list[str] | None = None, ) -> Namespace:
+    parser = ArgumentParser(prog='python -m app', )
+    parser.add_argument('--webhook', action='store_true', help='Receive updates by webhook instead of polling', )
+    parser.add_argument('--listen', default=WEBHOOK_LISTEN, help='Webhook server address', )
+    parser.add_argument('--port', default=WEBHOOK_PORT, type=int, help='Webhook server port', )
+    parser.add_argument('--url', default=WEBHOOK_URL, help='Public url for Telegram, without the path', )
+    parser.add_argument('--secret-token', default=WEBHOOK_SECRET_TOKEN, )
+    parser.add_argument('--workers', default=WORKERS, type=int, help='Worker processes, updates sharded by user', )
+    result = parser.parse_args(args=args, )
+    if result.webhook and not (result.url and result.secret_token):  # Secret is mandatory, the port may be public
+        parser.error(message='--webhook requires the url and the secret token (WEBHOOK_URL, WEBHOOK_SECRET_TOKEN)', )
+    return result
+
+
+def get_webhook_kwargs(args: Namespace, ) -> dict[str, Any]:
+    return {
+        'listen': args.listen,
+        'port': args.port,
+        'url_path': WEBHOOK_PATH,
+        'webhook_url': f'{args.url.rstrip("/")}/{WEBHOOK_PATH}',
+        'secret_token': args.secret_token,  # Requests without the header are rejected with 403
+        'max_connections': WEBHOOK_MAX_CONNECTIONS,
+    }
 
 
-def main():
+def main(args: list[str] | None = None, ):
     """
     To run the code use python -m app
+    To receive updates by webhook use python -m app --webhook
+    To run N worker processes use python -m app --workers N (with or without --webhook)
     """
+    args = parse_args(args=args, )
     app_logger.info(msg='Main started', )
-    application = create_ptb_app(bot=bot, )
-    application.run_polling()  # Infinite blocking operation
+    webhook_kwargs = get_webhook_kwargs(args=args, ) if args.webhook else None
+    if args.workers > 1:
+        Supervisor(workers_num=args.workers, ).run(bot=bot, webhook_kwargs=webhook_kwargs, )  # Infinite blocking
+    elif webhook_kwargs:
+        application = create_ptb_app(bot=bot, update_queue_maxsize=UPDATE_QUEUE_MAXSIZE, )
+        application.run_webhook(**webhook_kwargs, )  # Infinite blocking operation
+    else:
+        application = create_ptb_app(bot=bot, )
+        application.run_polling()  # Infinite blocking operation
 
 
 if __name__ == '__main__':
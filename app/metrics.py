@@ -0,0 +1,42 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    pass
+
+
+class Registry:
+    """
+    Keeps named callables which return a flat dict of counters/gauges of some component.
+    Components register themselves on creation, the values are collected only on demand (admin cmd, logs).
+    """
+
+    def __init__(self, ):
+        self.sources: dict[str, Callable[[], dict[str, int | float]]] = {}
+
+    def register(self, name: str, source: Callable[[], dict[str, int | float]], ) -> None:
+        self.sources[name] = source
+
+    def unregister(self, name: str, ) -> None:
+        self.sources.pop(name, None, )
+
+    def collect(self, ) -> dict[str, dict[str, int | float]]:
+        return {name: source() for name, source in self.sources.items()}
+
+
+registry = Registry()
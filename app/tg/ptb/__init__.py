@@ -1,12 +1,40 @@
-from telegram.ext import ExtBot, AIORateLimiter
-from app.config import TG_BOT_TOKEN
+from app.config import (
+    TG_BOT_TOKEN,
+    RATE_LIMIT_OVERALL,
+    RATE_LIMIT_CHAT,
+    RATE_LIMIT_CHAT_BURST,
+    RATE_LIMIT_GROUP,
+    RATE_LIMIT_MAX_RETRIES,
+    SHARDS_NUM,
+    MESSAGES_EXISTENCE_TTL,
+    MESSAGES_EXISTENCE_CACHE_SIZE,
+)
+from app.metrics import registry as metrics_registry
+from custom_ptb.rate_limiter import PriorityRateLimiter
+from custom_ptb.bot import Bot, MessagesExistence
 from telegram.request import HTTPXRequest
 
 
-def create_bot() -> ExtBot:
-    result = ExtBot(
+def create_bot() -> Bot:
+    """
+    Every shard process has its own bot and limiter, so the limits shared by the shards (the overall one and
+    the groups/channels ones, e.g. the posts channel) are split between them. A private chat is served by one shard.
+    """
+    rate_limiter = PriorityRateLimiter(
+        overall_rate=RATE_LIMIT_OVERALL / SHARDS_NUM,
+        chat_rate=RATE_LIMIT_CHAT,
+        chat_burst=RATE_LIMIT_CHAT_BURST,
+        group_rate=RATE_LIMIT_GROUP / 60 / SHARDS_NUM,
+        group_burst=max(RATE_LIMIT_GROUP / SHARDS_NUM, 1, ),
+        max_retries=RATE_LIMIT_MAX_RETRIES,
+    )
+    metrics_registry.register(name='rate_limiter', source=rate_limiter.get_metrics, )
+    messages_existence = MessagesExistence(ttl=MESSAGES_EXISTENCE_TTL, max_size=MESSAGES_EXISTENCE_CACHE_SIZE, )
+    metrics_registry.register(name='messages_existence', source=messages_existence.get_metrics, )
+    result = Bot(
         token=TG_BOT_TOKEN,
-        rate_limiter=AIORateLimiter(max_retries=10, ),
+        rate_limiter=rate_limiter,
+        messages_existence=messages_existence,
         request=HTTPXRequest(connection_pool_size=512, read_timeout=10, write_timeout=10, ),
     )
     return result
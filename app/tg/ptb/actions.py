@@ -67,7 +67,7 @@ async def callback_to_post(
     else:
         raise UnknownPostType
 
-    post = post_cls.from_callback(callback=update.callback_query, connection=context.connection, )
+    post = await context.run_db(post_cls.from_callback, callback=update.callback_query, connection=context.connection, )
     if post is None:
         await context.view.posts.post_to_vote_not_found(tooltip=update.callback_query, )
         known_exceptions_logger.info(
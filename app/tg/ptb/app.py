@@ -14,13 +14,18 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Callable, Literal, Coroutine
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Literal
 from json import load as json_load  # Parse file
-from asyncio import sleep as asyncio_sleep
+from asyncio import (
+    Queue as asyncio_Queue,
+    Lock as asyncio_Lock,
+    gather as asyncio_gather,
+    to_thread as asyncio_to_thread,
+)
 
 from telegram.error import TelegramError
 from telegram.constants import ParseMode
-from telegram.ext import ExtBot, ContextTypes, Application, ApplicationBuilder, PicklePersistence
+from telegram.ext import ExtBot, ContextTypes, Application, ApplicationBuilder, PicklePersistence, BasePersistence
 
 from rubik_core.db import manager as db_manager
 from rubik_core.entities.mix.model import Photo as AppPhotoModel
@@ -30,16 +35,37 @@
 from ...config import (
     PROJECT_ROOT_PATH,
     PICKLE_PATH,
+    PERSISTENCE_BACKEND,
+    PERSISTENCE_BATCH_SIZE,
+    PERSISTENCE_SQLITE_PATH,
+    SHARD_SUFFIX,
+    IS_MAIN_SHARD,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_HOST,
+    DB_PORT,
     MAIN_ADMIN,
     LANGUAGE,
     CREATE_PUBLIC_DEFAULT_COLLECTIONS,
     CREATE_PERSONAL_DEFAULT_COLLECTIONS,
     DEBUG,
     PERSISTENT,
+    DB_BACKEND,
+    MAX_CONCURRENT_UPDATES,
+    INLINE_WARM_START,
+    USER_DATA_EVICTION_INTERVAL,
+    BOOTSTRAP_MESSAGES_PER_SECOND,
+    BOOTSTRAP_CONCURRENCY,
+    PHOTOS_VALIDATION_MAX_AGE,
 )
 from ...postconfig import httpx_client, app_logger  # To close on shutdown
+from ...db.executor import db_executor
+from ...db.async_manager import AsyncPostgres, Backend as DbBackend, Db
+from ...metrics import registry as metrics_registry
 
 from app.tg import telethon
+from custom_ptb.persistence import DbPersistence, PostgresStorage, SqliteStorage
 
 from .structures import CustomUserData, CustomBotData
 from .entities.post.constants import PostsChannels
@@ -49,17 +75,27 @@
 )
 from .entities.collection.services import Collection as CollectionService
 from .entities.mix.services import System as SystemService
+from .entities.vote.model import PublicVote, PersonalVote
 # Handlers
 from .entities.mix.handlers import error_handler as mix_error_handler
+from .entities.mix.analytics import graspil_exporter
 from .entities import available_handlers as entities_available_handlers
 from .store_manager import available_handlers as store_manager_available_handlers
 from .inline_mode import available_handlers as inline_mode_available_handlers
+from .inline_store import InlineStore
+from .assets import Assets
+from .photos_validator import PhotosValidator, photos_validator
+from .bootstrap import CollectionUploader, LocalCollection, Manifest, ManifestEntry, get_post_hash
+from .eviction import idle_users
 from custom_ptb.callback_context import CallbackContext
+from custom_ptb.update_processor import PerKeyUpdateProcessor
 
 if TYPE_CHECKING:
     from pathlib import PosixPath
+    from telegram import Message
     from app.sctructures import LocalPost
     from app.tg.entities.collection.model import ICollection
+    from app.tg.ptb.entities.post.model import IPublicPost, IPersonalPost
 
 COLLECTIONS_PATH: PosixPath = PROJECT_ROOT_PATH / 'app' / 'assets' / 'default_posts' / LANGUAGE
 
@@ -78,244 +114,362 @@ def collect_posts(path: PosixPath | str, ) -> list[tuple[PosixPath, dict]]:
     return collected_dir_posts
 
 
-async def get_food_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for posts_dir_path, post_data in collect_posts(path=COLLECTIONS_PATH / 'еда', ):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            photo=read_file_data(path=posts_dir_path / post_data['image']),
-            caption=post_data['text'],
-            disable_notification=True,
-        )
-        result.append(sent_message)
-    return result
+def build_food_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    return {'photo': read_file_data(path=post_dir_path / post_data['image']), 'caption': post_data['text'], }
 
 
-async def get_art_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'живопись'):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            caption=(
-                f'{post_data["title"]}, - {post_data["artist"]}, {post_data["year"]}.\n'
-                f'{post_data["description"]}\n'
-                f'{post_data["location"]}.'
-            ),
-            photo=read_file_data(path=post_dir_path / post_data['image']),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_art_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    return {
+        'caption': (
+            f'{post_data["title"]}, - {post_data["artist"]}, {post_data["year"]}.\n'
+            f'{post_data["description"]}\n'
+            f'{post_data["location"]}.'
+        ),
+        'photo': read_file_data(path=post_dir_path / post_data['image']),
+    }
 
 
-async def get_films_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'кино'):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            caption=f'{post_data["title"]}, {post_data["year"]}, {post_data["country"]}.\n',
-            photo=read_file_data(path=post_dir_path / post_data['image']),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_film_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    return {
+        'caption': f'{post_data["title"]}, {post_data["year"]}, {post_data["country"]}.\n',
+        'photo': read_file_data(path=post_dir_path / post_data['image']),
+    }
 
 
-async def get_persons_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'личности'):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            caption=read_file_data(path=post_dir_path / post_data['text'], mode='r', ),
-            photo=read_file_data(path=post_dir_path / post_data['image']),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_photo_with_text_file_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    """Persons and animals"""
+    return {
+        'caption': read_file_data(path=post_dir_path / post_data['text'], mode='r', ),
+        'photo': read_file_data(path=post_dir_path / post_data['image']),
+    }
 
 
-async def get_animals_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'животные'):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            caption=read_file_data(path=post_dir_path / post_data['text'], mode='r', ),
-            photo=read_file_data(path=post_dir_path / post_data['image']),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_meme_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    return {'photo': read_file_data(path=post_dir_path / post_data['image']), }
 
 
-async def get_memes_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'мемы'):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            photo=read_file_data(path=post_dir_path / post_data['image']),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_place_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    return {
+        'caption': (
+            f'{post_data["name"]} - {post_data["location"]}.\n'
+            f'{post_data["description"]}\n'
+            f'координаты: {post_data["coordinates"]["latitude"]}, {post_data["coordinates"]["longitude"]}.'
+        ),
+        'photo': read_file_data(path=post_dir_path / post_data['image']),
+    }
 
 
-async def get_places_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'места'):
-        sent_message = await bot.send_photo(
-            chat_id=PostsChannels.STORE.value,
-            caption=(
-                f'{post_data["name"]} - {post_data["location"]}.\n'
-                f'{post_data["description"]}\n'
-                f'координаты: {post_data["coordinates"]["latitude"]}, {post_data["coordinates"]["longitude"]}.'
-            ),
-            photo=read_file_data(path=post_dir_path / post_data['image']),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_music_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    return {
+        'text': (
+            f'{post_data["url"]}\n'
+            f'{post_data["title"]} - {post_data["band"]}.\n'
+            f'{post_data.get("album")}.\n'
+            f'{post_data["year"]}.\n'
+        ),
+    }
 
 
-async def get_music_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'музыка'):
-        sent_message = await bot.send_message(
-            chat_id=PostsChannels.STORE.value,
-            text=(
-                f'{post_data["url"]}\n'
-                f'{post_data["title"]} - {post_data["band"]}.\n'
-                f'{post_data.get("album")}.\n'
-                f'{post_data["year"]}.\n'
-            ),
-            disable_notification=True,
-        )
-        result.append(sent_message, )
-    return result
+def build_poem_post(post_dir_path: PosixPath, post_data: LocalPost, ) -> dict[str, Any]:
+    text = read_file_data(path=post_dir_path / post_data["текст"], mode="r", )
+    return {
+        'text': (  # TG requires escaping
+            f'<b>{post_data["название"]} - {post_data["автор"]}.</b>\n\n'
+            f'<blockquote>{text}</blockquote>\n\n'
+            f'{post_data["год"]}.'
+        ),
+        'parse_mode': ParseMode.HTML,
+    }
 
 
-async def get_poems_collection_posts(bot: ExtBot, ) -> list:
-    result = []
-    for post_dir_path, post_data in collect_posts(COLLECTIONS_PATH / 'стихи'):
+def get_local_collections() -> dict[str, LocalCollection]:
+    """Need for both, public and personal"""
+    # TODO make translations; just map between stored and created collections
+    return {
+        'еда': LocalCollection(method='send_photo', build=build_food_post, ),
+        'живопись': LocalCollection(method='send_photo', build=build_art_post, ),
+        'животные': LocalCollection(method='send_photo', build=build_photo_with_text_file_post, ),
+        'кино': LocalCollection(method='send_photo', build=build_film_post, ),
+        'личности': LocalCollection(method='send_photo', build=build_photo_with_text_file_post, ),
+        'мемы': LocalCollection(method='send_photo', build=build_meme_post, ),
+        'места': LocalCollection(method='send_photo', build=build_place_post, ),
+        'музыка': LocalCollection(method='send_message', build=build_music_post, ),
+        'стихи': LocalCollection(method='send_message', build=build_poem_post, ),
+    }
 
-        text = read_file_data(path=post_dir_path / post_data["текст"], mode="r", )
-        sent_message = await bot.send_message(
-            chat_id=PostsChannels.STORE.value,
-            text=(  # TG requires escaping
-                f'<b>{post_data["название"]} - {post_data["автор"]}.</b>\n\n'
-                f'<blockquote>{text}</blockquote>\n\n'
-                f'{post_data["год"]}.'
-            ),
-            parse_mode=ParseMode.HTML,
-            disable_notification=True,
-        )
-        result.append(sent_message, )
 
-    return result
+def create_uploader(bot: ExtBot, ) -> CollectionUploader:
+    return CollectionUploader(
+        bot=bot,
+        chat_id=PostsChannels.STORE.value,
+        messages_per_second=BOOTSTRAP_MESSAGES_PER_SECOND,
+        concurrency=BOOTSTRAP_CONCURRENCY,
+    )
 
 
-def get_create_collection_funcs() -> dict[str, Callable[[ExtBot], Coroutine[None, None, list]]]:
-    """Need for both, public and personal"""
-    # TODO make translations; just map between stored and created collections
+async def upload_collection(
+        uploader: CollectionUploader,
+        kind: str,
+        name: str,
+        collection: LocalCollection,
+        register: Callable[[Message], Awaitable[IPublicPost | IPersonalPost]],
+        attach: Callable[[str, list[IPublicPost | IPersonalPost]], Awaitable[ICollection]],
+) -> int:
+    """
+    Uploads the new and the changed posts of the collection only (by the manifest).
+    register: creates the post.
+    attach: adds the all uploaded posts to the collection at once (creates the collection if needed).
+    The manifest is saved after the attach, so a not attached post is uploaded again on the next start.
+    The uploaded posts are kept even if the upload failed, the error of the upload is raised anyway.
+    Returns the number of the uploaded posts.
+    """
+    posts = await asyncio_to_thread(collect_posts, COLLECTIONS_PATH / name, )
+    hashes = dict(zip(
+        (post_dir_path.name for post_dir_path, _ in posts),
+        await asyncio_gather(*(asyncio_to_thread(get_post_hash, post_dir_path, ) for post_dir_path, _ in posts)),
+    ))
+    stored = await Manifest.read(kind=kind, collection=name, )
+    pending = Manifest.get_pending(posts=posts, hashes=hashes, stored=stored, )
+    if pending:
+        app_logger.info(msg=f'Collection "{name}": {len(pending)} of {len(posts)} posts to upload.', )
+    uploaded = []
+
+    async def keep_uploaded() -> None:
+        if not uploaded:
+            return
+        await attach(name, [post for *_, post in uploaded], )
+        for post_dir_path, sent_message, post in uploaded:
+            await Manifest.save(
+                kind=kind,
+                collection=name,
+                entry=ManifestEntry(
+                    post_dir=post_dir_path.name,
+                    content_hash=hashes[post_dir_path.name],
+                    message_id=sent_message.message_id,
+                    post_id=post.id,
+                ),
+            )
+
+    try:
+        async for post_dir_path, sent_message in uploader.upload(collection=collection, posts=pending, ):
+            uploaded.append((post_dir_path, sent_message, await register(sent_message, ),), )
+    except BaseException:  # Cancellation too
+        try:
+            await keep_uploaded()
+        except Exception as e:  # Don't shadow the upload error
+            app_logger.error(msg=e, exc_info=True, )
+        raise
+    await keep_uploaded()
+    return len(pending)
+
+
+def get_default_collections(prefix: CollectionService.NamePrefix, ) -> dict[str, ICollection]:
+    """Local name -> the created default collection, the names are stored with the prefix"""
     return {
-        'еда': get_food_collection_posts,
-        'живопись': get_art_collection_posts,
-        'животные': get_animals_collection_posts,
-        'кино': get_films_collection_posts,
-        'личности': get_persons_collection_posts,
-        'мемы': get_memes_collection_posts,
-        'места': get_places_collection_posts,
-        'музыка': get_music_collection_posts,
-        'стихи': get_poems_collection_posts,
+        collection.name.removeprefix(prefix.value, ): collection
+        for collection in CollectionService.get_defaults(prefix=prefix, )
     }
 
 
-async def create_public_collections(bot: ExtBot, ) -> list[ICollection]:
+def add_default_posts(
+        collections: dict[str, ICollection],
+        name: str,
+        posts: list[IPublicPost | IPersonalPost],
+        prefix: CollectionService.NamePrefix,
+) -> ICollection:
+    """Blocking. Creates the default collection once, the next posts are added to the created one"""
+    if (collection := collections.get(name)) is None:
+        collection = collections[name] = CollectionService.create_default(name=name, posts=posts, prefix=prefix, )
+    else:  # Creates only the association of the posts with the existing collection (like the post form)
+        CollectionService.Mapper.Model.create(name=collection.name, posts=posts, author=collection.author, )
+    return collection
+
+
+async def upload_collections(
+        uploader: CollectionUploader,
+        prefix: CollectionService.NamePrefix,
+        register: Callable[[Message], Awaitable[IPublicPost | IPersonalPost]],
+        attach: Callable[[str, list[IPublicPost | IPersonalPost]], Awaitable[ICollection]],
+) -> None:
+    """
+    All the collections are uploaded at once (shared limit).
+    The collections created before the manifest (created but has no manifest entries) are not touched.
+    """
+    kind = prefix.name
+    local_collections = get_local_collections()
+    created_names = set(await db_executor.run(CollectionService.get_defaults_names, prefix=prefix, ), )
+    for name in created_names & local_collections.keys():
+        if not await Manifest.read(kind=kind, collection=name, ):
+            local_collections.pop(name, )
+    uploaded = await asyncio_gather(
+        *(
+            upload_collection(
+                uploader=uploader,
+                kind=kind,
+                name=name,
+                collection=collection,
+                register=register,
+                attach=attach,
+            )
+            for name, collection in local_collections.items()
+        ),
+    )
+    app_logger.info(
+        msg=(
+            f'{kind} collections: uploaded {sum(uploaded)} posts, {uploader.get_throughput():.2f} posts/s, '
+            f'retries: {uploader.retries}.'
+        ),
+    )
 
-    result = []
 
-    already_created_collection_names = CollectionService.get_defaults_names(
-        prefix=CollectionService.NamePrefix.PUBLIC,
-    )
-    local_collections = get_create_collection_funcs()
-    [local_collections.pop(name, None) for name in already_created_collection_names]
-    app_logger.info(msg=f'Collected collections: {", ".join(local_collections.keys()) or 0}.')
-    for collection_name, send_collection_func in local_collections.items():
-        created_collection_posts = []
-        for sent_message in await send_collection_func(bot=bot, ):  # Call here to a bit reduce flooding
-            post_form = PublicPostForm(
-                author=SystemService.user,
-                channel_id=PostsChannels.STORE.value,  # Or bot.id?
-                message=sent_message,  # New feature (online mode) requires full message
-                message_id=sent_message.message_id,
+async def create_public_collections(bot: ExtBot, ) -> list[ICollection]:
+    """Returns the new collections only, the resumed ones are restored to the inline data by the warm start"""
+    prefix = CollectionService.NamePrefix.PUBLIC
+    collections = await db_executor.run(get_default_collections, prefix=prefix, )
+    new_collections: dict[str, ICollection] = {}
+    bots_votes_lock = asyncio_Lock()
+
+    async def register(sent_message: Message, ) -> IPublicPost:
+        """Called concurrently, so every post is created with its own connection"""
+        async with Db.get_connection() as connection:
+            post = await db_executor.run(
+                PublicPostForm(
+                    author=SystemService.Mapper.User(id=SystemService.user.id, connection=connection, ),
+                    channel_id=PostsChannels.STORE.value,  # Or bot.id?
+                    message=sent_message,  # New feature (online mode) requires full message
+                    message_id=sent_message.message_id,
+                ).create,
             )
-            created_collection_posts.append(post_form.create(), )
-            await asyncio_sleep(delay=1, )  # To preserve limits for future and prevent possible flood limit.
-        SystemService.set_bots_votes_to_posts(posts=created_collection_posts, )
-        collection = CollectionService.create_default(
+        async with bots_votes_lock:  # The bots votes are created on the shared connection of the system
+            await db_executor.run(SystemService.set_bots_votes_to_posts, posts=[post], )
+        return post
+
+    async def attach(collection_name: str, posts: list[IPublicPost], ) -> ICollection:
+        is_new = collection_name not in collections
+        collection = await db_executor.run(
+            add_default_posts,
+            collections=collections,
             name=collection_name,
-            posts=created_collection_posts,
-            prefix=CollectionService.NamePrefix.PUBLIC,
+            posts=posts,
+            prefix=prefix,
         )
-        result.append(collection, )
+        if is_new:
+            collection.posts = posts
+            new_collections[collection_name] = collection
+        async with InlineStore.db.get_params() as db_params:  # To restore the inline data on the next start
+            for post in posts:
+                await InlineStore.save(post=post, db_params=db_params, collection_id=collection.id, )
+        return collection
+
+    await upload_collections(uploader=create_uploader(bot=bot, ), prefix=prefix, register=register, attach=attach, )
+    for name, collection in new_collections.items():
         app_logger.info(
             msg=(
-                f'Created collection "{collection_name}", {len(created_collection_posts)} posts, ids: '
-                f'{", ".join(str(post.id) for post in created_collection_posts)}.'
+                f'Created collection "{name}", {len(collection.posts)} posts, ids: '
+                f'{", ".join(str(post.id) for post in collection.posts)}.'
             )
         )
-    return result
+    return list(new_collections.values(), )
 
 
 async def create_personal_collections(bot: ExtBot, ) -> None:
-
-    already_created_collection_names = CollectionService.get_defaults_names(
-        prefix=CollectionService.NamePrefix.PERSONAL,
-    )
-    for collection_name, send_collection_func in get_create_collection_funcs().items():
-        if collection_name in already_created_collection_names:  # TODO need tests with a clear
-            continue
-        created_collection_posts = []
-        for sent_message in await send_collection_func(bot=bot, ):  # Call here to a bit reduce flooding
-            post_form = PersonalPostForm(
-                author=SystemService.user,
-                channel_id=PostsChannels.STORE.value,  # Or bot.id?
-                message_id=sent_message.message_id,
+    prefix = CollectionService.NamePrefix.PERSONAL
+    collections = await db_executor.run(get_default_collections, prefix=prefix, )
+    bots_votes_lock = asyncio_Lock()
+
+    async def register(sent_message: Message, ) -> IPersonalPost:
+        """Called concurrently, so every post is created with its own connection"""
+        async with Db.get_connection() as connection:
+            post = await db_executor.run(
+                PersonalPostForm(
+                    author=SystemService.Mapper.User(id=SystemService.user.id, connection=connection, ),
+                    channel_id=PostsChannels.STORE.value,  # Or bot.id?
+                    message_id=sent_message.message_id,
+                ).create,
             )
-            created_collection_posts.append(post_form.create(), )
-        SystemService.set_bots_votes_to_posts(posts=created_collection_posts, )
-        CollectionService.create_default(
+        async with bots_votes_lock:  # The bots votes are created on the shared connection of the system
+            await db_executor.run(SystemService.set_bots_votes_to_posts, posts=[post], )
+        return post
+
+    async def attach(collection_name: str, posts: list[IPersonalPost], ) -> ICollection:
+        return await db_executor.run(
+            add_default_posts,
+            collections=collections,
             name=collection_name,
-            posts=created_collection_posts,
-            prefix=CollectionService.NamePrefix.PERSONAL,
+            posts=posts,
+            prefix=prefix,
         )
-    return
 
+    await upload_collections(uploader=create_uploader(bot=bot, ), prefix=prefix, register=register, attach=attach, )
 
-async def create_bots_default_photos(bot: ExtBot, ):
+
+def get_bots_photos_dirs() -> dict[str, PosixPath]:
+    """Category (gender) -> dir with the photos"""
+    result = {}
     for gender in Gender:
-        try:
-            gender_photos = (PROJECT_ROOT_PATH / 'app' / 'assets' / 'photos' / 'bots' / gender.name.lower()).iterdir()
-        except FileNotFoundError:  # If no folder with a such gender
-            continue
-        already_created_photos = await validate_photos(
+        path = PROJECT_ROOT_PATH / 'app' / 'assets' / 'photos' / 'bots' / gender.name.lower()
+        if path.is_dir():  # If no folder with a such gender
+            result[gender.name.lower()] = path
+    return result
+
+
+async def upload_bots_photo(bot: ExtBot, category: str, path: PosixPath, ) -> None:
+    message = await bot.send_photo(chat_id=MAIN_ADMIN, photo=path, disable_notification=True, )
+    await db_executor.run(
+        AppPhotoModel.CRUD.create,
+        key=path.name,
+        category=category,
+        storage_type=AppPhotoModel.CRUD.StorageType.FILE_ID,
+        link=message.photo[-1].file_id,
+        connection=SystemService.connection,
+    )
+
+
+async def create_bots_default_photos(bot: ExtBot, ):
+    """
+    Uploads only the photos without the stored file_id, startup doesn't wait for the checks of the stored ones.
+    The stored file_ids are checked by revalidate_bots_photos_job.
+    """
+    for category, photos_dir in get_bots_photos_dirs().items():
+        already_created_photos = {
+            photo['key'] for photo in await db_executor.run(
+                AppPhotoModel.CRUD.read_many,
+                category=category,
+                connection=SystemService.connection,
+            )
+        }
+        for path in photos_dir.iterdir():
+            if path.name not in already_created_photos:
+                await upload_bots_photo(bot=bot, category=category, path=path, )
+
+
+async def revalidate_bots_photos(bot: ExtBot, ) -> int:
+    """Checks the stale file_ids (concurrently) and uploads again the rejected ones. Returns the number of them"""
+    result = 0
+    for category, photos_dir in get_bots_photos_dirs().items():
+        _, invalid_photos = await validate_photos(
             bot=bot,
-            photos=AppPhotoModel.CRUD.read_many(
-                category=gender.name.lower(),
+            photos=await db_executor.run(
+                AppPhotoModel.CRUD.read_many,
+                category=category,
                 connection=SystemService.connection,
             ),
-            return_type='validated',
+            return_type='all',
         )
-        already_created_photos = {photo['key'] for photo in already_created_photos}
-        for photo in gender_photos:
-            if photo.name not in already_created_photos:
-                message = await bot.send_photo(chat_id=MAIN_ADMIN, photo=photo, disable_notification=True, )
-                AppPhotoModel.CRUD.create(
-                    key=photo.name,
-                    category=gender.name.lower(),
-                    storage_type=AppPhotoModel.CRUD.StorageType.FILE_ID,
-                    link=message.photo[-1].file_id,
-                    connection=SystemService.connection,
-                )
+        for photo in invalid_photos:
+            if (path := photos_dir / photo['key']).is_file():  # Else the photo was removed from the assets
+                await upload_bots_photo(bot=bot, category=category, path=path, )
+                result += 1
+    return result
+
+
+async def revalidate_bots_photos_job(context: CallbackContext, ) -> None:
+    try:
+        replaced_num = await revalidate_bots_photos(bot=context.bot, )
+    except Exception as e:
+        app_logger.error(msg=e, exc_info=True, )
+        return
+    app_logger.info(msg=f'Bots photos revalidated, replaced: {replaced_num}, stats: {photos_validator.get_metrics()}.', )
 
 
 async def validate_photos(
@@ -323,21 +477,18 @@ async def validate_photos(
         photos: list[dict],
         return_type: Literal['all', 'validated', 'unvalidated'],
         raise_: bool = False,
+        max_age: float | None = None,
 ) -> tuple[list[dict], list[dict]] | list[dict]:
-    """Returns first validated photos, then missed photos"""
-    result = ([], [])  # First list is validated photos, second list is missed
-    for photo in photos:
-        try:
-            await bot.get_file(photo['link'])
-            result[0].append(photo)
-        except TelegramError as e:  # Invalid file_id
-            if raise_:
-                raise Exception(
-                    f'file id of photo with index {photo} was obsolete and need to be replaced\n'
-                    f'Try to use _set_cls_photos cls method to access new file ids\n'
-                    f'Original error: {e}'
-                )
-            result[1].append(photo)
+    """
+    Returns first validated photos, then missed photos.
+    The checks are concurrent, the photos validated less than max_age seconds ago are not checked.
+    """
+    result = await photos_validator.validate(bot=bot, photos=photos, max_age=max_age, )
+    if raise_ and result[1]:  # Invalid file_id
+        raise Exception(
+            f'file id of photo with index {result[1][0]} was obsolete and need to be replaced\n'
+            f'Try to use _set_cls_photos cls method to access new file ids'
+        )
     if return_type.lower() == 'validated':
         return result[0]
     elif return_type.lower() == 'unvalidated':
@@ -361,12 +512,20 @@ async def configure_app(
         create_personal_default_collections: bool,
 ) -> None:  # Pass the class directly?
     db_manager.Postgres.init()
+    if DB_BACKEND == DbBackend.PSYCOPG3:
+        await AsyncPostgres.init()  # Warm the pool before the first update
+    await InlineStore.create_table()
+    await Assets.create_table()
+    await Manifest.create_table()
+    await PhotosValidator.create_table()
+    await PublicVote.check_schema()
+    await PersonalVote.check_schema()
     await telethon.initialize_client()
     await create_bots_default_photos(bot=bot, )
     await check_is_bot_has_access_to_posts_store(bot=bot, )
     if create_public_default_collections is True:
         created_collections = await create_public_collections(bot=bot, )
-        bot_data.inline_data.collections.extend(created_collections)  # Fill inline_data.
+        bot_data.inline_data.add_collections(collections=created_collections, )  # Fill inline_data.
     if create_personal_default_collections is True:
         await create_personal_collections(bot=bot, )
 
@@ -380,33 +539,84 @@ async def post_init(application: Application, ):
         create_public_default_collections=CREATE_PERSONAL_DEFAULT_COLLECTIONS,
         create_personal_default_collections=CREATE_PUBLIC_DEFAULT_COLLECTIONS,
     )
-    print(await application.bot.get_me())
+    graspil_exporter.start()
+    if INLINE_WARM_START:  # The job queue starts after the updater, so loading doesn't delay receiving updates
+        application.job_queue.run_once(callback=InlineStore.warm_start_job, when=0, name=InlineStore.CURSOR_NAME, )
+    if IS_MAIN_SHARD:  # The photos are shared by the shards
+        application.job_queue.run_repeating(  # The first right after the start
+            callback=revalidate_bots_photos_job,
+            interval=PHOTOS_VALIDATION_MAX_AGE,
+            first=0,
+            name='bots_photos_revalidation',
+        )
+    application.job_queue.run_repeating(
+        callback=idle_users.evict_job,
+        interval=USER_DATA_EVICTION_INTERVAL,
+        name='idle_users_eviction',
+    )
+    app_logger.info(msg=f'Post init finished, bot: {await application.bot.get_me()}', )
 
 
 async def post_shutdown(app: Application, ):
+    if isinstance(app.persistence, DbPersistence, ):  # Already flushed by the application shutdown
+        await app.persistence.close()
     await telethon.shutdown_client()
+    await graspil_exporter.stop()  # Before the client closing
     await httpx_client.aclose()
+    db_executor.shutdown(wait=True, )  # Let already started DB calls to finish before closing the connections
+    await AsyncPostgres.close()
     if getattr(db_manager.Postgres, 'connection_pool', False, ):  # not exists if DB not initialized
         db_manager.Postgres.connection_pool.closeall()
 
 
-def create_ptb_app_bone(bot: ExtBot, ) -> Application:
+def create_persistence(context_types: ContextTypes, ) -> BasePersistence:
+    if PERSISTENCE_BACKEND == 'pickle':
+        return PicklePersistence(filepath=PICKLE_PATH, context_types=context_types, )
+    if PICKLE_PATH.exists():
+        app_logger.warning(
+            msg=f'{PICKLE_PATH} exists but the {PERSISTENCE_BACKEND} persistence is used, its state is not loaded.',
+        )
+    if PERSISTENCE_BACKEND == 'sqlite':
+        storage = SqliteStorage(path=str(PERSISTENCE_SQLITE_PATH), )  # The file is per shard already
+    else:
+        storage = PostgresStorage(
+            connection_kwargs={
+                'dbname': DB_NAME, 'user': DB_USER, 'password': DB_PASSWORD, 'host': DB_HOST, 'port': DB_PORT,
+            },
+            namespace=SHARD_SUFFIX,
+        )
+    persistence = DbPersistence(
+        storage=storage,
+        context_types=context_types,
+        batch_size=PERSISTENCE_BATCH_SIZE,
+        transient_user_fields=('connection', 'view', 'model',),  # Rebuilt for every update
+    )
+    metrics_registry.register(name='persistence', source=persistence.get_metrics, )
+    return persistence
+
+
+def create_ptb_app_bone(bot: ExtBot, update_queue_maxsize: int = 0, ) -> Application:
+    """update_queue_maxsize: 0 - unbounded, otherwise receiving of new updates waits for a free place"""
     context_types = ContextTypes(
         context=CallbackContext,
         user_data=CustomUserData,
         bot_data=CustomBotData,
     )
+    update_processor = PerKeyUpdateProcessor(max_concurrent_updates=MAX_CONCURRENT_UPDATES, )
+    metrics_registry.register(name='update_processor', source=update_processor.get_metrics, )
     application = (
         ApplicationBuilder()
         .bot(bot=bot, )
         .post_init(post_init=post_init, )
         .post_shutdown(post_shutdown=post_shutdown)
         .context_types(context_types=context_types, )
+        .update_queue(update_queue=asyncio_Queue(maxsize=update_queue_maxsize, ), )
+        .concurrent_updates(concurrent_updates=update_processor, )
         # # .read_timeout()
         # .write_timeout()
     )
     if PERSISTENT:
-        application.persistence(persistence=PicklePersistence(filepath=PICKLE_PATH, context_types=context_types), )
+        application.persistence(persistence=create_persistence(context_types=context_types, ), )
     application = application.build()
     app_logger.info(msg='PTB app bone created', )
     return application
@@ -416,8 +626,9 @@ def create_ptb_app(
         bot: ExtBot,
         handlers: list | tuple | dict | None = None,
         error_handler: Callable | None = None,
+        update_queue_maxsize: int = 0,
 ) -> Application:
-    application = create_ptb_app_bone(bot=bot, )
+    application = create_ptb_app_bone(bot=bot, update_queue_maxsize=update_queue_maxsize, )
     if handlers:
         application.add_handlers(handlers=handlers, )
     else:
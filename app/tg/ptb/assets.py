@@ -0,0 +1,139 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Local files (default photo, donate QR) are uploaded to Telegram once,
+the file_id is saved by the content hash and the next sends are made by the file_id.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Awaitable, Callable, Sequence
+from asyncio import to_thread as asyncio_to_thread
+from dataclasses import dataclass
+from hashlib import sha256
+from logging import getLogger
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from app.config import LOGS_PATH
+from app.postconfig import setup_logger
+from app.db.async_manager import Db
+from app.metrics import registry as metrics_registry
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+Sent = Message | Sequence[Message]  # send_photo or send_media_group result
+
+
+class Assets:
+
+    db = Db
+
+    @dataclass
+    class SQLS:
+        CREATE_TABLE = (
+            'CREATE TABLE IF NOT EXISTS ASSET_FILE_IDS ('
+            'content_hash TEXT PRIMARY KEY, '  # sha256 of the file
+            'file_id TEXT NOT NULL)'
+        )
+        CREATE = (
+            'INSERT INTO ASSET_FILE_IDS (content_hash, file_id) VALUES (%s, %s) '
+            'ON CONFLICT (content_hash) DO UPDATE SET file_id = EXCLUDED.file_id'
+        )
+        READ = 'SELECT file_id FROM ASSET_FILE_IDS WHERE content_hash = %s'
+
+    def __init__(self, ):
+        self.hashes: dict[Path, str] = {}  # The files are not changed while running
+        self.file_ids: dict[str, str] = {}  # Content hash -> file_id
+        self.uploads = 0
+        self.rejected = 0
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return {'file_ids': len(self.file_ids), 'uploads': self.uploads, 'rejected': self.rejected, }
+
+    @classmethod
+    async def create_table(cls, ) -> None:
+        async with cls.db.get_params() as db_params:
+            await cls.db.create(statement=cls.SQLS.CREATE_TABLE, values=None, db_params=db_params, )
+
+    @staticmethod
+    def extract_file_id(sent: Sent, ) -> str:
+        message = sent if isinstance(sent, Message, ) else sent[0]
+        attachment = message.effective_attachment
+        if isinstance(attachment, Sequence, ):  # Photo sizes, the last is the original
+            attachment = attachment[-1]
+        return attachment.file_id
+
+    @staticmethod
+    def check_is_file_id_error(error: BadRequest, ) -> bool:
+        """Like "Wrong file identifier/http url specified", "Wrong remote file identifier specified" """
+        return 'file' in error.message.lower()
+
+    async def get_hash(self, path: Path, ) -> str:
+        if (content_hash := self.hashes.get(path)) is None:
+            content_hash = self.hashes[path] = sha256(await asyncio_to_thread(path.read_bytes, ), ).hexdigest()
+        return content_hash
+
+    async def get_file_id(self, content_hash: str, ) -> str | None:
+        if (file_id := self.file_ids.get(content_hash)) is None:
+            try:
+                async with self.db.get_params() as db_params:
+                    file_id = await self.db.read(
+                        statement=self.SQLS.READ,
+                        values=(content_hash,),
+                        db_params=db_params,
+                    )
+            except Exception as e:  # The file will be uploaded
+                logger.error(msg=e, exc_info=True, )
+                return None
+            if file_id is not None:
+                self.file_ids[content_hash] = file_id
+        return file_id
+
+    async def save_file_id(self, content_hash: str, file_id: str, ) -> None:
+        self.file_ids[content_hash] = file_id
+        try:
+            async with self.db.get_params() as db_params:
+                await self.db.create(statement=self.SQLS.CREATE, values=(content_hash, file_id,), db_params=db_params, )
+        except Exception as e:  # Kept in the memory anyway
+            logger.error(msg=e, exc_info=True, )
+
+    async def send(self, path: Path, send: Callable[[str | bytes], Awaitable[Sent]], ) -> Sent:
+        """
+        send: sends the passed file_id or file content and returns the sent message(s), e.g.
+        lambda photo: bot.send_photo(chat_id=1, photo=photo, )
+        """
+        content_hash = await self.get_hash(path=path, )
+        if (file_id := await self.get_file_id(content_hash=content_hash, )) is not None:
+            try:
+                return await send(file_id, )
+            except BadRequest as e:
+                if not self.check_is_file_id_error(error=e, ):
+                    raise
+                logger.warning(msg=f'file_id of {path.name} rejected, uploading again: {e.message}', )
+                self.file_ids.pop(content_hash, None, )
+                self.rejected += 1
+        sent = await send(await asyncio_to_thread(path.read_bytes, ), )
+        self.uploads += 1
+        await self.save_file_id(content_hash=content_hash, file_id=self.extract_file_id(sent=sent, ), )
+        return sent
+
+
+assets = Assets()
+metrics_registry.register(name='assets', source=assets.get_metrics, )
@@ -0,0 +1,218 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Upload of the default collections posts.
+The files are read in the threads, the posts are sent concurrently, but not faster than the chat limit allows.
+Every uploaded post is recorded in the manifest (content hash of the post dir -> message_id, post_id),
+so the next start uploads only the new or changed posts and an interrupted upload is resumed.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable
+from asyncio import (
+    ensure_future as asyncio_ensure_future,
+    gather as asyncio_gather,
+    to_thread as asyncio_to_thread,
+    Semaphore as asyncio_Semaphore,
+)
+from dataclasses import dataclass
+from hashlib import sha256
+from logging import getLogger
+from time import monotonic
+
+from telegram.error import RetryAfter
+
+from app.config import LOGS_PATH
+from app.postconfig import setup_logger
+from app.db.async_manager import Db
+from custom_ptb.rate_limiter import Priority, TokenBucket
+
+if TYPE_CHECKING:
+    from pathlib import PosixPath
+    from telegram import Message
+    from telegram.ext import ExtBot
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+
+@dataclass(slots=True, )
+class LocalCollection:
+    method: str  # Bot method to send a post, "send_photo", "send_message"
+    build: Callable[[PosixPath, dict], dict[str, Any]]  # Blocking (reads files), returns the method kwargs
+
+
+@dataclass(slots=True, frozen=True, )
+class ManifestEntry:
+    post_dir: str  # Name of the post dir inside the collection dir
+    content_hash: str
+    message_id: int  # In the store channel
+    post_id: int
+
+
+def get_post_hash(post_dir_path: PosixPath, ) -> str:
+    """Blocking. sha256 of the all files of the post dir (names and content), any change gives a new hash"""
+    result = sha256()
+    for path in sorted(path for path in post_dir_path.rglob('*') if path.is_file()):
+        result.update(str(path.relative_to(post_dir_path, )).encode(), )
+        result.update(b'\0', )
+        result.update(path.read_bytes(), )
+        result.update(b'\0', )
+    return result.hexdigest()
+
+
+class Manifest:
+
+    db = Db
+
+    @dataclass
+    class SQLS:
+        CREATE_TABLE = (
+            'CREATE TABLE IF NOT EXISTS BOOTSTRAP_MANIFEST ('
+            'kind TEXT NOT NULL, '  # Public or personal collections
+            'collection TEXT NOT NULL, '
+            'post_dir TEXT NOT NULL, '
+            'content_hash TEXT NOT NULL, '
+            'message_id BIGINT NOT NULL, '
+            'post_id BIGINT NOT NULL, '
+            'PRIMARY KEY (kind, collection, post_dir))'
+        )
+        UPSERT = (
+            'INSERT INTO BOOTSTRAP_MANIFEST (kind, collection, post_dir, content_hash, message_id, post_id) '
+            'VALUES (%s, %s, %s, %s, %s, %s) '
+            'ON CONFLICT (kind, collection, post_dir) DO UPDATE SET '
+            'content_hash = EXCLUDED.content_hash, message_id = EXCLUDED.message_id, post_id = EXCLUDED.post_id'
+        )
+        READ_COLLECTION = (
+            'SELECT post_dir, content_hash, message_id, post_id FROM BOOTSTRAP_MANIFEST '
+            'WHERE kind = %s AND collection = %s'
+        )
+
+    @classmethod
+    async def create_table(cls, ) -> None:
+        async with cls.db.get_params() as db_params:
+            await cls.db.create(statement=cls.SQLS.CREATE_TABLE, values=None, db_params=db_params, )
+
+    @classmethod
+    async def read(cls, kind: str, collection: str, ) -> dict[str, ManifestEntry]:
+        """Post dir name -> entry"""
+        async with cls.db.get_params() as db_params:
+            rows = await cls.db.read_all(
+                statement=cls.SQLS.READ_COLLECTION,
+                values=(kind, collection,),
+                db_params=db_params,
+            )
+        return {row[0]: ManifestEntry(*row, ) for row in rows}
+
+    @classmethod
+    async def save(cls, kind: str, collection: str, entry: ManifestEntry, ) -> None:
+        """After the post is added to the collection, otherwise the post would be skipped on the next start"""
+        async with cls.db.get_params() as db_params:
+            await cls.db.create(
+                statement=cls.SQLS.UPSERT,
+                values=(kind, collection, entry.post_dir, entry.content_hash, entry.message_id, entry.post_id,),
+                db_params=db_params,
+            )
+
+    @staticmethod
+    def get_pending(
+            posts: list[tuple[PosixPath, dict]],
+            hashes: dict[str, str],
+            stored: dict[str, ManifestEntry],
+    ) -> list[tuple[PosixPath, dict]]:
+        """The new and the changed posts, in the order of the passed posts"""
+        return [
+            (post_dir_path, post_data, ) for post_dir_path, post_data in posts
+            if (entry := stored.get(post_dir_path.name)) is None or entry.content_hash != hashes[post_dir_path.name]
+        ]
+
+
+class CollectionUploader:
+
+    PROGRESS_EVERY = 10  # Posts
+    MAX_RETRIES = 5  # Per post
+
+    def __init__(self, bot: ExtBot, chat_id: int, messages_per_second: float, concurrency: int, ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(rate=messages_per_second, capacity=1, )  # Even pace, no bursts to the channel
+        self.semaphore = asyncio_Semaphore(value=concurrency, )
+        self.total = 0
+        self.uploaded = 0
+        self.retries = 0
+        self.started_at: float | None = None
+
+    def get_throughput(self, ) -> float:
+        """Posts per second"""
+        return self.uploaded / max(monotonic() - (self.started_at or monotonic()), 1e-9, )
+
+    def report_progress(self, ) -> None:
+        if self.uploaded % self.PROGRESS_EVERY == 0 or self.uploaded == self.total:
+            logger.info(
+                msg=(
+                    f'Uploaded {self.uploaded}/{self.total} posts, '
+                    f'{self.get_throughput():.2f} posts/s, retries after 429: {self.retries}.'
+                )
+            )
+
+    async def send(self, method: str, kwargs: dict[str, Any], ) -> Message:
+        for attempt in range(self.MAX_RETRIES + 1, ):
+            await self.bucket.acquire()
+            try:
+                return await getattr(self.bot, method, )(
+                    chat_id=self.chat_id,
+                    disable_notification=True,
+                    rate_limit_args=Priority.BULK,  # Interactive replies go first
+                    **kwargs,
+                )
+            except RetryAfter as e:  # All the senders wait, the chat limit is shared
+                if attempt == self.MAX_RETRIES:
+                    raise
+                self.retries += 1
+                logger.warning(msg=f'Flood limit, retry after {e.retry_after} s.', )
+                self.bucket.pause(seconds=e.retry_after, )
+
+    async def upload_post(self, collection: LocalCollection, post_dir_path: PosixPath, post_data: dict, ) -> Message:
+        async with self.semaphore:  # Limits the read files in the memory too
+            kwargs = await asyncio_to_thread(collection.build, post_dir_path, post_data, )
+            sent_message = await self.send(method=collection.method, kwargs=kwargs, )
+        self.uploaded += 1
+        self.report_progress()
+        return sent_message
+
+    async def upload(
+            self,
+            collection: LocalCollection,
+            posts: list[tuple[PosixPath, dict]],
+    ) -> AsyncIterator[tuple[PosixPath, Message]]:
+        """
+        The posts are sent concurrently but yielded in their order, each one as soon as it and the previous are sent,
+        so the caller can record the progress post by post.
+        """
+        self.started_at = self.started_at or monotonic()
+        self.total += len(posts)
+        tasks = [
+            asyncio_ensure_future(
+                self.upload_post(collection=collection, post_dir_path=post_dir_path, post_data=post_data, ),
+            )
+            for post_dir_path, post_data in posts
+        ]
+        try:
+            for (post_dir_path, _), task in zip(posts, tasks, ):
+                yield post_dir_path, await task
+        finally:  # On an error or if the caller stopped, not sent yet posts will be sent on the next start
+            for task in tasks:
+                task.cancel()
+            await asyncio_gather(*tasks, return_exceptions=True, )  # Retrieve the errors of the other posts
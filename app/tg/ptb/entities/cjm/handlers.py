@@ -36,7 +36,10 @@ async def start_cmd(_: Update, context: CallbackContext, ):
 
 
 async def public_mode_cmd(_: Update, context: CallbackContext, ):
-    default_collections = CollectionService.get_defaults(prefix=CollectionService.NamePrefix.PUBLIC, )
+    default_collections = await context.run_db(
+        CollectionService.get_defaults,
+        prefix=CollectionService.NamePrefix.PUBLIC,
+    )
     await context.view.cjm.public_mode_show_collections(collections=default_collections, )
     return 0
 
@@ -58,8 +61,11 @@ def extract(cls, cbk_data: str, ) -> int:
 
     @staticmethod
     async def entry_point(_: Update, context: CallbackContext, ):
-        default_collections = CollectionService.get_defaults(prefix=CollectionService.NamePrefix.PERSONAL, )
-        collections = default_collections + context.user.get_collections()
+        default_collections = await context.run_db(
+            CollectionService.get_defaults,
+            prefix=CollectionService.NamePrefix.PERSONAL,
+        )
+        collections = default_collections + await context.run_db(context.user.get_collections, )
         sent_message = await context.view.cjm.personal_mode_show_collections(collections=collections, )
         await context.view.notify_ready_keyword()
         context.user_data.tmp_data.collections_to_share = context.user_data.tmp_data.CollectionsToShare(
@@ -77,11 +83,12 @@ async def show_collection_posts_to_sender_cbk_handler(cls, update: Update, conte
         """
         collection_id = cls.CBK.extract(cbk_data=update.callback_query.data, )
         context.user_data.tmp_data.collections_to_share.ids.add(collection_id, )
-        posts = Collection.get_posts(
+        posts = await context.run_db(
+            Collection.get_posts,
             collection_id=collection_id,
             connection=context.connection,
         )
-        voted_personal_posts = VotedPost.Personal.from_posts(posts=posts, clicker=context.user, )
+        voted_personal_posts = await context.run_db(VotedPost.Personal.from_posts, posts=posts, clicker=context.user, )
         await context.view.collections.show_collection_posts(
             posts=voted_personal_posts,
             tooltip=update.callback_query,
@@ -122,7 +122,8 @@ async def recipient_decision_cbk_handler(update: Update, context: CallbackContex
                 )
                 return
             # Got collections ids may contain not only sender collections but a default too
-            collections = CollectionService.get_by_ids(
+            collections = await context.run_db(
+                CollectionService.get_by_ids,
                 ids=[int(str_collection_id) for str_collection_id in str_collections_id],
                 user=context.user,
             )
@@ -149,8 +150,8 @@ async def show_collection_posts_to_recipient_cbk_handler(update: Update, context
             cbk_data=update.callback_query.data,
             user=context.user,
         )
-        posts = Collection.get_posts(collection_id=collection_id, connection=context.connection, )
-        voted_posts = VotedPost.from_posts(posts=posts, clicker=context.user, opposite=sender, )
+        posts = await context.run_db(Collection.get_posts, collection_id=collection_id, connection=context.connection, )
+        voted_posts = await context.run_db(VotedPost.from_posts, posts=posts, clicker=context.user, opposite=sender, )
         await context.view.collections.show_collection_posts(posts=voted_posts, tooltip=update.callback_query, )
         await update.callback_query.answer()
 
@@ -161,7 +162,11 @@ async def show_collection_posts_cbk_handler(update: Update, context: CallbackCon
     collection_id = ViewKeyboards.Inline.ShowCollections.extract_cbk_data(
         cbk_data=update.callback_query.data,
     )
-    collection_posts = Collection.get_posts(collection_id=collection_id, connection=context.connection, )
-    collection_posts = VotedPost.from_posts(posts=collection_posts, clicker=context.user, )
+    collection_posts = await context.run_db(
+        Collection.get_posts,
+        collection_id=collection_id,
+        connection=context.connection,
+    )
+    collection_posts = await context.run_db(VotedPost.from_posts, posts=collection_posts, clicker=context.user, )
     await context.view.collections.show_collection_posts(posts=collection_posts, tooltip=update.callback_query, )
     await update.callback_query.answer()
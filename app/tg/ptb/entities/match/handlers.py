@@ -100,7 +100,8 @@ async def age_handler(update: Update, context: CallbackContext):
 
 
 async def checkboxes_handler(_: Update, context: CallbackContext):
-    context.user.matcher.make_search(
+    await context.run_db(
+        context.user.matcher.make_search,
         channel_ids={source for source, is_chosen in context.user_data.forms.target.sources.items() if is_chosen}
     )
     if context.user.matcher.matches.all:  # If user has matches
@@ -116,14 +117,15 @@ async def checkboxes_handler(_: Update, context: CallbackContext):
 async def match_type_handler(update: Update, context: CallbackContext):
     try:
         context.user_data.forms.target.handle_show_option(text=update.effective_message.text, )
-        context.user.matcher.set_current_matches()  # outside the form cuz not related directly to it
+        # outside the form cuz not related directly to it
+        await context.run_db(context.user.matcher.set_current_matches, )
     except IncorrectProfileValue:
         await context.view.match.warn.incorrect_show_option()
         return
-    if match := context.user.matcher.get_match():  # Show first match to wait user input
-        match.load()
+    if match := await context.run_db(context.user.matcher.get_match, ):  # Show first match to wait user input
+        await context.run_db(match.load, )
         await context.view.match.show_match(match=match, )
-        match.create()
+        await context.run_db(match.create, )
     else:
         await context.view.match.no_more_matches()
         return utils_end_conversation()
@@ -133,11 +135,11 @@ async def match_type_handler(update: Update, context: CallbackContext):
 async def show_match_handler(update: Update, context: CallbackContext):
     message_text = update.effective_message.text.lower().strip()
     if message_text == Texts.Buttons.SHOW_MORE.lower():
-        match: IMatch | None = context.user.matcher.get_match()
+        match: IMatch | None = await context.run_db(context.user.matcher.get_match, )
         if match:
-            match.load()
+            await context.run_db(match.load, )
             await context.view.match.show_match(match=match, )
-            match.create()
+            await context.run_db(match.create, )
         else:
             await context.view.match.no_more_matches()
             return utils_end_conversation()
@@ -16,6 +16,7 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 from abc import ABC
+from functools import cached_property
 from re import Match as re_Match
 
 from telegram import ReplyKeyboardMarkup as tg_RKM, InlineKeyboardMarkup as tg_IKM, InlineKeyboardButton as tg_IKB
@@ -92,9 +93,9 @@ async def incorrect_show_more_option(self, ) -> Message:
                 reply_markup=Keyboards.show_one_more_match,
             )
 
-    def __init__(self, user: IUser, ):
-        super().__init__(user=user, )
-        self.warn = self.Warn(user=user, )
+    @cached_property
+    def warn(self, ) -> Warn:
+        return self.Warn(user=self.user, )
 
     async def say_search_hello(self, ) -> Message:
         return await self.bot.send_message(
@@ -0,0 +1,232 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+from asyncio import (
+    Event as asyncio_Event,
+    sleep as asyncio_sleep,
+    wait_for as asyncio_wait_for,
+    create_task as asyncio_create_task,
+    TimeoutError as asyncio_TimeoutError,
+    CancelledError,
+    to_thread as asyncio_to_thread,
+)
+from contextlib import suppress
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime as datetime_datetime, timezone as datetime_timezone
+from json import dumps as json_dumps, loads as json_loads
+
+from httpx import HTTPError, codes as httpx_codes
+
+from app.config import (
+    GRASPIL_ANALYTICS_API_KEY,
+    GRASPIL_BUFFER_SIZE,
+    GRASPIL_FLUSH_INTERVAL,
+    GRASPIL_SPOOL_PATH,
+    GRASPIL_SPOOL_MAX_BYTES,
+)
+from app.postconfig import graspil_logger, httpx_client
+from app.metrics import registry as metrics_registry
+
+if TYPE_CHECKING:
+    from asyncio import Task
+    from pathlib import Path
+    from telegram import Update
+    from httpx import AsyncClient
+
+
+class GraspilExporter:
+    """
+    Collects updates in a bounded buffer and sends them by batches (by size or by time).
+    Failed requests are retried with exponential backoff,
+    if the endpoint is still unreachable - the batch is saved to the disk spool and sent after the next success.
+    """
+
+    URL = "https://api.graspil.ru/api/send-batch-update"
+    MAX_BATCH_SIZE = 1000  # API limit
+
+    @dataclass(slots=True, )
+    class Metrics:
+        received: int = 0
+        sent: int = 0
+        batches_sent: int = 0
+        failed_requests: int = 0
+        spooled: int = 0  # Updates written to the spool
+        unspooled: int = 0  # Updates sent from the spool
+        dropped_buffer_full: int = 0
+        dropped_spool_full: int = 0
+        dropped_rejected: int = 0  # Rejected by the API (4xx), retry is useless
+
+    def __init__(
+            self,
+            client: AsyncClient,
+            api_key: str = GRASPIL_ANALYTICS_API_KEY,
+            buffer_size: int = GRASPIL_BUFFER_SIZE,
+            batch_size: int = MAX_BATCH_SIZE,
+            flush_interval: float = GRASPIL_FLUSH_INTERVAL,
+            max_retries: int = 3,
+            backoff: float = 1,
+            spool_path: Path = GRASPIL_SPOOL_PATH,
+            spool_max_bytes: int = GRASPIL_SPOOL_MAX_BYTES,
+    ):
+        self.client = client
+        self.api_key = api_key
+        self.buffer_size = buffer_size
+        self.batch_size = min(batch_size, self.MAX_BATCH_SIZE, )
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.spool_path = spool_path
+        self.spool_max_bytes = spool_max_bytes
+        self.buffer: deque[dict[str, Any]] = deque()
+        self.metrics = self.Metrics()
+        self.batch_ready = asyncio_Event()
+        self.task: Task | None = None
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return asdict(self.metrics) | {'buffered': len(self.buffer), }
+
+    def add(self, update: Update, ) -> None:
+        """Non-blocking, called for every update"""
+        self.metrics.received += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.metrics.dropped_buffer_full += 1
+            return
+        self.buffer.append(
+            {
+                # API requires such time format, example: '2024-08-03T20:00:00.123+02:00'
+                "date": datetime_datetime.now(datetime_timezone.utc).isoformat(timespec='milliseconds'),
+                "update": update.to_dict(),  # to_dict exactly
+            },
+        )
+        if len(self.buffer) >= self.batch_size:
+            self.batch_ready.set()
+
+    def take_batch(self, ) -> list[dict[str, Any]]:
+        return [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer), ))]
+
+    async def send(self, batch: list[dict[str, Any]], max_retries: int | None = None, ) -> bool:
+        """Return False if the endpoint is unreachable after all the retries"""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            if attempt:
+                await asyncio_sleep(self.backoff * 2 ** (attempt - 1), )
+            try:
+                response = await self.client.post(
+                    url=self.URL,
+                    headers={'Content-Type': 'application/json', 'Api-Key': self.api_key, },
+                    json=batch,
+                )
+            except HTTPError as e:
+                self.metrics.failed_requests += 1
+                graspil_logger.error(msg=f'Graspil {type(e).__name__}: {e}', exc_info=False, )
+                continue
+            if response.is_success:
+                self.metrics.sent += len(batch)
+                self.metrics.batches_sent += 1
+                return True
+            self.metrics.failed_requests += 1
+            if response.is_client_error and response.status_code != httpx_codes.TOO_MANY_REQUESTS:
+                graspil_logger.error(msg=f'Graspil rejected the batch: {response.status_code} {response.text}', )
+                self.metrics.dropped_rejected += len(batch)
+                return True  # Delivered but rejected, don't spool
+        return False
+
+    def append_spool(self, line: str, ) -> bool:
+        """Blocking, return False if the spool is full"""
+        size = self.spool_path.stat().st_size if self.spool_path.exists() else 0
+        if size + len(line) > self.spool_max_bytes:
+            return False
+        with self.spool_path.open(mode='a', encoding='utf-8', ) as file:
+            file.write(line, )
+        return True
+
+    def read_spool(self, ) -> list[str]:
+        """Blocking"""
+        if not self.spool_path.exists():
+            return []
+        return self.spool_path.read_text(encoding='utf-8', ).splitlines()
+
+    def rewrite_spool(self, lines: list[str], ) -> None:
+        """Blocking, no lines - remove the spool"""
+        if lines:
+            self.spool_path.write_text(''.join(f'{line}\n' for line in lines), encoding='utf-8', )
+        else:
+            self.spool_path.unlink(missing_ok=True, )
+
+    async def spool(self, batch: list[dict[str, Any]], ) -> None:
+        """One batch per line"""
+        if await asyncio_to_thread(self.append_spool, json_dumps(batch, ) + '\n', ):
+            self.metrics.spooled += len(batch)
+        else:
+            self.metrics.dropped_spool_full += len(batch)
+
+    async def unspool(self, ) -> None:
+        """Send the spooled batches, the not sent ones are written back"""
+        if not (lines := await asyncio_to_thread(self.read_spool, )):
+            return
+        for index, line in enumerate(lines, ):
+            batch = json_loads(line, )
+            if not await self.send(batch=batch, ):
+                await asyncio_to_thread(self.rewrite_spool, lines[index:], )
+                return
+            self.metrics.unspooled += len(batch)
+        await asyncio_to_thread(self.rewrite_spool, [], )
+
+    async def flush(self, retry: bool = True, ) -> None:
+        """retry=False on shutdown to not hang, the rest goes to the spool"""
+        is_reachable = True
+        while self.buffer:
+            batch = self.take_batch()
+            try:
+                if is_reachable:
+                    is_reachable = await self.send(batch=batch, max_retries=None if retry else 0, )
+            except CancelledError:  # Stopped in the middle of sending
+                await self.spool(batch=batch, )
+                raise
+            if not is_reachable:
+                await self.spool(batch=batch, )
+        if is_reachable and retry:
+            await self.unspool()
+
+    async def run(self, ) -> None:
+        while True:
+            try:
+                await asyncio_wait_for(self.batch_ready.wait(), timeout=self.flush_interval, )
+            except asyncio_TimeoutError:
+                pass
+            self.batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception as e:  # The loop must not die
+                graspil_logger.error(msg=e, exc_info=True, )
+
+    def start(self, ) -> None:
+        if self.task is None:
+            self.task = asyncio_create_task(self.run(), )
+
+    async def stop(self, ) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(CancelledError, ):
+                await self.task
+            self.task = None
+        await self.flush(retry=False, )
+
+
+graspil_exporter = GraspilExporter(client=httpx_client, )
+metrics_registry.register(name='graspil', source=graspil_exporter.get_metrics, )
@@ -30,6 +30,7 @@
 FAQ_S = 'faq'
 PICKLE_FLUSH_S = 'pickle_flush'
 HEALTH_S = 'health'
+METRICS_S = 'metrics'
 DONATE_S = 'donate'
 
 
@@ -43,6 +44,7 @@ class Cmds(str, Enum):
     PICKLE_FLUSH = f'/{PICKLE_FLUSH_S}'
     FAQ = f'/{FAQ_S}'
     HEALTH = f'/{HEALTH_S}'
+    METRICS = f'/{METRICS_S}'
     GEN_BOTS = f'/{GEN_BOTS_S}'
     GEN_ME = f'/{GEN_ME_S}'
     GET_BOT_ALL_COMMANDS = f'/{ALL_BOT_COMMANDS_S}'
@@ -17,19 +17,20 @@
 from __future__ import annotations
 from pprint import pformat as pprint_pformat
 from typing import TYPE_CHECKING
-from datetime import datetime as datetime_datetime, timezone as datetime_timezone
 from collections.abc import Iterable
+from functools import partial
 
-from httpx import ConnectTimeout
 from telegram.constants import ChatAction
 from rubik_core.db.manager import Postgres
 from rubik_core.shared.utils import get_num_from_text, limit_num, LazyValue
 
-from app.config import GRASPIL_ANALYTICS_API_KEY
-from app.postconfig import app_logger, graspil_logger, httpx_client
+from app.postconfig import app_logger
+from app.db.executor import db_executor
 from app.entities.shared.exceptions import KnownException
+from app.metrics import registry as metrics_registry
 
 from .services import System as SystemService
+from .analytics import graspil_exporter
 from ..collection.services import Collection as CollectionService
 
 if TYPE_CHECKING:
@@ -45,6 +46,10 @@ async def health(_: Update, context: CallbackContext, ):
     await context.view.say_ok()
 
 
+async def metrics_handler_cmd(_: Update, context: CallbackContext, ):
+    await context.view.mix.show_metrics(metrics=metrics_registry.collect(), )
+
+
 async def donate(_: Update, context: CallbackContext, ):
     await context.view.mix.donate()
 
@@ -96,13 +101,15 @@ async def gen_bots_handler_cmd(update: Update, context: CallbackContext, ):
 async def gen_me_handler_cmd(update: Update, context: CallbackContext, ):
     # Gen bot func to gen me
     SystemService.create_bots(bots_ids=[update.effective_user.id, ], )
-    default_personal_collections = CollectionService.get_defaults(
+    default_personal_collections = await context.run_db(
+        CollectionService.get_defaults,
         prefix=CollectionService.NamePrefix.PUBLIC,
     )
     for collection in default_personal_collections:  # Set votes for default posts
-        posts = collection.get_posts(collection_id=collection.id, connection=context.connection, )
+        posts = await context.run_db(collection.get_posts, collection_id=collection.id, connection=context.connection, )
         for post in posts:
-            context.user.set_vote(
+            await context.run_db(
+                context.user.set_vote,
                 vote=SystemService.generator.gen_vote(user=context.user, post=post, ),
                 post=post,
             )
@@ -142,24 +149,9 @@ async def error_handler(update: Update | None, context: CallbackContext, ) -> No
 
 
 async def analytics_handler(update: Update, _: CallbackContext):
-    # TODO send batches up to 1000 updates
+    """Just buffer the update, the exporter sends them by batches in background"""
     try:
-        await httpx_client.post(
-            url="https://api.graspil.ru/api/send-batch-update",
-            headers={
-                'Content-Type': 'application/json',
-                'Api-Key': GRASPIL_ANALYTICS_API_KEY,
-            },
-            json=[
-                {
-                    # API requires such time format, example: '2024-08-03T20:00:00.123+02:00'
-                    "date": datetime_datetime.now(datetime_timezone.utc).isoformat(timespec='milliseconds'),
-                    "update": update.to_dict(),  # to_dict exactly
-                },
-            ],
-        )
-    except ConnectTimeout:
-        graspil_logger.error(msg=f'Graspil ConnectTimeout: {ConnectTimeout}', exc_info=False, )
+        graspil_exporter.add(update=update, )
     except Exception as e:
         app_logger.error(msg=e, exc_info=True, )
 
@@ -172,11 +164,18 @@ async def release_resources(_: Update, context: CallbackContext, ):
     """
     try:
         # getattr if LazeValue was passed; A bit dirty but ok
+        # Deferred if a timed out DB call still uses the connection
         if isinstance(context.connection, LazyValue):
             context.connection.set()
-            Postgres.connection_pool.putconn(conn=context.connection.value, )
+            db_executor.release_connection(
+                connection=context.connection,
+                release=partial(Postgres.connection_pool.putconn, conn=context.connection.value, ),
+            )
         else:
-            Postgres.connection_pool.putconn(conn=context.connection, )
+            db_executor.release_connection(
+                connection=context.connection,
+                release=partial(Postgres.connection_pool.putconn, conn=context.connection, ),
+            )
         # don't drop connection if user inside the search CH (forms.target as indicator)
         if not (context.user_data and getattr(context.user_data.forms, 'target', None)):
             context.connection = None
@@ -70,6 +70,15 @@ def create_pickle_persistence_flush_cmd() -> CommandHandler:
     return result
 
 
+def create_metrics_cmd() -> CommandHandler:
+    result = CommandHandler(
+        command=constants.METRICS_S,
+        filters=filters.User(user_id=MAIN_ADMIN),
+        callback=handlers.metrics_handler_cmd,
+    )
+    return result
+
+
 # # # CMD # # #
 
 def create_donate_cmd() -> CommandHandler:
@@ -134,6 +143,7 @@ def create_gen_me_handler_cmd() -> CommandHandler:
 health_handler_cmd = create_health_cmd()
 donate_handler_cmd = create_donate_cmd()
 pickle_persistence_flush_handler_cmd = create_pickle_persistence_flush_cmd()
+metrics_handler_cmd = create_metrics_cmd()
 # CBK
 hide_cbk_handler = create_hide_cbk_handler()
 # GEN
@@ -152,6 +162,7 @@ def create_gen_me_handler_cmd() -> CommandHandler:
         gen_bots_handler_cmd,
         gen_me_handler_cmd,
         pickle_persistence_flush_handler_cmd,
+        metrics_handler_cmd,
     ),
     8: (empty_cbk_handler, ),
     9: (analytics_handler,),
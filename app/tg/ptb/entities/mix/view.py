@@ -17,12 +17,12 @@
 from typing import TYPE_CHECKING
 
 from telegram import ReplyKeyboardRemove
-from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.constants import ParseMode, MessageLimit
 
 from app.config import DONATE_IMAGE_PATH
 from . import texts
 from ..shared.view import SharedInit
+from ...assets import assets
 from ..texts import PUBLIC_COMMANDS
 
 if TYPE_CHECKING:
@@ -32,10 +32,9 @@
 class Mix(SharedInit, ):
 
     async def donate(self, ) -> Message:
-        return await self.bot.send_photo(
-            chat_id=self.id,
-            photo=DONATE_IMAGE_PATH,
-            caption=texts.DONATE,
+        return await assets.send(
+            path=DONATE_IMAGE_PATH,
+            send=lambda photo: self.bot.send_photo(chat_id=self.id, photo=photo, caption=texts.DONATE, ),
         )
 
     async def unknown_handler(self, reply_to_message_id: int, ) -> Message:
@@ -63,13 +62,17 @@ async def faq(self, ) -> Message:
             parse_mode=ParseMode.HTML,
         )
 
+    async def show_metrics(self, metrics: dict[str, dict[str, int | float]], ) -> Message:
+        """Admin only, no translation needed"""
+        text = '\n\n'.join(
+            f'{name}:\n' + '\n'.join(f'{key}: {value}' for key, value in values.items())
+            for name, values in metrics.items()
+        )
+        return await self.bot.send_message(chat_id=self.id, text=text[:MessageLimit.MAX_TEXT_LENGTH] or '-', )
+
     async def drop_hide_btn(self, message_ids: list[int], ) -> None:
         """Create "hide" btn "hide" text message"""
-        for message_id in message_ids:
-            try:
-                await self.bot.delete_message(chat_id=self.id, message_id=message_id, )
-            except TelegramError:  # pragma: no cover
-                continue
+        await self.bot.delete_messages_bulk(chat_id=self.id, message_ids=message_ids, )
 
 
 class Keyboards:
@@ -33,6 +33,7 @@
 from ..shared.texts import Words as SharedWords
 
 from app.tg.ptb.inline_mode import add_post_to_inline_data
+from app.tg.ptb.inline_store import InlineStore
 
 if TYPE_CHECKING:
     from telegram import Update
@@ -72,9 +73,13 @@ async def confirm_handler(cls, update: Update, context: CallbackContext, ):
                 message_id=context.user_data.forms.public_post.message_id,
             )
             context.user_data.forms.public_post.message_id = stored_message_id_obj.message_id
-            created_post = context.user_data.forms.public_post.create()
+            created_post = await context.run_db(context.user_data.forms.public_post.create, )
             await context.view.posts.say_success_post()
             add_post_to_inline_data(inline_data=context.bot_data.inline_data, post=created_post, )
+            try:  # To restore the inline data on the next start
+                await InlineStore.save(post=created_post, db_params=context.db_params, )
+            except Exception as e:
+                app_logger.error(msg=e, exc_info=True, )
         else:
             await context.view.warn.incorrect_send()
             return
@@ -168,7 +173,7 @@ async def confirm_handler(cls, _: Update, context: CallbackContext, ):
             message_id=context.user_data.forms.personal_post.message_id,
         )
         context.user_data.forms.personal_post.message_id = stored_message_id_obj.message_id
-        context.user_data.forms.personal_post.create()
+        await context.run_db(context.user_data.forms.personal_post.create, )
         await context.view.posts.say_success_post()
         context.user_data.forms.personal_post = None  # Clear to spare space
         return utils_end_conversation()
@@ -176,19 +181,23 @@ async def confirm_handler(cls, _: Update, context: CallbackContext, ):
 
 async def update_public_post_status_cbk(update: Update, context: CallbackContext, ):
     _, str_post_id, str_new_status = update.callback_query.data.split()
-    post = model.PublicPost.read(post_id=int(str_post_id), connection=context.connection, )
-    post.update_status(status=post.Status(int(str_new_status)))
+    post = await context.run_db(model.PublicPost.read, post_id=int(str_post_id), connection=context.connection, )
+    await context.run_db(post.update_status, status=post.Status(int(str_new_status)), )
     await context.view.say_ok()
     return await update.callback_query.answer()
 
 
 async def get_public_post(_: Update, context: CallbackContext, ):
     # TODO Put user in queue if not posts; Save in cache is mass posts exists
-    if public_post := context.user.get_new_public_post():
-        old_vote = context.user.get_vote(post=public_post, )
+    if public_post := await context.run_db(context.user.get_new_public_post, ):
+        old_vote = await context.run_db(context.user.get_vote, post=public_post, )
         await context.view.posts.delete_post(message_id=old_vote.message_id, )  # Delete old post
         sent_message = await context.view.posts.show_post(post=public_post, )
-        context.user.upsert_shown_post(message_id=sent_message.message_id, public_post=public_post, )
+        await context.run_db(
+            context.user.upsert_shown_post,
+            message_id=sent_message.message_id,
+            public_post=public_post,
+        )
     elif context.user.matcher.is_user_has_covotes:  # Behavior
         await context.view.posts.no_new_posts()  # No new posts for user
     else:
@@ -196,8 +205,9 @@ async def get_public_post(_: Update, context: CallbackContext, ):
 
 
 async def get_my_personal_posts(_: Update, context: CallbackContext, ):
-    if personal_posts := context.user.get_personal_posts():
-        voted_posts = model.VotedPersonalPost.from_posts(
+    if personal_posts := await context.run_db(context.user.get_personal_posts, ):
+        voted_posts = await context.run_db(
+            model.VotedPersonalPost.from_posts,
             posts=personal_posts,
             clicker=context.user,
             opposite=context.user,
@@ -1,18 +1,21 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Type
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable, Type
 from abc import ABC, abstractmethod
-from time import sleep as time_sleep
 
 from telegram.error import TelegramError
 
 from rubik_core.entities.post.service import PublicPost as PublicPostService
 
+from app.db.executor import db_executor
+from app.db.async_manager import Db
+
 from . import model
 from ..mix.services import System
 
 if TYPE_CHECKING:
     from telegram import Message
     from ..user.model import IUser
+    from ..vote.model import IPublicVote
     from ..mix.services import ISystem
 
 
@@ -21,7 +24,12 @@ class IBotPublicPost(ABC, ):
 
     @classmethod
     @abstractmethod
-    def mass_update_keyboard_job(cls, bot_post: model.IBotPublicPost, ) -> list[Message]:
+    async def mass_update_keyboard_job(
+            cls,
+            bot_post: model.IBotPublicPost,
+            users: Iterable[IUser],
+            update_keyboard: Callable[[IPublicVote], Awaitable[Message]],
+    ) -> list[Message]:
         ...
 
     @classmethod
@@ -37,17 +45,32 @@ class BotPublicPost(IBotPublicPost, ):
     System: Type[ISystem] = System
 
     @classmethod
-    async def mass_update_keyboard_job(cls, bot_post: model.IBotPublicPost, ) -> list[Message]:
-        """Mass update keyboard for users if some vote was set/changed"""
+    async def mass_update_keyboard_job(
+            cls,
+            bot_post: model.IBotPublicPost,
+            users: Iterable[IUser],
+            update_keyboard: Callable[[IPublicVote], Awaitable[Message]],
+    ) -> list[Message]:
+        """
+        Mass update keyboard for users if some vote was set/changed, the pace is kept by the rate limiter.
+        Not in use: the bot keyboards have no votes counts, so the keyboards of the other users don't change.
+        """
         result = []
-        for user in cls.get_voted_users(post=bot_post, ):  # Only voted users have a message to update
-            vote = cls.System.Mapper.PublicVote.read(post_id=bot_post.id, user=user, )
+        users = list(users, )
+        async with Db.get_connection() as connection:  # Own, the shared System connection is not for the threads
+            votes = await db_executor.run(  # The votes of the all users at once
+                cls.System.Mapper.PublicVote.read_many,
+                pairs=[(user, bot_post.id,) for user in users],
+                connection=connection,
+            )
+        for user in users:
+            if (vote := votes.get((user.id, bot_post.id,), )) is None:  # Only voted users have a message to update
+                continue
             try:
-                sent_message = await bot_post.update_poll_keyboard(clicker_vote=vote, )
+                sent_message = await update_keyboard(vote, )
             except TelegramError:
                 continue  # Do nothing if user not exists (no need to delete, he may come back)
             result.append(sent_message)
-            time_sleep(1)
         return result
 
     @classmethod
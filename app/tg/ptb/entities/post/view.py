@@ -15,11 +15,16 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, Iterable
+from asyncio import gather as asyncio_gather, Semaphore as asyncio_Semaphore
+from functools import cached_property, lru_cache
 
 from telegram.error import TelegramError
 from telegram import ReplyKeyboardMarkup as tg_RKM, InlineKeyboardMarkup as tg_IKM, InlineKeyboardButton as tg_IKB
 
+from app.config import VOTE_KEYBOARDS_CACHE_SIZE, SHARE_POSTS_CHAT_CONCURRENCY
+from app.db.executor import db_executor
 from app.postconfig import known_exceptions_logger
+from app.metrics import registry as metrics_registry
 from app.entities.shared.exceptions import PostNotFound
 
 from .constants import Cmds, Cbks, PostsChannels
@@ -35,6 +40,15 @@
     from ..user.model import IUser
 
 
+def get_vote_sign(vote: IPublicVote | IPersonalVote, ) -> int:
+    """Hashable key part for the cached keyboards"""
+    if vote.value == vote.Value.POSITIVE:
+        return 1
+    if vote.value == vote.Value.NEGATIVE:
+        return -1
+    return 0
+
+
 class Public(SharedInit):
 
     class Shared:
@@ -47,23 +61,33 @@ class Shared:
 
         @classmethod
         def get_keyboard(cls, post_id: int, clicker_vote: IPublicVote, pattern: str, ) -> tg_IKM:
+            return cls.build_keyboard(
+                post_id=post_id,
+                clicker_id=clicker_vote.user.id,
+                clicker_sign=get_vote_sign(vote=clicker_vote, ),
+                pattern=pattern,
+            )
 
+        @classmethod
+        @lru_cache(maxsize=VOTE_KEYBOARDS_CACHE_SIZE, )
+        def build_keyboard(cls, post_id: int, clicker_id: int, clicker_sign: int, pattern: str, ) -> tg_IKM:
+            """Cached, the markup is immutable, so the same object is reused for every show and vote click"""
             pos_btn_text = cls.LIKE_TEXT
             neg_btn_text = cls.DISLIKE_TEXT
-            if clicker_vote.value == clicker_vote.Value.POSITIVE:
+            if clicker_sign > 0:
                 pos_btn_text = f'{cls.POS_EMOJI}{cls.MARK_VOTE}'
-            elif clicker_vote.value == clicker_vote.Value.NEGATIVE:
+            elif clicker_sign < 0:
                 neg_btn_text = f'{cls.NEG_EMOJI}{cls.MARK_VOTE}'
 
             return tg_IKM.from_row(
                 button_row=(
                     tg_IKB(
                         text=neg_btn_text,
-                        callback_data=f'{pattern} {clicker_vote.user.id} -{post_id}',
+                        callback_data=f'{pattern} {clicker_id} -{post_id}',
                     ),
                     tg_IKB(
                         text=pos_btn_text,
-                        callback_data=f'{pattern} {clicker_vote.user.id} +{post_id}',
+                        callback_data=f'{pattern} {clicker_id} +{post_id}',
                     ),), )
 
     @classmethod
@@ -129,15 +153,24 @@ class ChannelPublicPost(SharedInit, ):
     @classmethod
     def get_keyboard(cls, post: model.IChannelPublicPost, ) -> tg_IKM:
         """keyboard without mark symbol"""
+        return cls.build_keyboard(
+            post_id=post.id,
+            likes_count=post.likes_count,
+            dislikes_count=post.dislikes_count,
+        )
+
+    @classmethod
+    @lru_cache(maxsize=VOTE_KEYBOARDS_CACHE_SIZE, )
+    def build_keyboard(cls, post_id: int, likes_count: int, dislikes_count: int, ) -> tg_IKM:
         return tg_IKM.from_row(
             button_row=(
                 tg_IKB(
-                    text=f'{cls.NEG_EMOJI} {post.dislikes_count}',
-                    callback_data=f'{cls.CBK_PREFIX} -{post.id}',
+                    text=f'{cls.NEG_EMOJI} {dislikes_count}',
+                    callback_data=f'{cls.CBK_PREFIX} -{post_id}',
                 ),
                 tg_IKB(
-                    text=f'{cls.POS_EMOJI} {post.likes_count}',
-                    callback_data=f'{cls.CBK_PREFIX} +{post.id}',
+                    text=f'{cls.POS_EMOJI} {likes_count}',
+                    callback_data=f'{cls.CBK_PREFIX} +{post_id}',
                 ),), )
 
     async def update_poll_keyboard(self, post: model.IChannelPublicPost, message_id: int, ) -> Message:
@@ -183,26 +216,37 @@ def get_keyboard(
         Interactive keyboard to graphically (by emojy) show simultaneously two votes (sender and recipient).
         In cbk button data only opposite id (clicker accessible from update)
         """
+        if opposite_vote is not None:
+            opposite_user_id = opposite_vote.user.id  # int or str no matter here
+            opposite_sign = get_vote_sign(vote=opposite_vote, )
+        else:
+            opposite_user_id = clicker_vote.user.id  # Just my id twice, it's easiest to parse in handlers
+            opposite_sign = 0
+        return cls.build_keyboard(
+            post_id=post.id,
+            opposite_user_id=opposite_user_id,
+            clicker_sign=get_vote_sign(vote=clicker_vote, ),
+            opposite_sign=opposite_sign,
+        )
 
-        if clicker_vote.value == clicker_vote.Value.POSITIVE:
+    @classmethod
+    @lru_cache(maxsize=VOTE_KEYBOARDS_CACHE_SIZE, )
+    def build_keyboard(cls, post_id: int, opposite_user_id: int, clicker_sign: int, opposite_sign: int, ) -> tg_IKM:
+        if clicker_sign > 0:
             pos_btn_text = f'{cls.Shared.POS_EMOJI}{cls.Shared.MARK_VOTE}'
             neg_btn_text = ''
-        elif clicker_vote.value == clicker_vote.Value.NEGATIVE:
+        elif clicker_sign < 0:
             neg_btn_text = f'{cls.Shared.NEG_EMOJI}{cls.Shared.MARK_VOTE}'
             pos_btn_text = ''
         else:
             pos_btn_text = neg_btn_text = ''
 
-        if opposite_vote is not None:
-            opposite_user_id = opposite_vote.user.id  # int or str no matter here
-            if opposite_vote.value == clicker_vote.Value.POSITIVE:
-                pos_btn_text = f'{pos_btn_text}{cls.Shared.POS_EMOJI}'
-            elif opposite_vote.value == clicker_vote.Value.NEGATIVE:
-                neg_btn_text = f'{neg_btn_text}{cls.Shared.NEG_EMOJI}'
-        else:
-            opposite_user_id = clicker_vote.user.id  # Just my id twice, it's easiest to parse in handlers
+        if opposite_sign > 0:
+            pos_btn_text = f'{pos_btn_text}{cls.Shared.POS_EMOJI}'
+        elif opposite_sign < 0:
+            neg_btn_text = f'{neg_btn_text}{cls.Shared.NEG_EMOJI}'
 
-        cbk = f'{VoteCbks.PERSONAL_VOTE} {opposite_user_id} {{}}{post.id}'  # {{}} - for next format method
+        cbk = f'{VoteCbks.PERSONAL_VOTE} {opposite_user_id} {{}}{post_id}'  # {{}} - for next format method
         return tg_IKM.from_row(
             button_row=(
                 tg_IKB(text=neg_btn_text or cls.Shared.DISLIKE_TEXT, callback_data=cbk.format('-')),
@@ -264,13 +308,28 @@ class Posts(SharedInit):
 
     def __init__(self, shared_view: Shared, user: IUser, ) -> None:
         super().__init__(user=user, )
-        self.public = self.Public(user=user, )
-        self.channel_public_post = self.ChannelPublicPost(user=user, )
-        self.bot_public_post = self.BotPublicPost(user=user, )
-        self.personal = self.Personal(user=user, )
-        self.bot_personal_post = self.BotPersonalPost(user=user, )
         self.shared: Shared = shared_view
 
+    @cached_property
+    def public(self, ) -> Public:
+        return self.Public(user=self.user, )
+
+    @cached_property
+    def channel_public_post(self, ) -> ChannelPublicPost:
+        return self.ChannelPublicPost(user=self.user, )
+
+    @cached_property
+    def bot_public_post(self, ) -> BotPublicPost:
+        return self.BotPublicPost(user=self.user, )
+
+    @cached_property
+    def personal(self, ) -> Personal:
+        return self.Personal(user=self.user, )
+
+    @cached_property
+    def bot_personal_post(self, ) -> BotPersonalPost:
+        return self.BotPersonalPost(user=self.user, )
+
     remove_sharing_message = Shared.remove_sharing_message
 
     async def store_in_channel(self, message_id: int, ) -> MessageId:
@@ -432,41 +491,58 @@ async def show_form(self, form: forms.Public | forms.Personal, ) -> MessageId:
                 reply_markup=Keyboards.personal_form,
             )
 
-    async def share_post(
+    async def delete_shared_post(self, chat_id: int, message_id: int | None, semaphore: asyncio_Semaphore, ) -> None:
+        """The old message may be deleted already, it doesn't prevent the sharing"""
+        if message_id is None:
+            return
+        async with semaphore:
+            try:
+                await self.delete_post(chat_id=chat_id, message_id=message_id, )
+            except TelegramError:
+                pass
+
+    async def show_shared_posts(
             self,
-            post: model.IPersonalPost,
-            post_sender: IUser,
-            post_recipient: IUser,
-    ) -> None:
-        """Share post from one user to another (send the same post simultaneously to 2 users)"""
-        post_sender_vote = post_sender.get_vote(post=post, )
-        post_recipient_vote = post_recipient.get_vote(post=post, )
-        await self.delete_post(chat_id=post_sender.id, message_id=post_sender_vote.message_id, )
-        await self.delete_post(chat_id=post_recipient.id, message_id=post_sender_vote.message_id, )
-        try:
-            # send message to me
-            sender_sent_message = await self.show_post(
-                post=model.VotedPersonalPost(
-                    post=post,
-                    clicker_vote=post_sender_vote,
-                    opposite_vote=post_recipient_vote,
-                ),
-            )
-            # send message to opposite user
-            recipient_sent_message = await self.show_post(
-                post=model.VotedPersonalPost(
-                    post=post,
-                    clicker_vote=post_recipient_vote,
-                    opposite_vote=post_sender_vote,
-                ),
+            posts: list[model.IVotedPersonalPost],
+            failed: dict[tuple[int, int], TelegramError],
+    ) -> list[IPersonalVote]:
+        """
+        To the one chat, one by one to keep the order.
+        failed: by (chat id, post id).
+        Returns the votes with the changed message ids (None if the old message is deleted but the new one not sent).
+        """
+        result = []
+        for post in posts:
+            try:
+                sent_message = await self.show_post(post=post, )
+            except TelegramError as e:
+                failed[(post.clicker_vote.user.id, post.post.id,)] = e
+                if post.clicker_vote.message_id is not None:
+                    post.clicker_vote.message_id = None
+                    result.append(post.clicker_vote, )
+                continue
+            post.clicker_vote.message_id = sent_message.message_id
+            result.append(post.clicker_vote, )
+        return result
+
+    @staticmethod
+    def read_votes_pairs(
+            sender: IUser,
+            recipient: IUser,
+            posts: list[model.IPersonalPost],
+    ) -> list[tuple[IPersonalVote, IPersonalVote]]:
+        """Blocking. (sender vote, recipient vote) per post in one query, the missed votes are zero (no query)"""
+        votes = sender.PersonalVote.read_many(
+            pairs=[(user, post.id,) for post in posts for user in (sender, recipient,)],
+            connection=sender.connection,
+        )
+        return [
+            tuple(
+                votes.get((user.id, post.id,), ) or user.PersonalVote.get_zero(user=user, post_id=post.id, )
+                for user in (sender, recipient,)
             )
-        except TelegramError as e:
-            known_exceptions_logger.error(msg=e, exc_info=True, )
-            return None
-        post_sender_vote.message_id = sender_sent_message.message_id
-        post_recipient_vote.message_id = recipient_sent_message.message_id
-        post_sender_vote.upsert_message_id()
-        post_recipient_vote.upsert_message_id()
+            for post in posts
+        ]
 
     async def share_posts(
             self,
@@ -474,10 +550,57 @@ async def share_posts(
             recipient: IUser,
             posts: Iterable[model.IPersonalPost] | None = None,
     ) -> bool:
-        posts = posts or sender.get_personal_posts()
-        for post in posts:
-            await self.share_post(post=post, post_sender=sender, post_recipient=recipient, )
-        return bool(posts)
+        """
+        Pipeline:
+        1. The votes of the both users for the all posts are read in one query (in the DB executor).
+        2. The old messages of the posts are deleted concurrently (SHARE_POSTS_CHAT_CONCURRENCY per chat).
+        3. The posts are sent to the both chats at once, to every chat in the order of the posts.
+        4. The new message ids (None for the deleted but not resent ones) are saved in the DB executor.
+        A failed post doesn't stop the others, the failures are logged per post.
+        """
+        posts = list(posts or await db_executor.run(sender.get_personal_posts, ), )
+        if not posts:
+            return False
+        votes_pairs = await db_executor.run(self.read_votes_pairs, sender=sender, recipient=recipient, posts=posts, )
+        semaphores = {
+            sender.id: asyncio_Semaphore(value=SHARE_POSTS_CHAT_CONCURRENCY, ),
+            recipient.id: asyncio_Semaphore(value=SHARE_POSTS_CHAT_CONCURRENCY, ),
+        }
+        await asyncio_gather(*(
+            self.delete_shared_post(
+                chat_id=vote.user.id,
+                message_id=vote.message_id,
+                semaphore=semaphores[vote.user.id],
+            )
+            for votes_pair in votes_pairs for vote in votes_pair
+        ))
+        failed: dict[tuple[int, int], TelegramError] = {}
+        sent_votes = await asyncio_gather(
+            self.show_shared_posts(  # To the sender
+                posts=[
+                    model.VotedPersonalPost(post=post, clicker_vote=sender_vote, opposite_vote=recipient_vote, )
+                    for post, (sender_vote, recipient_vote) in zip(posts, votes_pairs, )
+                ],
+                failed=failed,
+            ),
+            self.show_shared_posts(  # To the recipient
+                posts=[
+                    model.VotedPersonalPost(post=post, clicker_vote=recipient_vote, opposite_vote=sender_vote, )
+                    for post, (sender_vote, recipient_vote) in zip(posts, votes_pairs, )
+                ],
+                failed=failed,
+            ),
+        )
+        await db_executor.run(self.upsert_messages_ids, votes=[vote for votes in sent_votes for vote in votes], )
+        if failed:
+            known_exceptions_logger.warning(
+                msg=(
+                    f'Shared {len(posts) - len({post_id for _, post_id in failed})}/{len(posts)} posts '
+                    f'from {sender.id} to {recipient.id}, '
+                    f'failed: {", ".join(f"{post_id} to {chat_id} ({e})" for (chat_id, post_id), e in failed.items())}.'
+                ),
+            )
+        return True
 
     async def here_post_preview(self, ) -> Message:
         return await self.bot.send_message(
@@ -573,3 +696,20 @@ def build(cls, sender_id: int, ) -> tg_IKM:
                     tg_IKB(text=cls.DECLINE_TEXT, callback_data=cls.build_cbk(sender_id=sender_id, flag=False, ), ),
                     tg_IKB(text=cls.ACCEPT_TEXT, callback_data=cls.build_cbk(sender_id=sender_id, flag=True, ), ),
                 ), )
+
+
+def get_keyboards_cache_metrics() -> dict[str, int]:
+    result = {}
+    for name, build_keyboard in (
+            ('public', Public.Shared.build_keyboard,),
+            ('channel', ChannelPublicPost.build_keyboard,),
+            ('personal', Personal.build_keyboard,),
+    ):
+        cache_info = build_keyboard.cache_info()
+        result[f'{name}_hits'] = cache_info.hits
+        result[f'{name}_misses'] = cache_info.misses
+        result[f'{name}_size'] = cache_info.currsize
+    return result
+
+
+metrics_registry.register(name='vote_keyboards', source=get_keyboards_cache_metrics, )
@@ -16,10 +16,11 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING, Iterable, Protocol, Type, TypedDict, Sequence
+from functools import cached_property
 from dataclasses import dataclass
 from string import punctuation as string_punctuation
 
-from telegram.error import TelegramError
+from telegram.error import TelegramError, BadRequest
 from telegram.constants import ParseMode, MediaGroupLimit
 from telegram.helpers import mention_html
 from telegram import (
@@ -36,12 +37,14 @@
 from rubik_core.shared.structures import Goal, Gender
 
 from app.config import DEFAULT_PHOTO_PATH
+from app.postconfig import known_exceptions_logger
 from .constants import HIDE_S
 from . import texts
 from ..post.constants import PostsChannels
 
 from app.tg.ptb import bot
 from app.tg.ptb.custom import extract_shared_user_name
+from app.tg.ptb.assets import assets
 
 if TYPE_CHECKING:
     from telegram import (
@@ -51,12 +54,14 @@
         KeyboardButton as tg_KB,
         SharedUser,
     )
+    from pathlib import Path
+    from custom_ptb.bot import Bot
     from ..user.model import IUser
 
 
 class SharedInit:
 
-    bot: ExtBot = bot
+    bot: Bot = bot
 
     def __init__(self, user: IUser, ):
         self.id = user.id
@@ -64,9 +69,9 @@ def __init__(self, user: IUser, ):
 
 
 class Shared(SharedInit, ):
-    def __init__(self, user: IUser, ):
-        super().__init__(user=user, )
-        self.warn = self.Warn(user=user, )
+    @cached_property
+    def warn(self, ) -> Warn:
+        return self.Warn(user=self.user, )
 
     class Warn(SharedInit, ):
 
@@ -216,17 +221,27 @@ async def check_message_existence(self, chat_id: int, message_id: int, ) -> bool
         """
         Telegram bot api has no direct way to check is message exists, so it's a tricky way
         https://github.com/tdlib/telegram-bot-api/issues/62
+        The result is cached by the bot, only BadRequest means that the message not exists.
         """
+        if (is_exists := self.bot.messages_existence.get(chat_id=chat_id, message_id=message_id, )) is not None:
+            return is_exists
         try:
             sent_message_obj = await self.bot.copy_message(
                 chat_id=PostsChannels.STORE.value,
                 from_chat_id=chat_id,
                 message_id=message_id,
             )
-            await self.bot.delete_message(chat_id=PostsChannels.STORE.value, message_id=sent_message_obj.message_id, )
-            return True
+        except BadRequest:
+            self.bot.messages_existence.set(chat_id=chat_id, message_id=message_id, exists=False, )
+            return False
         except TelegramError:
             return False
+        self.bot.messages_existence.set(chat_id=chat_id, message_id=message_id, exists=True, )
+        try:
+            await self.bot.delete_message(chat_id=PostsChannels.STORE.value, message_id=sent_message_obj.message_id, )
+        except TelegramError as e:  # The copy is left in the store, the message exists anyway
+            known_exceptions_logger.warning(msg=e, exc_info=True, )
+        return True
 
     async def add_close_btn(
             self,
@@ -282,7 +297,7 @@ class IProfileBase(ABC, ):
 
     Goal: Goal
     Gender: Gender
-    DEFAULT_MEDIA_PHOTO: InputMediaPhoto
+    DEFAULT_PHOTO_PATH: Path
 
     UserModel: Type[UserModel]
     Payload: Type[Payload] = Payload
@@ -321,7 +336,7 @@ class ProfileBase(IProfileBase, ):
 
     Goal = Goal
     Gender = Gender
-    DEFAULT_MEDIA_PHOTO = InputMediaPhoto(media=DEFAULT_PHOTO_PATH.read_bytes(), parse_mode=ParseMode.HTML, )
+    DEFAULT_PHOTO_PATH = DEFAULT_PHOTO_PATH  # Sent by the file_id after the first upload
 
     Payload: Type[Payload] = Payload
     TranslationsMap: dict
@@ -370,14 +385,22 @@ def prepare_photos_to_send(self, caption: str, ) -> list[InputMediaPhoto]:
         for photo in self.data.photos[:MediaGroupLimit.MAX_MEDIA_LENGTH]:  # TG allows max ~10 photos per message
             # Only first photo need a caption ?
             photos_to_send.append(InputMediaPhoto(media=photo, parse_mode=ParseMode.HTML, caption=caption, ))
-        photos_to_send = photos_to_send or [self.DEFAULT_MEDIA_PHOTO]
         return photos_to_send
 
     async def send(self, show_to_id: int = None, ) -> None:
         show_to_id = show_to_id or self.id
         profile_data = self.get_payload()
-        photos_to_send = self.prepare_photos_to_send(caption=profile_data.text, )
-        await self.bot.send_media_group(chat_id=show_to_id, media=photos_to_send, parse_mode=ParseMode.HTML, )
+        if photos_to_send := self.prepare_photos_to_send(caption=profile_data.text, ):
+            await self.bot.send_media_group(chat_id=show_to_id, media=photos_to_send, parse_mode=ParseMode.HTML, )
+        else:
+            await assets.send(
+                path=self.DEFAULT_PHOTO_PATH,
+                send=lambda photo: self.bot.send_media_group(
+                    chat_id=show_to_id,
+                    media=[InputMediaPhoto(media=photo, parse_mode=ParseMode.HTML, )],
+                    parse_mode=ParseMode.HTML,
+                ),
+            )
         if len(profile_data.photos) > 1:  # Tg hides text if photos > 1, so send text explicit in this case
             await self.bot.send_message(chat_id=show_to_id, text=profile_data.text, parse_mode=ParseMode.HTML, )
 
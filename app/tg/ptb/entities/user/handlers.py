@@ -171,6 +171,6 @@ async def confirm_handler(update: Update, context: CallbackContext, ):
     if update.effective_message.text.lower().strip() != Texts.FINISH_KEYWORD.lower():
         await context.view.reg.warn.incorrect_end_reg()
         return
-    context.user_data.forms.new_user.create()
+    await context.run_db(context.user_data.forms.new_user.create, )
     await context.view.reg.say_success_reg()
     return custom_end_conversation()
@@ -15,6 +15,7 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, Callable, Any as typing_Any
+from functools import cached_property
 
 from telegram import (
     ReplyKeyboardMarkup as tg_RKM,
@@ -97,9 +98,9 @@ async def comment_too_long(self, comment_len: int, ):
         async def incorrect_end_reg(self, ) -> Message:
             return await self.bot.send_message(chat_id=self.id, text=Texts.END_REG_HELP, )
 
-    def __init__(self, user: IUser, ):
-        super().__init__(user=user, )
-        self.warn = self.Warn(user=user, )
+    @cached_property
+    def warn(self, ) -> Warn:
+        return self.Warn(user=self.user, )
 
     async def say_reg_hello(self, ) -> Message:
         return await self.bot.send_message(
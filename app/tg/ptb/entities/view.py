@@ -15,6 +15,7 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, Type
+from functools import cached_property
 
 from .shared.view import Shared as SharedView
 from .post.view import Posts
@@ -30,6 +31,10 @@
 
 
 class View(SharedView, ):  # Need to the easiest access to a common views
+    """
+    Built per update (see CallbackContext.view) and not stored in user_data,
+    the sub views are created on the first access only, so an update uses just the views it needs.
+    """
     Reg: Type[Reg] = Reg
     Match: Type[Match] = Match
     Collections: Type[Collections] = Collections
@@ -37,15 +42,26 @@ class View(SharedView, ):  # Need to the easiest access to a common views
     Mix: Type[Mix] = Mix
     CJM: Type[CJM] = Cjm
 
-    def __init__(self, user: IUser, ):
-        super().__init__(user=user, )
-        self.reg: Reg = self.Reg(user=user, )
-        self.match: Match = self.Match(user=user, )
-        self.posts: Posts = self.Posts(user=user, shared_view=self, )
-        self.collections: Collections = self.Collections(
-            user=user,
-            posts_view=self.posts,
-            shared_view=self,
-        )
-        self.mix: Mix = self.Mix(user=user, )
-        self.cjm: Cjm = Cjm(user=user, collections_view=self.collections, shared_view=self, )
+    @cached_property
+    def reg(self, ) -> Reg:
+        return self.Reg(user=self.user, )
+
+    @cached_property
+    def match(self, ) -> Match:
+        return self.Match(user=self.user, )
+
+    @cached_property
+    def posts(self, ) -> Posts:
+        return self.Posts(user=self.user, shared_view=self, )
+
+    @cached_property
+    def collections(self, ) -> Collections:
+        return self.Collections(user=self.user, posts_view=self.posts, shared_view=self, )
+
+    @cached_property
+    def mix(self, ) -> Mix:
+        return self.Mix(user=self.user, )
+
+    @cached_property
+    def cjm(self, ) -> Cjm:
+        return Cjm(user=self.user, collections_view=self.collections, shared_view=self, )
@@ -63,11 +63,11 @@ async def public_vote_cbk_handler(update: Update, context: CallbackContext, ):
             user=context.user,
             callback=update.callback_query,
         )
-        handled_vote = context.user.set_vote(post=post, vote=vote, )
+        handled_vote = await context.run_db(context.user.set_vote, post=post, vote=vote, )
         if handled_vote.is_accepted:
             """Counting votes in keyboard was disabled (tmp or persistence)"""
             # Update public votes
-            # context.dispatcher.run_async(func=services.System.BotPublicPost.mass_update_keyboard_job, bot_post=post, )
+            # await services.BotPublicPost.mass_update_keyboard_job(bot_post=post, users=..., update_keyboard=...)
             await context.view.posts.bot_public_post.update_poll_keyboard(
                 post=post,
                 clicker_vote=vote,
@@ -89,7 +89,7 @@ async def channel_public_vote_cbk_handler(update: Update, context: CallbackConte
         app_logger.error(msg=e, exc_info=True, )
         await context.view.posts.voting_internal_error(tooltip=update.callback_query, )
     else:  # If no exception was raised
-        handled_vote = context.user.set_vote(post=post, vote=vote, )
+        handled_vote = await context.run_db(context.user.set_vote, post=post, vote=vote, )
         if handled_vote.is_accepted is True:
             await context.view.posts.channel_public_post.update_poll_keyboard(
                 post=post,
@@ -110,11 +110,12 @@ async def personal_vote_cbk_handler(update: Update, context: CallbackContext, ):
         return
     else:  # If no exception
         clicker_vote = PersonalVote.from_callback(user=context.user, callback=update.callback_query, )
-        handled_vote = context.user.set_vote(post=post, vote=clicker_vote, )
+        handled_vote = await context.run_db(context.user.set_vote, post=post, vote=clicker_vote, )
         if handled_vote.is_accepted:
             opposite_vote = None
             if int(str_opposite_id) != context.user.id:  # If Shown to myself
-                opposite_vote = PersonalVote.get_user_vote(
+                opposite_vote = await context.run_db(
+                    PersonalVote.get_user_vote,
                     user=PersonalVote.User(id=int(str_opposite_id), connection=context.connection, ),
                     post=post,
                 )
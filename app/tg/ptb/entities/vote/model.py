@@ -15,8 +15,11 @@
 
 from __future__ import annotations
 from abc import ABC
-from typing import Type, TYPE_CHECKING
+from typing import Iterable, Type, TYPE_CHECKING
 
+from rubik_core.db.manager import Params as DbParams
+
+from app.db.async_manager import Db, read_all as db_read_all
 from app.tg.entities.vote.model import (
     PublicVote as TgPublicVote,
     IPublicVote as ITgPublicVote,
@@ -25,12 +28,71 @@
 )
 
 if TYPE_CHECKING:
+    from psycopg2.extensions import connection as pg_ext_connection
     from telegram import CallbackQuery
     from ..user.model import IUser
     from ..post.model import IPublicPost, IPersonalPost
 
 
 class VoteBase:
+    TABLE: str  # Table of the votes of the kind, created by rubik_core
+    COLUMNS = ('user_id', 'post_id', 'channel_id', 'message_id', 'value',)  # Read by read_many, see check_schema
+
+    @classmethod
+    async def check_schema(cls, ) -> None:
+        """
+        The votes tables are created by rubik_core, so the columns used by read_many are checked on startup,
+        the mismatch fails the startup instead of the every bulk read.
+        """
+        async with Db.get_params() as db_params:
+            rows = await Db.read_all(
+                statement=(
+                    'SELECT column_name FROM information_schema.columns '
+                    'WHERE table_schema = current_schema() AND table_name = %s'
+                ),
+                values=(cls.TABLE,),
+                db_params=db_params,
+            )
+        if missed := set(cls.COLUMNS, ) - {column_name for column_name, in rows}:
+            raise RuntimeError(f'Table {cls.TABLE} has no columns: {", ".join(sorted(missed, ), )}.', )
+
+    @classmethod
+    def read_many(
+            cls: Type[IPublicVote | IPersonalVote],
+            pairs: Iterable[tuple[IUser, int]],
+            connection: pg_ext_connection,
+    ) -> dict[tuple[int, int], IPublicVote | IPersonalVote]:
+        """
+        Votes of the (user, post id) pairs in one query instead of get_vote per pair.
+        Keyed by (user id, post id), no key if the user has no vote for the post.
+        """
+        pairs = list(pairs, )
+        users = {user.id: user for user, _ in pairs}
+        rows = db_read_all(
+            statement=(
+                f'SELECT votes.{", votes.".join(cls.COLUMNS, )} FROM {cls.TABLE} AS votes '
+                f'JOIN unnest(%s::bigint[], %s::bigint[]) AS pairs (user_id, post_id) '
+                f'ON votes.user_id = pairs.user_id AND votes.post_id = pairs.post_id'
+            ),
+            values=([user.id for user, _ in pairs], [post_id for _, post_id in pairs],),
+            db_params=DbParams(connection=connection, ),
+        )
+        return {
+            (user_id, post_id,): cls(
+                user=users[user_id],
+                post_id=post_id,
+                channel_id=channel_id,
+                message_id=message_id,
+                value=cls.Value(value, ),
+            )
+            for user_id, post_id, channel_id, message_id, value in rows
+        }
+
+    @classmethod
+    def get_zero(cls: Type[IPublicVote | IPersonalVote], user: IUser, post_id: int, ) -> IPublicVote | IPersonalVote:
+        """Not stored vote of the user without a vote for the post, built without a query"""
+        return cls(user=user, post_id=post_id, channel_id=user.id, message_id=None, value=cls.Value.ZERO, )
+
     @classmethod
     def from_callback(
             cls: Type[IPublicVote | IPersonalVote],
@@ -60,6 +122,7 @@ class IPublicVote(ITgPublicVote, ABC, ):
 
 
 class PublicVote(TgPublicVote, VoteBase, IPublicVote, ):
+    TABLE = 'public_votes'
     Post: Type[IPublicPost]
     User: Type[IUser]
 
@@ -70,5 +133,6 @@ class IPersonalVote(ITgPersonalVote, ABC, ):
 
 
 class PersonalVote(TgPersonalVote, VoteBase, IPersonalVote, ):
+    TABLE = 'personal_votes'
     Post: Type[IPersonalPost]
     User: Type[User]
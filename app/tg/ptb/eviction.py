@@ -0,0 +1,147 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Idle users eviction.
+user_data of every user who ever wrote to the bot keeps the user model, the connection and the forms,
+so the memory grows with the number of users, not with the number of the active ones.
+The evicted parts are rebuilt by CallbackContext.from_update on the next update of the user.
+A view left in the restored data is dropped too, the views are built per update.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+from time import monotonic
+
+from telegram.ext import ConversationHandler
+
+from app.config import LOGS_PATH, USER_DATA_IDLE_TTL, USER_DATA_MAX_HYDRATED
+from app.postconfig import setup_logger
+from app.metrics import registry as metrics_registry
+from custom_ptb.update_processor import PerKeyUpdateProcessor
+
+from .structures import CustomUserData
+
+if TYPE_CHECKING:
+    from typing import Callable, Iterable, Mapping
+    from telegram.ext import Application, BaseHandler
+    from custom_ptb.callback_context import CallbackContext
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+
+class IdleUsers:
+    """
+    LRU of the users with the hydrated user_data, the least recently active first.
+    A user is evicted if idle longer than ttl or if there are more than max_hydrated users,
+    except the users with an update in progress or inside a conversation (forms are in use).
+    """
+
+    @dataclass(slots=True, )
+    class Metrics:
+        evicted: int = 0
+        skipped_busy: int = 0  # Update in progress or active conversation
+        runs: int = 0
+
+    def __init__(self, ttl: float, max_hydrated: int, clock: Callable[[], float] = monotonic, ):
+        self.ttl = ttl
+        self.max_hydrated = max_hydrated
+        self.clock = clock
+        self.last_seen: OrderedDict[int, float] = OrderedDict()
+        self.metrics = self.Metrics()
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return {
+            'hydrated': len(self.last_seen),
+            'evicted': self.metrics.evicted,
+            'skipped_busy': self.metrics.skipped_busy,
+            'runs': self.metrics.runs,
+        }
+
+    def touch(self, user_id: int, ) -> None:
+        """Call on every update of the user"""
+        self.last_seen[user_id] = self.clock()
+        self.last_seen.move_to_end(user_id, )
+
+    @classmethod
+    def get_conversation_keys(cls, handlers: Iterable[BaseHandler], ) -> set[int]:
+        """
+        Ids from the keys of the active conversations (nested too).
+        Conversation key is (chat_id, user_id, ...) depending on per_* settings,
+        chat id of the private chat is the user id, so all the key parts are taken,
+        extra message ids just may save few users from the eviction.
+        """
+        result = set()
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler, ):
+                for key in handler._conversations:  # No public API for the current conversations
+                    result.update(key, )
+                for state_handlers in handler.states.values():
+                    result |= cls.get_conversation_keys(handlers=state_handlers, )
+        return result
+
+    @staticmethod
+    def evict_user_data(user_data: CustomUserData, ) -> None:
+        """Only the parts which are rebuilt per update, tmp_data may be needed by the next callback"""
+        user_data.model = None
+        user_data.view = None
+        user_data.connection = None
+        user_data.forms = CustomUserData.Forms()  # Conversations are not active, so the forms are abandoned
+
+    def evict(
+            self,
+            user_data: Mapping[int, CustomUserData],
+            busy_ids: set[int] = frozenset(),
+            now: float | None = None,
+    ) -> int:
+        now = self.clock() if now is None else now
+        evicted = 0
+        kept = []  # Busy users, returned to the LRU as recently active
+        while self.last_seen:
+            user_id, last_seen = next(iter(self.last_seen.items()))
+            if now - last_seen < self.ttl and len(self.last_seen) + len(kept) <= self.max_hydrated:
+                break  # The rest are more recently active
+            del self.last_seen[user_id]
+            if user_id in busy_ids:
+                kept.append(user_id, )
+                continue
+            if (data := user_data.get(user_id)) is not None:
+                self.evict_user_data(user_data=data, )
+                evicted += 1
+        for user_id in kept:
+            self.last_seen[user_id] = now
+        self.metrics.evicted += evicted
+        self.metrics.skipped_busy += len(kept)
+        self.metrics.runs += 1
+        return evicted
+
+    def evict_from_app(self, application: Application, ) -> int:
+        busy_ids = self.get_conversation_keys(
+            handlers=(handler for handlers in application.handlers.values() for handler in handlers),
+        )
+        if isinstance(application.update_processor, PerKeyUpdateProcessor, ):
+            busy_ids.update(application.update_processor.queues, )
+        return self.evict(user_data=application.user_data, busy_ids=busy_ids, )
+
+    async def evict_job(self, context: CallbackContext, ) -> None:
+        if evicted := self.evict_from_app(application=context.application, ):
+            logger.info(msg=f'Evicted idle user data: {evicted}, hydrated: {len(self.last_seen)}', )
+
+
+idle_users = IdleUsers(ttl=USER_DATA_IDLE_TTL, max_hydrated=USER_DATA_MAX_HYDRATED, )
+metrics_registry.register(name='idle_users', source=idle_users.get_metrics, )
@@ -1,15 +1,15 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterator
 from logging import getLogger as logging_getLogger
 from dataclasses import dataclass
 from re import compile as re_compile, sub as re_sub
 from heapq import (
     nsmallest as heapq_nsmallest,
     nlargest as heapq_nlargest,
-    heapify as heapq_heapify,
-    heappush as heapq_heappush,
 )
-from itertools import count as itertools_count
+from itertools import count as itertools_count, chain as itertools_chain
+from bisect import bisect_right
+from enum import Enum
 
 from telegram.helpers import effective_message_type as get_effective_message_type
 from telegram.constants import MessageType
@@ -45,7 +45,7 @@
     from rubik_core.entities.vote.base import Value as VoteValue
     from custom_ptb.callback_context import CallbackContext as CallbackContext
 
-    from .structures import InlineData
+    from .structures import InlineData, PostsCategories
     from .entities.post.model import IPublicPost
     from .entities.collection.model import ICollection
 
@@ -119,26 +119,49 @@ def get_inline_result(
                 )
 
 
-def add_post_to_inline_data(inline_data: InlineData, post: IPublicPost, ) -> None:
-    """Used in post handlers, external usage"""
+def get_category(posts: PostsCategories, post: IPublicPost, ) -> list[InlinePost] | None:
     str_message_type = get_effective_message_type(entity=post.message, )
     match MessageType(str_message_type, ):
         case MessageType.TEXT:
-            heapq_heappush(inline_data.posts.texts, InlinePost(post=post, ))
+            return posts.texts
         case MessageType.PHOTO:
-            heapq_heappush(inline_data.posts.photos, InlinePost(post=post, ))
+            return posts.photos
         case MessageType.VIDEO:
-            heapq_heappush(inline_data.posts.videos, InlinePost(post=post, ))
+            return posts.videos
         case MessageType.DOCUMENT:
-            heapq_heappush(inline_data.posts.documents, InlinePost(post=post, ))
+            return posts.documents
         case _:
             logger.info(msg=f'Unknown message type {str_message_type}')
+            return None
+
+
+def add_post_to_inline_data(inline_data: InlineData, post: IPublicPost, ) -> None:
+    """Used in post handlers, external usage"""
+    if inline_data.forward is not None:  # Sharded mode, this process has no inline data
+        inline_data.forward(post)
+        return
+    if (category := get_category(posts=inline_data.posts, post=post, )) is None:
+        return
+    inline_post = InlinePost(post=post, )
+    inline_data.posts.push(category=category, inline_post=inline_post, )
+    inline_data.text_index.add(inline_post=inline_post, )
+    inline_data.invalidate()
 
 
 class GetInlinePost:
     """Provide possible inline results when users types @bot_name"""
 
     TTL = 300
+    PAGE_SIZE = InlineQueryLimit.RESULTS
+
+    class Streams(str, Enum, ):
+        MIX = 'mix'  # Popular and new posts of every category and a few posts of every collection, cached
+        RANKED = 'ranked'
+        COLLECTIONS = 'collections'
+        SEARCH = 'search'
+
+    STREAMS = (Streams.MIX, Streams.RANKED, Streams.COLLECTIONS, )  # Pages order of the empty query
+    SEARCH_STREAMS = (Streams.SEARCH, )
 
     @dataclass
     class Keyboards:
@@ -205,8 +228,7 @@ def get_category_inline_results(
         return results
 
     @classmethod
-    # @lru_cache(maxsize=5, )  # TODO no cache currently and need to hash the InlineData
-    def get_cached_inline_results(cls, inline_data: InlineData, ) -> list[InlineQueryResult]:
+    def build_inline_results(cls, inline_data: InlineData, ) -> list[InlineQueryResult]:
         inline_results = []
         popular_posts_num = new_posts_num = 6
         unique_id_counter = itertools_count(0)  # Assign unique key for every item (enumerate will fail on empty list)
@@ -230,14 +252,157 @@ def get_cached_inline_results(cls, inline_data: InlineData, ) -> list[InlineQuer
                     inline_results.append(result)
         return inline_results
 
+    @classmethod
+    def get_cached_inline_results(cls, inline_data: InlineData, ) -> list[InlineQueryResult]:
+        """The results are the same for all the users, so build them only after the data changed"""
+        if inline_data.cached_version != inline_data.version:
+            # No awaits here, so the version can't be changed during the building
+            inline_data.cached_results = cls.build_inline_results(inline_data=inline_data, )
+            inline_data.cached_version = inline_data.version
+        return inline_data.cached_results
+
+    @staticmethod
+    def get_shown_post_ids(inline_results: list[InlineQueryResult], ) -> set[int]:
+        """Post id is the last part of the result id"""
+        return {int(inline_result.id.split()[-1]) for inline_result in inline_results}
+
+    @classmethod
+    def get_cached_ranking(cls, inline_data: InlineData, ) -> list[tuple[int, int, InlinePost]]:
+        """
+        All the posts except the shown in the mix, sorted once per data version instead of on every page.
+        Keys are negative to keep the list ascending (bisect compatible), the most popular and then the newest first.
+        """
+        if inline_data.cached_ranking_version != inline_data.version:
+            shown_post_ids = cls.get_shown_post_ids(
+                inline_results=cls.get_cached_inline_results(inline_data=inline_data, ),
+            )
+            inline_data.cached_ranking = sorted(
+                (
+                    (-inline_post.priority, -inline_post.post.id, inline_post, )
+                    for inline_post in itertools_chain.from_iterable(inline_data.posts)
+                    if inline_post.post.id not in shown_post_ids
+                ),
+                key=lambda item: item[:2],  # Post ids are unique, the posts itself are never compared
+            )
+            inline_data.cached_ranking_version = inline_data.version
+        return inline_data.cached_ranking
+
+    @classmethod
+    def decode_offset(cls, offset: str, streams: tuple[str, ...], ) -> tuple[int, tuple[int, ...]]:
+        """
+        Offset is "<stream> <cursor>", empty (first page) or invalid one is the start.
+        Cursor is the key of the last shown result of the stream (see iter_stream), empty cursor is the stream start.
+        """
+        try:
+            stream, *str_cursor = offset.split()
+            return streams.index(stream), tuple(int(str_key) for str_key in str_cursor)
+        except ValueError:
+            return 0, ()
+
+    @classmethod
+    def iter_stream(
+            cls,
+            stream: str,
+            inline_data: InlineData,
+            query: str,
+            cursor: tuple[int, ...],
+    ) -> Iterator[tuple[tuple[int, ...], InlineQueryResult | None]]:
+        """
+        Yields the cursor and the result (or None if the post can't be shown) for every post of the stream after cursor.
+        The mix and the search are positional: (position, ).
+        The ranked and the collections streams change between the pages (priorities and new posts),
+        so the cursor is the key of the post: (priority, post id) and (collection id, post id) accordingly.
+        """
+        match stream:
+            case cls.Streams.MIX | cls.Streams.SEARCH:
+                position = max(cursor[0], 0, ) if len(cursor) == 1 else 0
+                if stream == cls.Streams.MIX:
+                    inline_results = cls.get_cached_inline_results(inline_data=inline_data, )[position:]
+                else:
+                    inline_posts = inline_data.text_index.search(query=query, limit=position + cls.PAGE_SIZE, )
+                    inline_results = (
+                        get_inline_result(
+                            request_id=f'ranked_post {number} {inline_post.post.id}',  # Chosen result is ranked too
+                            post=inline_post.post,
+                            description='Найденный пост',
+                            reply_markup=cls.Keyboards.Vote.build(post_id=inline_post.post.id, ),
+                        ) for number, inline_post in enumerate(inline_posts[position:], start=position, )
+                    )
+                for position, inline_result in enumerate(inline_results, start=position + 1, ):
+                    yield (position, ), inline_result
+            case cls.Streams.RANKED:  # The most popular posts except the already shown in the mix
+                ranking = cls.get_cached_ranking(inline_data=inline_data, )
+                start = 0
+                if len(cursor) == 2:
+                    priority, post_id = cursor
+                    start = bisect_right(ranking, (-priority, -post_id, ), key=lambda item: item[:2], )
+                for number in range(start, len(ranking), ):
+                    negative_priority, negative_post_id, inline_post = ranking[number]
+                    yield (-negative_priority, -negative_post_id, ), get_inline_result(
+                        request_id=f'ranked_post {number} {inline_post.post.id}',
+                        post=inline_post.post,
+                        description='Популярный пост',
+                        reply_markup=cls.Keyboards.Vote.build(post_id=inline_post.post.id, ),
+                    )
+            case cls.Streams.COLLECTIONS:  # The rest of the collections posts
+                shown_post_ids = cls.get_shown_post_ids(
+                    inline_results=cls.get_cached_inline_results(inline_data=inline_data, ),
+                )
+                collections = inline_data.collections
+                start = post_start = 0
+                if len(cursor) == 2:
+                    collection_id, post_id = cursor
+                    for start, collection in enumerate(collections, ):
+                        if collection.id == collection_id:
+                            post_ids = [post.id for post in collection.posts]
+                            # The post is removed from the collection - continue with the next collection
+                            post_start = post_ids.index(post_id) + 1 if post_id in post_ids else len(post_ids)
+                            break
+                    else:  # The collection is removed - the stream from the start
+                        start = 0
+                number = itertools_count(0)  # Unique id within the page only
+                for collection_number, collection in enumerate(collections[start:], start=start, ):
+                    posts = collection.posts[post_start:] if collection_number == start else collection.posts
+                    for post in posts:
+                        if post.id in shown_post_ids:
+                            continue
+                        yield (collection.id, post.id, ), get_inline_result(
+                            request_id=f'{next(number)} {post.id}',
+                            post=post,
+                            description=f'{collection.name.capitalize()} - стандартная коллекция',
+                            reply_markup=cls.Keyboards.Vote.build(post_id=post.id, ),
+                        )
+
+    @classmethod
+    def get_page(cls, inline_data: InlineData, query: str, offset: str, ) -> tuple[list[InlineQueryResult], str]:
+        """
+        Produce only the requested page, the streams are consumed one by one.
+        Returns the results and the offset of the next page (empty if there are no more results).
+        """
+        streams = cls.SEARCH_STREAMS if query else cls.STREAMS
+        stream_index, cursor = cls.decode_offset(offset=offset, streams=streams, )
+        results = []
+        for stream in streams[stream_index:]:
+            for cursor, result in cls.iter_stream(stream=stream, inline_data=inline_data, query=query, cursor=cursor, ):
+                if result is not None:
+                    results.append(result)
+                    if len(results) == cls.PAGE_SIZE:
+                        return results, ' '.join((stream.value, *map(str, cursor, ), ), )
+            cursor = ()
+        return results, ''
+
     @classmethod
     async def callback(cls, update: Update, context: CallbackContext, ):
-        inline_results = cls.get_cached_inline_results(inline_data=context.bot_data.inline_data, )
+        inline_results, next_offset = cls.get_page(
+            inline_data=context.bot_data.inline_data,
+            query=update.inline_query.query.strip(),
+            offset=update.inline_query.offset,
+        )
         await update.inline_query.answer(
             results=inline_results,
             button=InlineQueryResultsButton(text='Поместить сюда свой пост!', start_parameter=CREATE_PUBLIC_POST_S, ),
             cache_time=10,
-            auto_pagination=True,
+            next_offset=next_offset,
         )
         raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
 
@@ -254,20 +419,11 @@ class InlinePostFeedback:
 
     @classmethod
     async def callback(cls, update: Update, context: CallbackContext, ):
-        _, str_incoming_index, str_post_id = update.chosen_inline_result.result_id.split()
-        for category in context.bot_data.inline_data.posts:
-            for index, inline_post in enumerate(category, ):  # A tiny trick to use it like callback
-                # data
-                if inline_post.post.id == int(str_post_id):
-                    inline_post.priority += 1
-                    heapq_heapify(category)
-                    # Compare enumerate results of sending (itertools_count(0)) and receiving stages
-                    if int(str_incoming_index) != index:
-                        logger.info(
-                            msg='incoming index not equals to the found index, '
-                                'therefore search loop really required.'
-                        )
-                    raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
+        _, _, str_post_id = update.chosen_inline_result.result_id.split()
+        inline_data = context.bot_data.inline_data
+        if inline_data.posts.increase_priority(post_id=int(str_post_id), ) is not None:
+            inline_data.invalidate()
+            raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
 
     @classmethod
     def create_handler(cls, ) -> ChosenInlineResultHandler:
@@ -304,7 +460,7 @@ async def callback(cls, update: Update, context: CallbackContext, ):
             logger.error(msg=e, exc_info=True, )
             await context.view.posts.voting_internal_error(tooltip=update.callback_query, )
         else:  # If no exception was raised
-            handled_vote = context.user.set_vote(post=post, vote=vote, )
+            handled_vote = await context.run_db(context.user.set_vote, post=post, vote=vote, )
             await update.callback_query.answer(text=get_answer_text(handled_vote=handled_vote, ), )
         raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
 
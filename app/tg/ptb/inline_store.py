@@ -0,0 +1,191 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+The core tables have no messages of the posts, but the inline mode shows the messages itself.
+So the posts of the inline data are saved here on the creation and the inline data (bot_data.inline_data)
+is restored from here on startup in the background.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, AsyncIterator
+from asyncio import sleep as asyncio_sleep
+from dataclasses import dataclass
+from json import dumps as json_dumps
+from logging import getLogger
+from time import perf_counter
+
+from telegram import Message
+from rubik_core.db.manager import Postgres, Params as DbParams
+
+from app.config import LOGS_PATH, INLINE_WARM_START_PAGE_SIZE
+from app.postconfig import setup_logger
+from app.db.async_manager import Db, AsyncPostgres, AsyncParams
+from app.db.executor import db_executor
+
+from .entities.post.model import PublicPost
+from .entities.user.model import User as UserModel
+from .entities.collection.services import Collection as CollectionService
+from .inline_mode import get_category
+from .structures import InlinePost, PostsCategories
+
+if TYPE_CHECKING:
+    from telegram import Bot
+    from custom_ptb.callback_context import CallbackContext
+    from .entities.post.model import IPublicPost
+    from .structures import InlineData
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+
+def serialize_post(post: IPublicPost, ) -> dict[str, Any]:
+    """Only the fields used by the inline mode"""
+    return {
+        'id': post.id,
+        'author_id': post.author.id,
+        'channel_id': post.channel_id,
+        'message_id': post.message_id,
+        'message': post.message.to_dict(),
+    }
+
+
+def deserialize_post(data: dict[str, Any], bot: Bot, ) -> PublicPost:
+    return PublicPost(
+        id=data['id'],
+        author=UserModel(id=data['author_id'], ),
+        channel_id=data['channel_id'],
+        message_id=data['message_id'],
+        message=Message.de_json(data=data['message'], bot=bot, ),
+    )
+
+
+class InlineStore:
+
+    db = Db
+    CURSOR_NAME = 'inline_warm_start'
+    YIELD_EVERY = 100  # Posts, indexing of the text is cpu bound, let the updates to be processed
+
+    @dataclass
+    class SQLS:
+        CREATE_TABLE = (
+            'CREATE TABLE IF NOT EXISTS INLINE_POSTS ('
+            'post_id BIGINT PRIMARY KEY, '
+            'collection_id BIGINT, '  # NULL for the posts of the users
+            'post JSONB NOT NULL)'  # serialize_post result
+        )
+        CREATE = (
+            'INSERT INTO INLINE_POSTS (post_id, collection_id, post) VALUES (%s, %s, %s::jsonb) '
+            'ON CONFLICT DO NOTHING'
+        )
+        READ_ALL = 'SELECT collection_id, post FROM INLINE_POSTS ORDER BY post_id'
+
+    @classmethod
+    async def create_table(cls, ) -> None:
+        async with cls.db.get_params() as db_params:
+            await cls.db.create(statement=cls.SQLS.CREATE_TABLE, values=None, db_params=db_params, )
+
+    @classmethod
+    async def save(
+            cls,
+            post: IPublicPost,
+            db_params: DbParams | AsyncParams,
+            collection_id: int | None = None,
+    ) -> None:
+        await cls.db.create(
+            statement=cls.SQLS.CREATE,
+            values=(post.id, collection_id, json_dumps(serialize_post(post=post, ), ), ),
+            db_params=db_params,
+        )
+
+    @classmethod
+    async def iter_pages(cls, page_size: int, ) -> AsyncIterator[list[tuple[int | None, dict[str, Any]]]]:
+        """Server-side (named) cursor, only one page of the rows is in the memory at once"""
+        if AsyncPostgres.pool is not None:
+            async with AsyncPostgres.pool.connection() as connection:
+                async with connection.cursor(name=cls.CURSOR_NAME, ) as cursor:
+                    await cursor.execute(cls.SQLS.READ_ALL, )
+                    while rows := await cursor.fetchmany(size=page_size, ):
+                        yield rows
+            return
+        connection = await db_executor.run(Postgres.connection_pool.getconn, )
+        try:
+            with connection.cursor(name=cls.CURSOR_NAME, withhold=True, ) as cursor:  # withhold works in autocommit
+                cursor.itersize = page_size
+                await db_executor.run(cursor.execute, cls.SQLS.READ_ALL, )
+                while rows := await db_executor.run(cursor.fetchmany, page_size, ):
+                    yield rows
+        finally:
+            connection.rollback()
+            Postgres.connection_pool.putconn(conn=connection, )
+
+    @classmethod
+    async def warm_start(
+            cls,
+            inline_data: InlineData,
+            bot: Bot,
+            page_size: int = INLINE_WARM_START_PAGE_SIZE,
+    ) -> int:
+        """
+        Posts are collected into the plain lists and the heaps are built once at the end (heapify, O(N)).
+        The data added by the updates meanwhile (or restored by the persistence) wins over the loaded one.
+        Returns the number of the loaded rows.
+        """
+        loaded_posts = PostsCategories()
+        collections_posts: dict[int, list[IPublicPost]] = {}
+        rows_num = 0
+        async for rows in cls.iter_pages(page_size=page_size, ):
+            for collection_id, data in rows:
+                rows_num += 1
+                if collection_id is None and data['id'] in inline_data.posts.index:  # Already in the memory
+                    continue
+                post = deserialize_post(data=data, bot=bot, )
+                if collection_id is not None:
+                    collections_posts.setdefault(collection_id, [], ).append(post, )
+                elif (category := get_category(posts=loaded_posts, post=post, )) is not None:
+                    inline_post = InlinePost(post=post, )
+                    category.append(inline_post, )
+                    inline_data.text_index.add(inline_post=inline_post, )  # Skips the already added posts
+                if rows_num % cls.YIELD_EVERY == 0:
+                    await asyncio_sleep(0, )
+        default_collections = await db_executor.run(
+            CollectionService.get_defaults,
+            prefix=CollectionService.NamePrefix.PUBLIC,
+        )
+        # No awaits below, the merge is atomic for the handlers
+        live_posts = inline_data.posts
+        inline_data.posts = PostsCategories(*(
+            [inline_post for inline_post in loaded_category if inline_post.post.id not in live_posts.index]
+            + live_category
+            for loaded_category, live_category in zip(loaded_posts, live_posts, )
+        ))
+        live_collections_ids = {collection.id for collection in inline_data.collections}
+        restored_collections = []
+        for collection in default_collections:
+            if collection.id not in live_collections_ids and (posts := collections_posts.get(collection.id)):
+                collection.posts = posts
+                restored_collections.append(collection, )
+        inline_data.add_collections(collections=restored_collections, )  # Invalidates the cached results too
+        return rows_num
+
+    @classmethod
+    async def warm_start_job(cls, context: CallbackContext, ) -> None:
+        """Runs once by the job queue, i.e. after the start of receiving the updates"""
+        start_time = perf_counter()
+        try:
+            rows_num = await cls.warm_start(inline_data=context.bot_data.inline_data, bot=context.bot, )
+        except Exception as e:
+            logger.error(msg=e, exc_info=True, )
+            return
+        logger.info(msg=f'Inline data warm start: {rows_num} posts loaded in {perf_counter() - start_time:.2f}s', )
@@ -0,0 +1,142 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Check of the stored photos file_ids by get_file.
+The checks are concurrent (bounded), the time of the last successful check is saved by the file_id,
+so the recently checked file_ids are not requested again.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Iterable
+from asyncio import gather as asyncio_gather, sleep as asyncio_sleep, Semaphore as asyncio_Semaphore
+from dataclasses import dataclass
+from logging import getLogger
+from time import time
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from app.config import LOGS_PATH, PHOTOS_VALIDATION_MAX_AGE, PHOTOS_VALIDATION_CONCURRENCY
+from app.postconfig import setup_logger
+from app.db.async_manager import Db
+from app.metrics import registry as metrics_registry
+
+if TYPE_CHECKING:
+    from telegram.ext import ExtBot
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+
+class PhotosValidator:
+
+    db = Db
+
+    @dataclass
+    class SQLS:
+        CREATE_TABLE = (
+            'CREATE TABLE IF NOT EXISTS VALIDATED_FILE_IDS ('
+            'file_id TEXT PRIMARY KEY, '
+            'validated_at DOUBLE PRECISION NOT NULL)'  # Unix time of the last successful get_file
+        )
+        UPSERT_MANY = (
+            'INSERT INTO VALIDATED_FILE_IDS (file_id, validated_at) SELECT UNNEST(%s::TEXT[]), %s '
+            'ON CONFLICT (file_id) DO UPDATE SET validated_at = EXCLUDED.validated_at'
+        )
+        READ_MANY = 'SELECT file_id, validated_at FROM VALIDATED_FILE_IDS WHERE file_id = ANY(%s)'
+
+    def __init__(self, concurrency: int, max_age: float, clock: Callable[[], float] = time, ):
+        self.semaphore = asyncio_Semaphore(value=concurrency, )
+        self.max_age = max_age
+        self.clock = clock
+        self.checked = 0
+        self.skipped = 0  # Recently validated
+        self.invalid = 0
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return {'checked': self.checked, 'skipped': self.skipped, 'invalid': self.invalid, }
+
+    @classmethod
+    async def create_table(cls, ) -> None:
+        async with cls.db.get_params() as db_params:
+            await cls.db.create(statement=cls.SQLS.CREATE_TABLE, values=None, db_params=db_params, )
+
+    async def read_validated_at(self, file_ids: list[str], ) -> dict[str, float]:
+        try:
+            async with self.db.get_params() as db_params:
+                rows = await self.db.read_all(statement=self.SQLS.READ_MANY, values=(file_ids,), db_params=db_params, )
+        except Exception as e:  # All will be checked
+            logger.error(msg=e, exc_info=True, )
+            return {}
+        return dict(rows, )
+
+    async def save_validated_at(self, file_ids: list[str], validated_at: float, ) -> None:
+        try:
+            async with self.db.get_params() as db_params:
+                await self.db.create(
+                    statement=self.SQLS.UPSERT_MANY,
+                    values=(file_ids, validated_at,),
+                    db_params=db_params,
+                )
+        except Exception as e:  # Will be checked again next time
+            logger.error(msg=e, exc_info=True, )
+
+    async def check(self, bot: ExtBot, file_id: str, ) -> bool | None:
+        """None if unknown (network error), the file_id should not be replaced then"""
+        async with self.semaphore:
+            while True:
+                try:
+                    await bot.get_file(file_id=file_id, )
+                    return True
+                except RetryAfter as e:
+                    await asyncio_sleep(e.retry_after, )
+                except BadRequest:  # Invalid file_id
+                    return False
+                except TelegramError as e:
+                    logger.warning(msg=f'Unable to check the file_id: {e}', )
+                    return None
+
+    async def validate(
+            self,
+            bot: ExtBot,
+            photos: Iterable[dict],
+            max_age: float | None = None,
+    ) -> tuple[list[dict], list[dict]]:
+        """
+        photos: dicts with the "link" key (file_id).
+        Returns the validated and the invalid photos in the order of the passed ones.
+        The photos validated less than max_age seconds ago are treated as validated without the request.
+        """
+        photos = list(photos, )
+        max_age = self.max_age if max_age is None else max_age
+        now = self.clock()
+        validated_at = await self.read_validated_at(file_ids=[photo['link'] for photo in photos], ) if max_age else {}
+        stale = [photo for photo in photos if now - validated_at.get(photo['link'], float('-inf'), ) >= max_age]
+        self.skipped += len(photos) - len(stale)
+        results = dict(zip(
+            (photo['link'] for photo in stale),
+            await asyncio_gather(*(self.check(bot=bot, file_id=photo['link'], ) for photo in stale)),
+        ))
+        self.checked += len(stale)
+        if checked_file_ids := [file_id for file_id, result in results.items() if result is True]:
+            await self.save_validated_at(file_ids=checked_file_ids, validated_at=now, )
+        validated, invalid = [], []
+        for photo in photos:
+            (invalid if results.get(photo['link'], ) is False else validated).append(photo, )
+        self.invalid += len(invalid)
+        return validated, invalid
+
+
+photos_validator = PhotosValidator(concurrency=PHOTOS_VALIDATION_CONCURRENCY, max_age=PHOTOS_VALIDATION_MAX_AGE, )
+metrics_registry.register(name='photos_validator', source=photos_validator.get_metrics, )
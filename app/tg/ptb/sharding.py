@@ -0,0 +1,201 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Sharded deployment on a single machine without any broker: python -m app --workers N.
+The supervisor process only receives updates (polling or webhook) and routes every update to a worker process
+by the user id (chat id if no user), so user_data and conversations of the user always live in the same worker.
+Inline mode updates are routed to the main shard which owns the bot-wide inline data,
+the other shards forward their new public posts there.
+Every worker has its own rate limiter with the 1/N share of the bot-wide limits (see SHARDS_NUM).
+
+The persisted state (user_data, conversations) is stored per shard (SHARD_SUFFIX) and isn't migrated:
+after a change of N most of the users are routed to another shard and start with the empty state there,
+the state of the old shards is kept and is used again when N is changed back.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Literal
+from asyncio import (
+    run as asyncio_run,
+    Queue as asyncio_Queue,
+    Event as asyncio_Event,
+    sleep as asyncio_sleep,
+    get_running_loop as asyncio_get_running_loop,
+)
+from logging import getLogger
+from multiprocessing import get_context as multiprocessing_get_context
+from os import environ as os_environ
+from signal import signal, SIGINT, SIGTERM, SIG_IGN
+
+from telegram import Update
+from telegram.ext import Updater
+
+from app.config import LOGS_PATH, UPDATE_QUEUE_MAXSIZE
+from app.postconfig import setup_logger
+
+from . import bot as process_bot  # Every spawned process has its own bot
+from .app import create_ptb_app
+from .inline_mode import add_post_to_inline_data
+from .inline_store import serialize_post, deserialize_post
+from custom_ptb.update_processor import PerKeyUpdateProcessor
+
+if TYPE_CHECKING:
+    from multiprocessing.context import SpawnProcess
+    from multiprocessing.queues import Queue as MultiprocessingQueue
+    from telegram import Bot
+    from telegram.ext import Application
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+MAIN_SHARD = 0
+HEALTH_CHECK_INTERVAL = 5
+
+# Messages of the worker queue: (kind, payload) or None to stop the worker
+UPDATE = 'update'
+INLINE_POST = 'inline_post'
+WorkerMessage = tuple[Literal['update', 'inline_post'], dict[str, Any]] | None
+
+
+def get_shard(update: Update, shards_num: int, ) -> int:
+    if update.inline_query or update.chosen_inline_result:  # Read and change the inline data
+        return MAIN_SHARD
+    if (key := PerKeyUpdateProcessor.get_key(update=update, )) is not None:
+        return hash(key) % shards_num  # Non-negative for negative chat ids too
+    return MAIN_SHARD
+
+
+# # # WORKER # # #
+
+async def handle_worker_messages(application: Application, queue: MultiprocessingQueue, ) -> None:
+    loop = asyncio_get_running_loop()
+    while (message := await loop.run_in_executor(None, queue.get, )) is not None:
+        kind, payload = message
+        if kind == UPDATE:
+            # Waits if the update queue is full, the rest are waiting in the process queue
+            await application.update_queue.put(Update.de_json(data=payload, bot=application.bot, ), )
+        elif kind == INLINE_POST:
+            add_post_to_inline_data(
+                inline_data=application.bot_data.inline_data,
+                post=deserialize_post(data=payload, bot=application.bot, ),
+            )
+
+
+async def serve_worker(shard_id: int, queues: list[MultiprocessingQueue], ) -> None:
+    application = create_ptb_app(bot=process_bot, update_queue_maxsize=UPDATE_QUEUE_MAXSIZE, )
+    if shard_id != MAIN_SHARD:
+        main_shard_queue = queues[MAIN_SHARD]
+        application.bot_data.inline_data.forward = lambda post: main_shard_queue.put(
+            (INLINE_POST, serialize_post(post=post, ),),
+        )
+    async with application:  # initialize and shutdown
+        await application.post_init(application, )
+        await application.start()
+        logger.info(msg=f'Shard {shard_id} started', )
+        try:
+            await handle_worker_messages(application=application, queue=queues[shard_id], )
+        finally:
+            await application.stop()
+    await application.post_shutdown(application, )
+    logger.info(msg=f'Shard {shard_id} stopped', )
+
+
+def run_worker(shard_id: int, queues: list[MultiprocessingQueue], ) -> None:
+    """Process target. The worker is stopped only by the supervisor (None in the queue) to not lose updates"""
+    signal(SIGINT, SIG_IGN, )
+    signal(SIGTERM, SIG_IGN, )
+    asyncio_run(serve_worker(shard_id=shard_id, queues=queues, ), )
+
+
+# # # SUPERVISOR # # #
+
+class Supervisor:
+
+    def __init__(self, workers_num: int, ):
+        self.workers_num = workers_num
+        # Spawn (not fork) cuz the parent already has the bot, the http client and the loggers
+        self.context = multiprocessing_get_context(method='spawn', )
+        self.queues: list[MultiprocessingQueue] = [self.context.Queue() for _ in range(workers_num)]
+        self.processes: list[SpawnProcess | None] = [None] * workers_num
+        self.routed = [0] * workers_num
+        self.is_stopping = False
+
+    def start_worker(self, shard_id: int, ) -> None:
+        # Read by the config of the spawned process
+        os_environ['SHARD_ID'] = str(shard_id)
+        os_environ['SHARDS_NUM'] = str(self.workers_num)
+        try:
+            process = self.context.Process(
+                target=run_worker,
+                kwargs={'shard_id': shard_id, 'queues': self.queues, },
+                name=f'shard_{shard_id}',
+            )
+            process.start()
+        finally:
+            del os_environ['SHARD_ID']
+            del os_environ['SHARDS_NUM']
+        self.processes[shard_id] = process
+
+    def route(self, update: Update, ) -> None:
+        shard_id = get_shard(update=update, shards_num=self.workers_num, )
+        self.queues[shard_id].put((UPDATE, update.to_dict(),), )
+        self.routed[shard_id] += 1
+
+    async def route_updates(self, update_queue: asyncio_Queue, ) -> None:
+        while (update := await update_queue.get()) is not None:
+            self.route(update=update, )
+
+    async def check_workers(self, stop_event: asyncio_Event, ) -> None:
+        """Restart crashed workers, their queues are kept so the updates are not lost"""
+        while not stop_event.is_set():
+            await asyncio_sleep(HEALTH_CHECK_INTERVAL, )
+            for shard_id, process in enumerate(self.processes, ):
+                if not self.is_stopping and not process.is_alive():
+                    logger.error(msg=f'Shard {shard_id} exited with code {process.exitcode}, restarting', )
+                    self.start_worker(shard_id=shard_id, )
+
+    async def serve(self, bot: Bot, webhook_kwargs: dict[str, Any] | None = None, ) -> None:
+        update_queue = asyncio_Queue(maxsize=UPDATE_QUEUE_MAXSIZE, )
+        stop_event = asyncio_Event()
+        loop = asyncio_get_running_loop()
+        for stop_signal in (SIGINT, SIGTERM, ):
+            loop.add_signal_handler(stop_signal, stop_event.set, )
+        async with Updater(bot=bot, update_queue=update_queue, ) as updater:
+            if webhook_kwargs:
+                await updater.start_webhook(**webhook_kwargs, )
+            else:
+                await updater.start_polling()
+            router_task = loop.create_task(self.route_updates(update_queue=update_queue, ), )
+            checker_task = loop.create_task(self.check_workers(stop_event=stop_event, ), )
+            logger.info(msg=f'Supervisor started with {self.workers_num} shards', )
+            await stop_event.wait()
+            self.is_stopping = True
+            await updater.stop()
+            checker_task.cancel()
+            await update_queue.put(None, )  # After the already received updates
+            await router_task
+
+    def run(self, bot: Bot = process_bot, webhook_kwargs: dict[str, Any] | None = None, ) -> None:
+        for shard_id in range(self.workers_num):
+            self.start_worker(shard_id=shard_id, )
+        try:
+            asyncio_run(self.serve(bot=bot, webhook_kwargs=webhook_kwargs, ), )
+        finally:
+            self.is_stopping = True
+            for queue in self.queues:
+                queue.put(None, )  # Worker finishes the already routed updates first
+            for process in self.processes:
+                process.join()
+            logger.info(msg=f'Supervisor stopped, routed updates per shard: {self.routed}', )
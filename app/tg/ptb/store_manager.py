@@ -29,10 +29,11 @@
     filters,
 )
 
-from rubik_core.db.manager import Postgres, Params as DbParams
+from rubik_core.db.manager import Params as DbParams
 
 from app.config import LOGS_PATH
 from app.postconfig import setup_logger
+from app.db.async_manager import Db, AsyncParams
 
 from .entities.post.constants import PostsChannels
 from .entities.post.model import ChannelPublicPost
@@ -53,7 +54,7 @@
 
 class Model:
 
-    db = Postgres
+    db = Db
     Status = ChannelPublicPost.Status
 
     @dataclass
@@ -76,28 +77,28 @@ class SQLS:
         READ_TARGET_BY_SOURCE = 'SELECT (target) FROM M2M_MANAGERS_CHATS WHERE source = %s'
 
     @classmethod
-    def save(
+    async def save(
             cls,
             source: Chat | ChatFullInfo,
             target: Chat | ChatFullInfo,
-            db_params: DbParams,
+            db_params: DbParams | AsyncParams,
     ) -> None:
         # https://t.me/pythontelegrambotgroup/769806
         # telegram.Chat.username should be present if and only if the chat is public
         source_privacy = True if source.username else False
         target_privacy = True if target.username else False
-        cls.db.create(
+        await cls.db.create(
             statement=cls.SQLS.CREATE,
             values=(source.id, target.id, str(source.type), str(target.type), source_privacy, target_privacy,),
             db_params=db_params,
         )
 
     @classmethod
-    def read_target(cls, source: int, db_params: DbParams, ) -> int:
+    async def read_target(cls, source: int, db_params: DbParams | AsyncParams, ) -> int:
         """Read only the target"""
         # telegram.Chat.username should be present if and only if the chat is public
         # https://t.me/pythontelegrambotgroup/769806
-        result = cls.db.read(
+        result = await cls.db.read(
             statement=cls.SQLS.READ_TARGET_BY_SOURCE,
             values=(source,),
             db_params=db_params,
@@ -333,7 +334,7 @@ async def callback(cls, update: Update, context: CallbackContext, ):
         if target_chat.type != ChatType.CHANNEL and not target_chat.permissions.can_send_messages:
             await cls.View.no_permission(message=update.effective_message, )
             raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
-        Model.save(source=update.effective_chat, target=target_chat, db_params=context.db_params, )
+        await Model.save(source=update.effective_chat, target=target_chat, db_params=context.db_params, )
         await cls.View.success_setup(message=update.effective_message, )
         raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
 
@@ -465,7 +466,7 @@ async def callback(cls, update: Update, context: CallbackContext, ):
         elif form.target and not form.source:
             await cls.View.chat_success_added(message=update.effective_message, is_source=False, )
         else:  # If both
-            Model.save(source=form.source, target=form.target, db_params=context.db_params, )
+            await Model.save(source=form.source, target=form.target, db_params=context.db_params, )
             await cls.View.success_setup(message=update.effective_message, )
             del context.user_data.tmp_data.chat_form  # If filled both - clear for future usage
         raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
@@ -510,7 +511,7 @@ async def target_chat_not_registered(cls, message: Message, ) -> Message:
     @classmethod
     async def callback(cls, update: Update, context: CallbackContext, ):
         """Trigger. Subscribe on the store channel and resend to the control channel."""
-        if not Model.read_target(source=update.effective_chat.id, db_params=context.db_params, ):
+        if not await Model.read_target(source=update.effective_chat.id, db_params=context.db_params, ):
             await cls.View.target_chat_not_registered(message=update.effective_message, )
             raise ApplicationHandlerStop()  # Prevent execution of any other handler (even in different groups)
         await update.effective_message.reply_text(
@@ -540,7 +541,7 @@ class SharedBtn:
 
     @classmethod
     async def check_is_registered(cls, update: Update, context: CallbackContext, ) -> int:
-        target_chat_id = Model.read_target(source=update.effective_chat.id, db_params=context.db_params, )
+        target_chat_id = await Model.read_target(source=update.effective_chat.id, db_params=context.db_params, )
         if not target_chat_id:
             await update.callback_query.answer(
                 text=(
@@ -632,11 +633,12 @@ async def unpublish(cls, post: IChannelPublicPost, message: Message, target_chat
     async def callback(cls, update: Update, context: CallbackContext, ):
         """Remove message from the post channel only"""
         target_chat_id = await cls.check_is_registered(update=update, context=context, )
-        post = ChannelPublicPost.read(
+        post = await context.run_db(
+            ChannelPublicPost.read,
             post_id=cls.View.ControlKeyboard.extract_cbk_data(cbk_data=update.callback_query.data, ),
             connection=context.connection,
         )
-        post.unpublish(db_params=context.db_params, )
+        await context.run_db(post.unpublish, db_params=context.db_params, )
         try:
             await cls.View.unpublish(target_chat_id=target_chat_id, message=update.effective_message, post=post, )
         except TelegramError:
@@ -668,14 +670,15 @@ async def remove_post(cls, message: Message, post: IChannelPublicPost, target_ch
     async def callback(cls, update: Update, context: CallbackContext, ):
         """Delete post from the all 3 channels (2 if not published)"""
         target_chat_id = await cls.check_is_registered(update=update, context=context, )
-        post = ChannelPublicPost.read(
+        post = await context.run_db(
+            ChannelPublicPost.read,
             post_id=cls.View.Shared.Keyboards.Control.extract_cbk_data(cbk_data=update.callback_query.data, ),
             connection=context.connection,
         )
-        post.delete(id=post.id, connection=context.connection, )  # Delete only from db
+        await context.run_db(post.delete, id=post.id, connection=context.connection, )  # Delete only from db
         try:
             # TODO check
-            post.unpublish(db_params=context.db_params, )
+            await context.run_db(post.unpublish, db_params=context.db_params, )
             await cls.View.remove_post(message=update.effective_message, post=post, target_chat_id=target_chat_id, )
         except TelegramError:
             pass  # TODO
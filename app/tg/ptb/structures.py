@@ -14,12 +14,18 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Any, Iterator
+from typing import TYPE_CHECKING, Any, Iterator, Iterable, Callable, ClassVar
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
+from heapq import heapify as heapq_heapify, nlargest as heapq_nlargest
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from math import ceil
+from re import compile as re_compile
 
 if TYPE_CHECKING:
-    from telegram import InlineKeyboardButton as tg_IKB
+    from telegram import InlineKeyboardButton as tg_IKB, InlineQueryResult
     from rubik_core.db.manager import connection_type
     from app.tg.ptb.entities.view import View
     from app.tg.ptb.entities.user.model import IUser
@@ -68,7 +74,7 @@ class CollectionsToShare:  # Move to forms?
         collections_to_share: CollectionsToShare | None = None
 
     connection: connection_type | None = None
-    view: View | None = None
+    view: View | None = None  # Not used (see CallbackContext.view), keeps the field order of the stored data
     model: IUser | None = None
     tmp_data: TmpData = field(default_factory=TmpData, )
     forms: Forms = field(default_factory=Forms, )
@@ -83,10 +89,24 @@ class InlinePost:
 
 @dataclass(slots=True, )
 class PostsCategories:
+    """
+    Every category is a min heap by the priority (heapq compatible).
+    The index (post id -> category and position in it) is kept in sync with every swap,
+    so a priority change of a known post costs O(log N) instead of a search and a full heapify.
+    """
     photos: list[InlinePost] = field(default_factory=list, )
     videos: list[InlinePost] = field(default_factory=list, )
     texts: list[InlinePost] = field(default_factory=list, )
     documents: list[InlinePost] = field(default_factory=list, )
+    index: dict[int, tuple[list[InlinePost], int]] = field(
+        default_factory=dict,
+        init=False,
+        repr=False,
+        compare=False,
+    )
+
+    def __post_init__(self, ):
+        self.reindex()
 
     @property
     def all(self) -> list[InlinePost]:
@@ -96,11 +116,145 @@ def __iter__(self) -> Iterator[list[InlinePost]]:
         """Итерация по всем сообщениям."""
         yield from (self.photos, self.videos, self.texts, self.documents, )
 
+    def _place(self, category: list[InlinePost], inline_post: InlinePost, position: int, ) -> None:
+        category[position] = inline_post
+        self.index[inline_post.post.id] = (category, position, )
+
+    def _sift_up(self, category: list[InlinePost], position: int, ) -> None:
+        inline_post = category[position]
+        while position > 0:
+            parent_position = (position - 1) // 2
+            if not inline_post < category[parent_position]:
+                break
+            self._place(category=category, inline_post=category[parent_position], position=position, )
+            position = parent_position
+        self._place(category=category, inline_post=inline_post, position=position, )
+
+    def _sift_down(self, category: list[InlinePost], position: int, ) -> None:
+        inline_post = category[position]
+        while (child_position := 2 * position + 1) < len(category):
+            if child_position + 1 < len(category) and category[child_position + 1] < category[child_position]:
+                child_position += 1  # The smallest child
+            if not category[child_position] < inline_post:
+                break
+            self._place(category=category, inline_post=category[child_position], position=position, )
+            position = child_position
+        self._place(category=category, inline_post=inline_post, position=position, )
+
+    def reindex(self, ) -> None:
+        """Heapify every category and rebuild the index in one pass, O(N)"""
+        self.index.clear()
+        for category in self:
+            heapq_heapify(category)
+            for position, inline_post in enumerate(category, ):
+                self.index[inline_post.post.id] = (category, position, )
+
+    def push(self, category: list[InlinePost], inline_post: InlinePost, ) -> None:
+        if inline_post.post.id in self.index:  # Already added
+            return
+        category.append(inline_post)
+        self._sift_up(category=category, position=len(category) - 1, )
+
+    def increase_priority(self, post_id: int, value: int = 1, ) -> InlinePost | None:
+        """Returns None if no such post"""
+        if (location := self.index.get(post_id)) is None:
+            return None
+        category, position = location
+        inline_post = category[position]
+        inline_post.priority += value
+        self._sift_down(category=category, position=position, )  # Min heap, a greater priority moves to the leaves
+        return inline_post
+
+
+@dataclass(slots=True, )
+class TextIndex:
+    """
+    Trigram inverted index over the text and the captions of the posts, used for the typed inline queries.
+    Posting lists are arrays of the sequential numbers of the posts (4 bytes per entry), sorted by the construction.
+    """
+    WORD_R: ClassVar = re_compile(r'\w+', )
+    MIN_SCORE: ClassVar[float] = 0.6  # Share of the query trigrams the post should contain, tolerates small typos
+
+    postings: dict[str, array] = field(default_factory=dict, )
+    inline_posts: list[InlinePost] = field(default_factory=list, )  # Post number -> inline post
+    numbers: dict[int, int] = field(default_factory=dict, )  # Post id -> post number
+
+    @classmethod
+    def get_trigrams(cls, text: str, is_prefix: bool = False, ) -> set[str]:
+        """is_prefix: the last word may be typed not till the end"""
+        result = set()
+        words = cls.WORD_R.findall(text.casefold(), )
+        for i, word in enumerate(words, start=1, ):
+            padded_word = f' {word}' if is_prefix and i == len(words) else f' {word} '  # Too short prefix is ignored
+            result.update(padded_word[j:j + 3] for j in range(len(padded_word) - 2))
+        return result
+
+    def add(self, inline_post: InlinePost, ) -> None:
+        if inline_post.post.id in self.numbers:  # Already added
+            return
+        number = len(self.inline_posts)
+        self.inline_posts.append(inline_post)
+        self.numbers[inline_post.post.id] = number
+        message = inline_post.post.message
+        for trigram in self.get_trigrams(text=message.text or message.caption or '', ):
+            self.postings.setdefault(trigram, array('I', ), ).append(number)
+
+    def search(self, query: str, limit: int, ) -> list[InlinePost]:
+        """Ranked by the matched trigrams and then by the priority"""
+        posting_lists = sorted(
+            (self.postings.get(trigram, ()) for trigram in self.get_trigrams(text=query, is_prefix=True, )),
+            key=len,
+        )
+        if not posting_lists:
+            return []
+        required_score = ceil(len(posting_lists) * self.MIN_SCORE)
+        # A matched post is in at least one of the rarest lists, only these posts are the candidates
+        seed_lists_num = len(posting_lists) - required_score + 1
+        scores = Counter()
+        for posting_list in posting_lists[:seed_lists_num]:
+            scores.update(posting_list)
+        for posting_list in posting_lists[seed_lists_num:]:
+            if len(posting_list) <= len(scores):
+                for number in posting_list:
+                    if number in scores:
+                        scores[number] += 1
+            else:  # Binary search of the few candidates in the long list
+                for number in scores:
+                    i = bisect_left(posting_list, number, )
+                    if i < len(posting_list) and posting_list[i] == number:
+                        scores[number] += 1
+        return [
+            self.inline_posts[number] for number in heapq_nlargest(
+                limit,
+                (number for number, score in scores.items() if score >= required_score),
+                key=lambda number: (scores[number], self.inline_posts[number].priority, ),
+            )
+        ]
+
 
 @dataclass
 class InlineData:
     collections: list[ICollection] = field(default_factory=list, )  # No need "priority" field and can be used directly
     posts: PostsCategories = field(default_factory=PostsCategories, )
+    text_index: TextIndex = field(default_factory=TextIndex, )
+    # Sharded mode only: the data lives in the main shard process, new posts are sent there by this callable
+    forward: Callable[[IPublicPost], None] | None = None
+    # Ready-made inline results, rebuilt on the first query after any change (when the versions are differ)
+    version: int = 0
+    cached_results: list[InlineQueryResult] = field(default_factory=list, )
+    cached_version: int = -1
+    # The ranked stream: (-priority, -post id, inline post) of the posts out of the mix, ascending, rebuilt the same way
+    # Keys are copied, the priorities of the posts change between the rebuilds
+    cached_ranking: list[tuple[int, int, InlinePost]] = field(default_factory=list, )
+    cached_ranking_version: int = -1
+
+    def invalidate(self, ) -> None:
+        """Call on every change of the posts or collections"""
+        self.version += 1
+
+    def add_collections(self, collections: Iterable[ICollection], ) -> None:
+        self.collections.extend(collections)
+        self.invalidate()
 
 
 @dataclass(slots=True, )
@@ -0,0 +1,144 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+ExtBot which remembers which messages exist.
+Bot API has no method to check a message, so it's probed by a copy (2 requests, see Shared.check_message_existence),
+the results are cached and the messages deleted through the bot are marked as not existing without a probe.
+Also it deletes the messages of a chat by the bulk requests (up to 100 messages per request).
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+
+from telegram.constants import BulkRequestLimit
+from telegram.error import TelegramError, RetryAfter
+from telegram.ext import ExtBot
+
+if TYPE_CHECKING:
+    from typing import Callable, Iterable, Sequence
+
+
+class MessagesExistence:
+    """
+    LRU of the probed messages by (chat id, message id) -> (exists, probed at).
+    Both results expire after ttl: a message may be deleted not through the bot
+    and a failed probe may be caused by the bot rights, not by the deletion.
+    """
+
+    @dataclass(slots=True, )
+    class Metrics:
+        hits: int = 0
+        misses: int = 0
+        invalidated: int = 0
+
+    def __init__(self, ttl: float, max_size: int, clock: Callable[[], float] = monotonic, ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.messages: OrderedDict[tuple[int, int], tuple[bool, float]] = OrderedDict()
+        self.metrics = self.Metrics()
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return {
+            'cached': len(self.messages),
+            'hits': self.metrics.hits,
+            'misses': self.metrics.misses,
+            'invalidated': self.metrics.invalidated,
+        }
+
+    def get(self, chat_id: int, message_id: int, ) -> bool | None:
+        """None if unknown (never probed or expired)"""
+        key = (chat_id, message_id,)
+        if (value := self.messages.get(key, )) is not None:
+            exists, probed_at = value
+            if self.clock() - probed_at < self.ttl:
+                self.messages.move_to_end(key, )
+                self.metrics.hits += 1
+                return exists
+            del self.messages[key]
+        self.metrics.misses += 1
+        return None
+
+    def set(self, chat_id: int, message_id: int, exists: bool, ) -> None:
+        key = (chat_id, message_id,)
+        self.messages[key] = (exists, self.clock(),)
+        self.messages.move_to_end(key, )
+        while len(self.messages) > self.max_size:
+            self.messages.popitem(last=False, )
+
+    def invalidate(self, chat_id: int, message_ids: Iterable[int], ) -> None:
+        """
+        The message is deleted, only the known ones are marked,
+        otherwise any deleted message (e.g. a probe copy) would take a place in the cache.
+        """
+        for message_id in message_ids:
+            if (chat_id, message_id,) in self.messages:
+                self.set(chat_id=chat_id, message_id=message_id, exists=False, )
+                self.metrics.invalidated += 1
+
+
+class Bot(ExtBot, ):
+    __slots__ = ('messages_existence',)
+
+    def __init__(self, *args: Any, messages_existence: MessagesExistence, **kwargs: Any, ):
+        super().__init__(*args, **kwargs, )
+        with self._unfrozen():
+            self.messages_existence = messages_existence
+
+    async def delete_message(self, chat_id: int | str, message_id: int, *args: Any, **kwargs: Any, ) -> bool:
+        """Message.delete and the others are calling it too. Not invalidated if failed (e.g. no rights)"""
+        result = await super().delete_message(chat_id, message_id, *args, **kwargs, )
+        self.messages_existence.invalidate(chat_id=chat_id, message_ids=(message_id,), )
+        return result
+
+    async def delete_messages(
+            self,
+            chat_id: int | str,
+            message_ids: Sequence[int],
+            *args: Any,
+            **kwargs: Any,
+    ) -> bool:
+        result = await super().delete_messages(chat_id, message_ids, *args, **kwargs, )
+        self.messages_existence.invalidate(chat_id=chat_id, message_ids=message_ids, )
+        return result
+
+    async def delete_messages_bulk(self, chat_id: int, message_ids: Sequence[int], **kwargs: Any, ) -> bool:
+        """
+        The missed messages are skipped by Telegram, if the whole request failed (e.g. a too old message),
+        the messages are deleted one by one. Returns False if any message is not deleted.
+        Stops on RetryAfter, it's already retried by the rate limiter and the rest would fail too.
+        """
+        result = True
+        for i in range(0, len(message_ids), BulkRequestLimit.MAX_LIMIT, ):
+            chunk = message_ids[i:i + BulkRequestLimit.MAX_LIMIT]
+            try:
+                await self.delete_messages(chat_id=chat_id, message_ids=chunk, **kwargs, )
+                continue
+            except RetryAfter:
+                return False
+            except TelegramError:
+                pass
+            for message_id in chunk:
+                try:
+                    await self.delete_message(chat_id=chat_id, message_id=message_id, **kwargs, )
+                except RetryAfter:
+                    return False
+                except TelegramError:
+                    result = False
+        return result
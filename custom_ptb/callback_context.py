@@ -14,18 +14,23 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable, TypeVar
 
 from telegram import Update
 from telegram.ext import CallbackContext as PtbCallbackContext, Application
 from rubik_core.db.manager import Postgres, Params as DbParams
 
+from app.db.executor import db_executor
+from app.db.async_manager import AsyncPostgres, AsyncParams
 from app.tg.ptb.entities.view import View
 from app.tg.ptb.entities.user.model import User as UserModel
+from app.tg.ptb.eviction import idle_users
 
 if TYPE_CHECKING:
     from app.tg.ptb.structures import CustomUserData, CustomBotData
 
+T = TypeVar('T')
+
 
 class CallbackContext(PtbCallbackContext, ):
     """Custom class for context."""
@@ -33,7 +38,7 @@ class CallbackContext(PtbCallbackContext, ):
     user_data: CustomUserData
     bot_data: CustomBotData
     chat_data: CustomBotData
-    db_params: DbParams
+    db_params: DbParams | AsyncParams
 
     @property
     def connection(self):
@@ -58,12 +63,20 @@ def user(self, value, ):
         self.user_data.model = value
 
     @property
-    def view(self):
-        return self.user_data.view
+    def view(self) -> View | None:
+        """Built on the first access for the current update only, the views hold nothing but the user"""
+        if (view := self.__dict__.get('_view')) is None and self.user is not None:
+            view = self.__dict__['_view'] = View(user=self.user, )
+        return view
 
     @view.setter
     def view(self, value, ):
-        self.user_data.view = value
+        self.__dict__['_view'] = value
+
+    @staticmethod
+    async def run_db(func: Callable[..., T], /, *args, **kwargs, ) -> T:
+        """Run a blocking DB call (model/service method) off the event loop"""
+        return await db_executor.run(func, *args, **kwargs, )
 
     @classmethod
     def from_update(cls, update: object, application: Application, ) -> CallbackContext:
@@ -71,6 +84,7 @@ def from_update(cls, update: object, application: Application, ) -> CallbackCont
         if update is not None and isinstance(update, Update):  # Some attrs may be assigned even without update, do it?
             # context.user_data is empty if the update was not produced by the user, but by the bot or channel
             if context.user_data:  # user_data guarantees that update.effective_user exists
+                idle_users.touch(user_id=update.effective_user.id, )  # The model below is rebuilt if evicted
                 context.user = (
                         context.user  # None on first request by the cls attribute
                         or
@@ -85,8 +99,11 @@ def from_update(cls, update: object, application: Application, ) -> CallbackCont
                         )
                 )
                 context.connection = context.user.connection
-                context.view = context.view or View(user=context.user, )  # None on first request by the cls attribute
             else:
                 context.connection = Postgres.get_connection(from_pool=True, key=update.effective_chat.id, lazy=True, )
-            context.db_params = DbParams(connection=context.connection, )
+            # The async pool is opened on startup only if the psycopg3 backend was selected
+            if AsyncPostgres.pool is None:
+                context.db_params = DbParams(connection=context.connection, )
+            else:
+                context.db_params = AsyncPostgres.get_params()
         return context
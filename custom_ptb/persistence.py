@@ -0,0 +1,439 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Persistence which keeps every user (chat, conversation key) as a separate record in a database table,
+so a change of one user rewrites only this user record instead of the whole pickle file.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Iterable
+from abc import ABC, abstractmethod
+from asyncio import get_running_loop as asyncio_get_running_loop
+from dataclasses import dataclass, fields as dataclass_fields, is_dataclass, replace as dataclass_replace
+from hashlib import blake2b
+from io import BytesIO
+from json import dumps as json_dumps, loads as json_loads
+from logging import getLogger
+from pickle import HIGHEST_PROTOCOL, Pickler, Unpickler, UnpicklingError
+from sqlite3 import connect as sqlite3_connect
+from threading import Lock
+from zlib import compress as zlib_compress, decompress as zlib_decompress
+
+from psycopg2 import connect as psycopg2_connect
+from psycopg2.extras import execute_values as psycopg2_execute_values
+from telegram import Bot as tg_Bot, TelegramObject
+from telegram.ext import BasePersistence, PersistenceInput
+
+from app.config import LOGS_PATH
+from app.postconfig import setup_logger
+from app.db.executor import db_executor
+
+if TYPE_CHECKING:
+    from asyncio import Task
+    from telegram.ext import ContextTypes
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+Row = tuple[str, str, bytes | None]  # kind, key, data (None to delete)
+
+
+def restore_telegram_object(cls: type[TelegramObject], state: dict[str, Any], bot: tg_Bot | None, ) -> TelegramObject:
+    """Referenced by the pickled data, so must stay importable by this path"""
+    result = cls.__new__(cls, )
+    result.__setstate__(state, )
+    if bot is not None:
+        result.set_bot(bot=bot, )
+    return result
+
+
+class BotPickler(Pickler, ):
+    """
+    Same pickling as PicklePersistence: the bot is replaced by a placeholder and the current bot is set back on load.
+    TelegramObject drops its bot from the state, so the bot is passed to restore_telegram_object separately.
+    """
+
+    KNOWN_BOT = 'known_bot'
+    UNKNOWN_BOT = 'unknown_bot'  # Restored as None
+
+    def __init__(self, bot: tg_Bot, file: BytesIO, ):
+        super().__init__(file, protocol=HIGHEST_PROTOCOL, )
+        self.bot = bot
+
+    def persistent_id(self, obj: Any, ) -> str | None:
+        """Checked before reducer_override, so the bot itself (a TelegramObject too) is never reduced"""
+        if obj is self.bot:
+            return self.KNOWN_BOT
+        if isinstance(obj, tg_Bot, ):
+            return self.UNKNOWN_BOT
+        return None
+
+    def reducer_override(self, obj: Any, ) -> Any:
+        if not isinstance(obj, TelegramObject, ):
+            return NotImplemented
+        try:
+            bot = obj.get_bot()
+        except RuntimeError:  # No bot was set
+            bot = None
+        return restore_telegram_object, (type(obj), obj.__getstate__(), bot,)
+
+
+class BotUnpickler(Unpickler, ):
+
+    def __init__(self, bot: tg_Bot, file: BytesIO, ):
+        super().__init__(file, )
+        self.bot = bot
+
+    def persistent_load(self, pid: str, ) -> tg_Bot | None:
+        if pid == BotPickler.KNOWN_BOT:
+            return self.bot
+        if pid == BotPickler.UNKNOWN_BOT:
+            return None
+        raise UnpicklingError(f'Unknown persistent id: {pid}', )
+
+
+class Storage(ABC, ):
+    """Blocking key-value table, the methods are called in the db executor threads"""
+
+    TABLE = 'PTB_PERSISTENCE'
+
+    def __init__(self, namespace: str = '', ):
+        self.namespace = namespace  # Separates the records of the shards in the shared table
+        self.lock = Lock()  # Single connection, one call at once
+
+    @abstractmethod
+    def read(self, kind: str, key: str, ) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def read_kind(self, kind: str, ) -> list[tuple[str, bytes]]:
+        ...
+
+    @abstractmethod
+    def write(self, rows: list[Row], ) -> None:
+        ...
+
+    @abstractmethod
+    def close(self, ) -> None:
+        ...
+
+
+class SqliteStorage(Storage, ):
+
+    def __init__(self, path: str, namespace: str = '', ):
+        super().__init__(namespace=namespace, )
+        self.connection = sqlite3_connect(path, check_same_thread=False, isolation_level=None, )
+        self.connection.execute('PRAGMA journal_mode=WAL', )
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+            'namespace TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, data BLOB NOT NULL, '
+            'PRIMARY KEY (namespace, kind, key))'
+        )
+
+    def read(self, kind: str, key: str, ) -> bytes | None:
+        with self.lock:
+            row = self.connection.execute(
+                f'SELECT data FROM {self.TABLE} WHERE namespace = ? AND kind = ? AND key = ?',
+                (self.namespace, kind, key,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def read_kind(self, kind: str, ) -> list[tuple[str, bytes]]:
+        with self.lock:
+            return self.connection.execute(
+                f'SELECT key, data FROM {self.TABLE} WHERE namespace = ? AND kind = ?',
+                (self.namespace, kind,),
+            ).fetchall()
+
+    def write(self, rows: list[Row], ) -> None:
+        with self.lock:
+            self.connection.execute('BEGIN', )
+            try:
+                self.connection.executemany(
+                    f'INSERT INTO {self.TABLE} (namespace, kind, key, data) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (namespace, kind, key) DO UPDATE SET data = excluded.data',
+                    [(self.namespace, kind, key, data,) for kind, key, data in rows if data is not None],
+                )
+                self.connection.executemany(
+                    f'DELETE FROM {self.TABLE} WHERE namespace = ? AND kind = ? AND key = ?',
+                    [(self.namespace, kind, key,) for kind, key, data in rows if data is None],
+                )
+                self.connection.execute('COMMIT', )
+            except Exception:
+                self.connection.execute('ROLLBACK', )
+                raise
+
+    def close(self, ) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class PostgresStorage(Storage, ):
+    """Own connection, the persistence is initialized before the app connection pool"""
+
+    def __init__(self, connection_kwargs: dict[str, Any], namespace: str = '', ):
+        super().__init__(namespace=namespace, )
+        self.connection = psycopg2_connect(**connection_kwargs, )
+        self.connection.autocommit = True
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+                'namespace TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, data BYTEA NOT NULL, '
+                'updated_at TIMESTAMPTZ NOT NULL DEFAULT now(), '
+                'PRIMARY KEY (namespace, kind, key))'
+            )
+
+    def read(self, kind: str, key: str, ) -> bytes | None:
+        with self.lock, self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT data FROM {self.TABLE} WHERE namespace = %s AND kind = %s AND key = %s',
+                (self.namespace, kind, key,),
+            )
+            row = cursor.fetchone()
+        return bytes(row[0]) if row else None  # memoryview
+
+    def read_kind(self, kind: str, ) -> list[tuple[str, bytes]]:
+        with self.lock, self.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT key, data FROM {self.TABLE} WHERE namespace = %s AND kind = %s',
+                (self.namespace, kind,),
+            )
+            return [(key, bytes(data),) for key, data in cursor.fetchall()]
+
+    def write(self, rows: list[Row], ) -> None:
+        upserts = [(self.namespace, kind, key, data,) for kind, key, data in rows if data is not None]
+        deletes = [(self.namespace, kind, key,) for kind, key, data in rows if data is None]
+        with self.lock, self.connection:  # Transaction
+            with self.connection.cursor() as cursor:
+                if upserts:
+                    psycopg2_execute_values(
+                        cursor,
+                        f'INSERT INTO {self.TABLE} (namespace, kind, key, data) VALUES %s '
+                        'ON CONFLICT (namespace, kind, key) DO UPDATE SET data = EXCLUDED.data, updated_at = now()',
+                        upserts,
+                        page_size=len(upserts),
+                    )
+                if deletes:
+                    psycopg2_execute_values(
+                        cursor,
+                        f'DELETE FROM {self.TABLE} WHERE (namespace, kind, key) IN (VALUES %s)',
+                        deletes,
+                        page_size=len(deletes),
+                    )
+
+    def close(self, ) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+class DbPersistence(BasePersistence, ):
+    """
+    Every user, chat and conversation key is a separate record (zlib compressed pickle).
+    update_* methods only mark the changed records as dirty, the dirty records are written in batches
+    by a background task, unchanged records (same digest) are not written at all.
+    user_data and chat_data are loaded lazily on the first update of the user (chat) in refresh_*,
+    so the startup doesn't depend on the number of the stored users.
+    """
+
+    USER = 'user'
+    CHAT = 'chat'
+    BOT = 'bot'
+    CALLBACK = 'callback'
+    CONVERSATION = 'conversation'
+
+    @dataclass(slots=True, )
+    class Metrics:
+        loaded: int = 0  # Records read lazily
+        marked: int = 0  # Changed records
+        skipped: int = 0  # Not changed records, not written
+        written: int = 0
+        batches: int = 0
+        failed_batches: int = 0
+        written_bytes: int = 0
+
+    def __init__(
+            self,
+            storage: Storage,
+            context_types: ContextTypes,
+            batch_size: int = 500,
+            transient_user_fields: Iterable[str] = (),
+            compress_level: int = 6,
+            store_data: PersistenceInput | None = None,
+            update_interval: float = 60,
+    ):
+        """transient_user_fields: user_data fields which are not stored and not restored (rebuilt per process)"""
+        super().__init__(store_data=store_data, update_interval=update_interval, )
+        self.storage = storage
+        self.context_types = context_types
+        self.batch_size = batch_size
+        self.transient_user_fields = frozenset(transient_user_fields, )
+        self.compress_level = compress_level
+        self.loaded_user_ids: set[int] = set()
+        self.loaded_chat_ids: set[int] = set()
+        self.dirty: dict[tuple[str, str], bytes | None] = {}
+        self.digests: dict[tuple[str, str], bytes] = {}
+        self.write_task: Task | None = None
+        self.metrics = self.Metrics()
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return {
+            'dirty': len(self.dirty),
+            'loaded_users': len(self.loaded_user_ids),
+            'loaded_chats': len(self.loaded_chat_ids),
+            **{field.name: getattr(self.metrics, field.name, ) for field in dataclass_fields(self.Metrics, )},
+        }
+
+    # # # SERIALIZATION # # #
+
+    def dumps(self, obj: Any, ) -> bytes:
+        buffer = BytesIO()
+        BotPickler(bot=self.bot, file=buffer, ).dump(obj, )
+        return zlib_compress(buffer.getvalue(), self.compress_level, )
+
+    def loads(self, data: bytes, ) -> Any:
+        return BotUnpickler(bot=self.bot, file=BytesIO(zlib_decompress(data, ), ), ).load()
+
+    def strip_user_data(self, user_data: Any, ) -> Any:
+        if self.transient_user_fields and is_dataclass(user_data, ):
+            return dataclass_replace(user_data, **{name: None for name in self.transient_user_fields}, )
+        return user_data
+
+    def restore(self, target: Any, loaded: Any, ) -> None:
+        """Fill the already created (by the update) data object in place, PTB holds the reference to it"""
+        if isinstance(target, dict, ):
+            target.update(loaded, )
+        else:
+            for field in dataclass_fields(target, ):
+                if field.name not in self.transient_user_fields:
+                    setattr(target, field.name, getattr(loaded, field.name, ), )
+
+    # # # WRITING # # #
+
+    def mark(self, kind: str, key: str, data: Any, ) -> None:
+        """data None - delete the record"""
+        item = (kind, key,)
+        blob = None if data is None else self.dumps(obj=data, )
+        if blob is None:
+            self.digests.pop(item, None, )
+        else:
+            digest = blake2b(blob, digest_size=16, ).digest()
+            if self.digests.get(item) == digest:
+                self.metrics.skipped += 1
+                return
+            self.digests[item] = digest
+        self.dirty[item] = blob
+        self.metrics.marked += 1
+        if self.write_task is None or self.write_task.done():
+            # Starts after the other update_* calls of the current persistence update, so they get into one batch
+            self.write_task = asyncio_get_running_loop().create_task(self.write_dirty(), )
+
+    async def write_dirty(self, ) -> None:
+        while self.dirty:
+            batch = [self.dirty.popitem() for _ in range(min(self.batch_size, len(self.dirty), ), )]
+            rows = [(kind, key, blob,) for (kind, key,), blob in batch]
+            try:
+                await db_executor.run(self.storage.write, rows, )
+            except Exception as e:
+                logger.error(msg=e, exc_info=True, )
+                self.metrics.failed_batches += 1
+                for item, blob in batch:  # Retried with the next change or on flush, newer data is not overwritten
+                    self.dirty.setdefault(item, blob, )
+                return
+            self.metrics.batches += 1
+            self.metrics.written += len(rows)
+            self.metrics.written_bytes += sum(len(blob) for _, _, blob in rows if blob is not None)
+
+    # # # READING # # #
+
+    async def read(self, kind: str, key: str, ) -> Any:
+        if (data := await db_executor.run(self.storage.read, kind, key, )) is None:
+            return None
+        self.metrics.loaded += 1
+        return self.loads(data=data, )
+
+    async def get_user_data(self, ) -> dict[int, Any]:
+        return {}  # Lazy, see refresh_user_data
+
+    async def get_chat_data(self, ) -> dict[int, Any]:
+        return {}  # Lazy, see refresh_chat_data
+
+    async def get_bot_data(self, ) -> Any:
+        if (bot_data := await self.read(kind=self.BOT, key='', )) is None:
+            return self.context_types.bot_data()
+        return bot_data
+
+    async def get_callback_data(self, ) -> Any:
+        return await self.read(kind=self.CALLBACK, key='', )
+
+    async def get_conversations(self, name: str, ) -> dict[tuple[int | str, ...], object]:
+        """Eager, states are tiny and the handlers need them before any update"""
+        rows = await db_executor.run(self.storage.read_kind, f'{self.CONVERSATION}.{name}', )
+        return {tuple(json_loads(key, )): self.loads(data=data, ) for key, data in rows}
+
+    async def refresh_user_data(self, user_id: int, user_data: Any, ) -> None:
+        if user_id in self.loaded_user_ids:
+            return
+        if (loaded := await self.read(kind=self.USER, key=str(user_id), )) is not None:
+            self.restore(target=user_data, loaded=loaded, )
+        self.loaded_user_ids.add(user_id, )  # Not added on error, so the stored data is not overwritten by empty
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any, ) -> None:
+        if chat_id in self.loaded_chat_ids:
+            return
+        if (loaded := await self.read(kind=self.CHAT, key=str(chat_id), )) is not None:
+            self.restore(target=chat_data, loaded=loaded, )
+        self.loaded_chat_ids.add(chat_id, )
+
+    async def refresh_bot_data(self, bot_data: Any, ) -> None:
+        """Bot data is loaded on startup"""
+
+    # # # UPDATING # # #
+
+    async def update_user_data(self, user_id: int, data: Any, ) -> None:
+        if user_id in self.loaded_user_ids:  # Otherwise the stored data was not read yet
+            self.mark(kind=self.USER, key=str(user_id), data=self.strip_user_data(user_data=data, ), )
+
+    async def update_chat_data(self, chat_id: int, data: Any, ) -> None:
+        if chat_id in self.loaded_chat_ids:
+            self.mark(kind=self.CHAT, key=str(chat_id), data=data, )
+
+    async def update_bot_data(self, data: Any, ) -> None:
+        self.mark(kind=self.BOT, key='', data=data, )
+
+    async def update_callback_data(self, data: Any, ) -> None:
+        self.mark(kind=self.CALLBACK, key='', data=data, )
+
+    async def update_conversation(self, name: str, key: tuple[int | str, ...], new_state: object | None, ) -> None:
+        self.mark(kind=f'{self.CONVERSATION}.{name}', key=json_dumps(key, ), data=new_state, )
+
+    async def drop_user_data(self, user_id: int, ) -> None:
+        self.loaded_user_ids.add(user_id, )  # Nothing to load anymore
+        self.mark(kind=self.USER, key=str(user_id), data=None, )
+
+    async def drop_chat_data(self, chat_id: int, ) -> None:
+        self.loaded_chat_ids.add(chat_id, )
+        self.mark(kind=self.CHAT, key=str(chat_id), data=None, )
+
+    async def flush(self, ) -> None:
+        """Called on the shutdown and by the admin command while running, so the storage stays open"""
+        if self.write_task is not None:
+            await self.write_task
+        await self.write_dirty()
+        if self.dirty:
+            logger.error(msg=f'Persistence flush failed, {len(self.dirty)} records are not saved', )
+
+    async def close(self, ) -> None:
+        """On the application shutdown, after the last flush"""
+        await db_executor.run(self.storage.close, )
@@ -0,0 +1,239 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Outbound requests limiter: token buckets for all the requests (global), per private chat and per group/channel.
+The waiting requests get the tokens by priority, so the interactive replies overtake the mass jobs.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, Coroutine
+from asyncio import (
+    ensure_future as asyncio_ensure_future,
+    get_running_loop as asyncio_get_running_loop,
+    sleep as asyncio_sleep,
+)
+from contextlib import suppress
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+from logging import getLogger
+from time import monotonic
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from app.config import LOGS_PATH
+from app.postconfig import setup_logger
+
+if TYPE_CHECKING:
+    from asyncio import Future, Task
+    from telegram._utils.types import JSONDict
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+
+class TokenBucket:
+    """
+    rate tokens per second, up to capacity tokens are accumulated while idle (burst).
+    pause - no tokens at all for some time (Telegram asked to retry after).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, clock: Callable[[], float] = monotonic, ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.paused_until = 0.0
+
+    def refill(self, now: float, ) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate, )
+        self.updated_at = now
+
+    def try_acquire(self, ) -> float:
+        """0 if the token is taken, otherwise seconds to wait before the next try"""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.refill(now=max(now, self.updated_at, ), )
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, ) -> None:
+        while (delay := self.try_acquire()) > 0:
+            await asyncio_sleep(delay, )
+
+    def pause(self, seconds: float, ) -> None:
+        now = self.clock()
+        self.paused_until = max(self.paused_until, now + seconds, )
+        self.tokens = 0
+        self.updated_at = self.paused_until  # Nothing accumulated during the pause
+
+    def check_is_full(self, ) -> bool:
+        now = self.clock()
+        if now < self.paused_until:
+            return False
+        self.refill(now=max(now, self.updated_at, ), )
+        return self.tokens >= self.capacity
+
+
+class Priority(IntEnum):
+    """Lower is served first. Passed to a bot method as rate_limit_args, e.g. send_message(..., rate_limit_args=BULK)"""
+    INTERACTIVE = 0  # The user waits for it: callback and inline query answers
+    DEFAULT = 1
+    BULK = 2  # Mass jobs: default collections upload, posts sharing
+
+
+class PriorityBucket:
+    """Token bucket where the waiting requests get the tokens by the priority, then in the order of arrival"""
+
+    def __init__(self, bucket: TokenBucket, ):
+        self.bucket = bucket
+        self.waiters: list[tuple[int, int, Future]] = []  # Heap
+        self.counter = count()  # FIFO inside a priority
+        self.pump_task: Task | None = None
+
+    def check_is_idle(self, ) -> bool:
+        """Nobody waits and the bucket is full, the same as the new one"""
+        return not self.waiters and self.bucket.check_is_full()
+
+    async def acquire(self, priority: int, ) -> bool:
+        """Returns True if the request had to wait (throttled)"""
+        if not self.waiters and self.bucket.try_acquire() == 0:
+            return False
+        future = asyncio_get_running_loop().create_future()
+        heappush(self.waiters, (priority, next(self.counter), future, ), )
+        if self.pump_task is None or self.pump_task.done():
+            self.pump_task = asyncio_ensure_future(self.pump(), )
+        await future
+        return True
+
+    async def pump(self, ) -> None:
+        """Hands out the tokens to the waiters as they are accumulated"""
+        while self.waiters:
+            if (delay := self.bucket.try_acquire()) > 0:
+                await asyncio_sleep(delay, )
+                continue
+            while self.waiters:
+                *_, future = heappop(self.waiters, )
+                if not future.done():  # Else cancelled by the caller
+                    future.set_result(None, )
+                    break
+            else:
+                self.bucket.tokens = min(self.bucket.capacity, self.bucket.tokens + 1, )  # Nobody to take it
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """
+    The global limit is applied to all the requests (answers of the callback and inline queries have no chat_id too),
+    the chat limits - only to the requests with the chat_id.
+    rate_limit_args of a request is its priority (Priority), by default INTERACTIVE for the answers, else DEFAULT.
+    On 429 (RetryAfter) only the bucket of the chat is paused, the other chats are not delayed.
+    """
+
+    MAX_BUCKETS = 512  # The idle chat buckets are dropped above it
+    INTERACTIVE_ENDPOINTS = frozenset({'answerCallbackQuery', 'answerInlineQuery', 'answerPreCheckoutQuery', }, )
+
+    def __init__(
+            self,
+            overall_rate: float = 30,  # Per second
+            chat_rate: float | None = None,  # Per second, private chats, not limited if None (like AIORateLimiter)
+            chat_burst: float = 3,
+            group_rate: float = 20 / 60,  # Per second, groups and channels
+            group_burst: float = 20,
+            max_retries: int = 0,
+            clock: Callable[[], float] = monotonic,
+    ):
+        self.overall = PriorityBucket(bucket=TokenBucket(rate=overall_rate, capacity=overall_rate, clock=clock, ), )
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.clock = clock
+        self.chats: dict[int | str, PriorityBucket] = {}
+        self.requests = 0
+        self.throttled = 0  # Waited for a token
+        self.retry_after = 0  # 429 responses
+
+    def get_metrics(self, ) -> dict[str, int]:
+        return {
+            'requests': self.requests,
+            'queued': len(self.overall.waiters) + sum(len(bucket.waiters) for bucket in self.chats.values()),
+            'throttled': self.throttled,
+            'retry_after': self.retry_after,
+            'chats': len(self.chats),
+        }
+
+    async def initialize(self, ) -> None:
+        """Nothing to initialize"""
+
+    async def shutdown(self, ) -> None:
+        """Nothing to close, the pumps finish with the last waiter"""
+
+    def get_priority(self, endpoint: str, rate_limit_args: int | None, ) -> int:
+        if rate_limit_args is not None:
+            return rate_limit_args
+        return Priority.INTERACTIVE if endpoint in self.INTERACTIVE_ENDPOINTS else Priority.DEFAULT
+
+    def get_chat_bucket(self, chat_id: int | str, ) -> PriorityBucket | None:
+        """None for a private chat if the private chats are not limited"""
+        is_group = isinstance(chat_id, str, ) or chat_id < 0  # @username of a channel or a group
+        if not is_group and self.chat_rate is None:
+            return None
+        if (result := self.chats.get(chat_id)) is None:
+            if len(self.chats) >= self.MAX_BUCKETS:
+                self.chats = {key: bucket for key, bucket in self.chats.items() if not bucket.check_is_idle()}
+            if is_group:
+                bucket = TokenBucket(rate=self.group_rate, capacity=self.group_burst, clock=self.clock, )
+            else:
+                bucket = TokenBucket(rate=self.chat_rate, capacity=self.chat_burst, clock=self.clock, )
+            result = self.chats[chat_id] = PriorityBucket(bucket=bucket, )
+        return result
+
+    async def process_request(
+            self,
+            callback: Callable[..., Coroutine[Any, Any, bool | JSONDict | list[JSONDict]]],
+            args: Any,
+            kwargs: dict[str, Any],
+            endpoint: str,
+            data: dict[str, Any],
+            rate_limit_args: int | None,
+    ) -> bool | JSONDict | list[JSONDict]:
+        priority = self.get_priority(endpoint=endpoint, rate_limit_args=rate_limit_args, )
+        chat_id = data.get('chat_id')
+        with suppress(ValueError, TypeError, ):
+            chat_id = int(chat_id, )
+        self.requests += 1
+        for attempt in range(self.max_retries + 1, ):
+            chat_bucket = None if chat_id is None else self.get_chat_bucket(chat_id=chat_id, )
+            is_throttled = chat_bucket is not None and await chat_bucket.acquire(priority=priority, )
+            is_throttled = await self.overall.acquire(priority=priority, ) or is_throttled
+            self.throttled += is_throttled
+            try:
+                return await callback(*args, **kwargs, )
+            except RetryAfter as e:
+                self.retry_after += 1
+                if attempt == self.max_retries:
+                    logger.error(msg=f'Rate limit hit after {self.max_retries} retries, {endpoint}, chat {chat_id}.', )
+                    raise
+                logger.info(msg=f'Rate limit hit, {endpoint}, chat {chat_id}, retry after {e.retry_after} s.', )
+                if chat_bucket is None:
+                    await asyncio_sleep(e.retry_after, )
+                else:  # The next acquire waits for the pause
+                    chat_bucket.bucket.pause(seconds=e.retry_after, )
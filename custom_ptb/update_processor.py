@@ -0,0 +1,108 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any
+from collections import deque
+from logging import getLogger
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from app.config import LOGS_PATH
+from app.postconfig import setup_logger
+
+if TYPE_CHECKING:
+    from typing import Awaitable
+
+logger = setup_logger(logger=getLogger(__name__), filename=f'{LOGS_PATH}/{__name__.split(".")[-1]}.log')
+
+
+class PerKeyUpdateProcessor(BaseUpdateProcessor, ):
+    """
+    Updates of different users (chats) are processed concurrently (up to max_concurrent_updates),
+    updates of the same user (chat) - one by one in the receiving (FIFO) order,
+    so user_data (forms, tmp_data) and conversation handlers still see one update per user at a time.
+
+    The first update of the key takes a concurrency slot and processes the key queue until it's empty,
+    the next updates of the same key are just added to the queue and release the slot immediately,
+    so a single flooding user can't occupy all the slots.
+    An error of an update is logged and the key queue processing goes on.
+    """
+
+    TOP_KEYS_IN_METRICS = 10
+
+    def __init__(self, max_concurrent_updates: int, ):
+        super().__init__(max_concurrent_updates=max_concurrent_updates, )
+        self.queues: dict[int, deque[Awaitable[Any]]] = {}  # Only keys with an update in progress
+        self.processed = 0
+        self.max_key_queue_depth = 0
+
+    @staticmethod
+    def get_key(update: object, ) -> int | None:
+        """Private chat id is equal to the user id, so both types of updates of the user will share the queue"""
+        if isinstance(update, Update, ):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None  # Custom updates (if any) have no order guaranties
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any], ) -> None:
+        key = self.get_key(update=update, )
+        if key is None:
+            await coroutine
+            self.processed += 1
+            return
+        if (queue := self.queues.get(key)) is not None:  # Will be processed by the update in progress
+            queue.append(coroutine, )
+            self.max_key_queue_depth = max(self.max_key_queue_depth, len(queue), )
+            return
+        self.queues[key] = queue = deque()
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception as e:  # Don't drop the queued updates of the key
+                    logger.error(msg=e, exc_info=True, )
+                self.processed += 1
+                if not queue:
+                    break
+                coroutine = queue.popleft()
+        finally:
+            del self.queues[key]
+            for coroutine in queue:  # Not empty only if cancelled (shutdown)
+                coroutine.close()  # Suppress "never awaited" warning
+
+    async def initialize(self, ) -> None:
+        pass
+
+    async def shutdown(self, ) -> None:
+        pass
+
+    def get_metrics(self, ) -> dict[str, int]:
+        """Active keys are keys with update in progress, depth of the key is the number of waiting updates"""
+        top_keys = sorted(self.queues.items(), key=lambda item: len(item[1]), reverse=True, )
+        result = {
+            'max_concurrent_updates': self.max_concurrent_updates,
+            'active_keys': len(self.queues),
+            'queued_updates': sum(len(queue) for queue in self.queues.values()),
+            'max_key_queue_depth': self.max_key_queue_depth,
+            'processed': self.processed,
+        }
+        for key, queue in top_keys[:self.TOP_KEYS_IN_METRICS]:
+            if queue:
+                result[f'key_{key}_queue_depth'] = len(queue)
+        return result
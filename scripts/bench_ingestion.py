@@ -0,0 +1,187 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Update-to-handler latency: polling vs webhook.
+Both modes are served by a local fake Bot API server, so only the ingestion path is measured (no network, no DB).
+Usage: python scripts/bench_ingestion.py --updates 500 --interval 0.002
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from argparse import ArgumentParser
+from asyncio import (
+    Event as asyncio_Event,
+    run as asyncio_run,
+    sleep as asyncio_sleep,
+    wait_for as asyncio_wait_for,
+    TimeoutError as asyncio_TimeoutError,
+)
+from json import dumps as json_dumps
+from socket import socket
+from statistics import mean, quantiles
+from time import perf_counter, time
+
+from httpx import AsyncClient as httpx_AsyncClient
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from tornado.web import Application as TornadoApplication, RequestHandler
+
+if TYPE_CHECKING:
+    pass
+
+TOKEN = '123:bench'
+SECRET_TOKEN = 'bench_secret'
+BOT = {'id': 123, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot', }
+USER = {'id': 1, 'is_bot': False, 'first_name': 'user', }
+
+
+def get_free_port() -> int:
+    with socket() as sock:
+        sock.bind(('127.0.0.1', 0), )
+        return sock.getsockname()[1]
+
+
+def create_update(update_id: int, ) -> dict:
+    """The send time is passed in the text to be read by the handler"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time()),
+            'chat': {'id': USER['id'], 'type': 'private', },
+            'from': USER,
+            'text': repr(perf_counter()),
+        },
+    }
+
+
+class FakeBotApi:
+    """Minimal Bot API: getMe, getUpdates (long polling) and "True" for the rest of the methods"""
+
+    def __init__(self, ):
+        self.pending: list[dict] = []
+        self.new_updates = asyncio_Event()
+
+    def put(self, update: dict, ) -> None:
+        self.pending.append(update, )
+        self.new_updates.set()
+
+    async def get_updates(self, offset: int, limit: int, timeout: float, ) -> list[dict]:
+        self.pending = [update for update in self.pending if update['update_id'] >= offset]
+        if not self.pending:
+            self.new_updates.clear()
+            try:
+                await asyncio_wait_for(self.new_updates.wait(), timeout=timeout, )
+            except asyncio_TimeoutError:
+                pass
+        return self.pending[:limit]
+
+    def create_app(self, ) -> TornadoApplication:
+        api = self
+
+        class Handler(RequestHandler, ):
+            async def post(self, method: str, ):
+                if method == 'getMe':
+                    result = BOT
+                elif method == 'getUpdates':
+                    result = await api.get_updates(
+                        offset=int(self.get_body_argument('offset', '0', )),
+                        limit=int(self.get_body_argument('limit', '100', )),
+                        timeout=float(self.get_body_argument('timeout', '0', )),
+                    )
+                else:
+                    result = True
+                self.set_header('Content-Type', 'application/json', )
+                self.write(json_dumps({'ok': True, 'result': result, }, ), )
+
+        return TornadoApplication(handlers=[(rf'/bot{TOKEN}/(\w+)', Handler), ], )
+
+
+async def measure(mode: str, updates_num: int, interval: float, ) -> list[float]:
+    api = FakeBotApi()
+    api_port = get_free_port()
+    server = api.create_app().listen(port=api_port, address='127.0.0.1', )
+    latencies = []
+    all_handled = asyncio_Event()
+
+    async def handler(update: Update, _, ):
+        latencies.append(perf_counter() - float(update.effective_message.text), )
+        if len(latencies) == updates_num:
+            all_handled.set()
+
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f'http://127.0.0.1:{api_port}/bot')
+        .build()
+    )
+    application.add_handler(handler=TypeHandler(type=Update, callback=handler, ), )
+    async with application:
+        if mode == 'polling':
+            await application.updater.start_polling(poll_interval=0, timeout=10, )
+            send = api.put
+        else:
+            webhook_port = get_free_port()
+            await application.updater.start_webhook(
+                listen='127.0.0.1',
+                port=webhook_port,
+                url_path='webhook',
+                webhook_url=f'http://127.0.0.1:{webhook_port}/webhook',
+                secret_token=SECRET_TOKEN,
+            )
+            client = httpx_AsyncClient(
+                base_url=f'http://127.0.0.1:{webhook_port}',
+                headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN, },
+            )
+
+            def send(update: dict, ):
+                application.create_task(coroutine=client.post(url='/webhook', json=update, ), )
+
+        await application.start()
+        for update_id in range(1, updates_num + 1):
+            send(create_update(update_id=update_id, ), )
+            await asyncio_sleep(interval, )
+        await asyncio_wait_for(all_handled.wait(), timeout=60, )
+        await application.updater.stop()
+        await application.stop()
+        if mode == 'webhook':
+            await client.aclose()
+    api.new_updates.set()  # Release the hanging long polling request
+    await asyncio_sleep(0.1, )
+    server.stop()
+    return latencies
+
+
+def print_report(mode: str, latencies: list[float], ) -> None:
+    p50, p95, p99 = (quantiles(latencies, n=100, )[i] for i in (49, 94, 98))
+    print(
+        f'{mode:<8} n={len(latencies)} '
+        f'mean={mean(latencies) * 1000:.2f}ms p50={p50 * 1000:.2f}ms '
+        f'p95={p95 * 1000:.2f}ms p99={p99 * 1000:.2f}ms max={max(latencies) * 1000:.2f}ms'
+    )
+
+
+async def main(updates_num: int, interval: float, ) -> None:
+    for mode in ('polling', 'webhook', ):
+        print_report(mode=mode, latencies=await measure(mode=mode, updates_num=updates_num, interval=interval, ), )
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--updates', default=500, type=int, )
+    parser.add_argument('--interval', default=0.002, type=float, help='Seconds between the updates', )
+    args = parser.parse_args()
+    asyncio_run(main(updates_num=args.updates, interval=args.interval, ), )
@@ -0,0 +1,74 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Memory of user_data of N synthetic users before and after the idle users eviction.
+Every user gets the model like after the first update (no DB, the connection is lazy anyway).
+Usage: python scripts/bench_user_data_memory.py --users 100000 --active 1000
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser
+from gc import collect as gc_collect
+from time import perf_counter
+import tracemalloc
+
+from telegram import User as PtbUser
+
+from app.tg.ptb.structures import CustomUserData
+from app.tg.ptb.entities.user.model import User as UserModel
+from app.tg.ptb.eviction import IdleUsers
+
+
+def create_user_data(user_id: int, ) -> CustomUserData:
+    model = UserModel(id=user_id, ptb=PtbUser(id=user_id, first_name=f'user_{user_id}', is_bot=False, ), )
+    return CustomUserData(model=model, )
+
+
+def get_traced_mb() -> float:
+    gc_collect()
+    return tracemalloc.get_traced_memory()[0] / 1024 / 1024
+
+
+def main(users_num: int, active_num: int, ) -> None:
+    tracemalloc.start()
+    start = get_traced_mb()
+    now = 0
+    idle_users = IdleUsers(ttl=60, max_hydrated=users_num, clock=lambda: now, )
+    user_data = {}
+    for user_id in range(users_num):
+        user_data[user_id] = create_user_data(user_id=user_id, )
+        now = 0 if user_id < users_num - active_num else 100  # The last users are recently active
+        idle_users.touch(user_id=user_id, )
+    hydrated = get_traced_mb() - start
+    started_at = perf_counter()
+    evicted = idle_users.evict(user_data=user_data, now=120, )
+    eviction_time = perf_counter() - started_at
+    evicted_mb = get_traced_mb() - start
+    tracemalloc.stop()
+    print(
+        f'users={users_num} active={active_num}\n'
+        f'before: {hydrated:.1f} MB ({hydrated * 1024 * 1024 / users_num:.0f} B per user)\n'
+        f'after:  {evicted_mb:.1f} MB ({evicted_mb * 1024 * 1024 / users_num:.0f} B per user)\n'
+        f'evicted={evicted} in {eviction_time * 1000:.1f} ms'
+    )
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--users', default=100_000, type=int, )
+    parser.add_argument('--active', default=1000, type=int, help='Recently active users, not evicted', )
+    args = parser.parse_args()
+    main(users_num=args.users, active_num=args.active, )
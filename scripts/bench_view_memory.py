@@ -0,0 +1,85 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Memory and setup time of the views: the whole tree per user (as stored in user_data before)
+vs the view built per update with only the used sub views.
+Usage: python scripts/bench_view_memory.py --users 100000
+"""
+
+from __future__ import annotations
+from argparse import ArgumentParser
+from gc import collect as gc_collect
+from time import perf_counter
+import tracemalloc
+
+from telegram import User as PtbUser
+
+from app.tg.ptb.entities.user.model import User as UserModel
+from app.tg.ptb.entities.view import View
+
+SUB_VIEWS = ('reg', 'match', 'posts', 'collections', 'mix', 'cjm', 'warn',)
+POSTS_SUB_VIEWS = ('public', 'channel_public_post', 'bot_public_post', 'personal', 'bot_personal_post',)
+
+
+def create_full_tree(user: UserModel, ) -> View:
+    """Every sub view created like the eager View.__init__ did"""
+    view = View(user=user, )
+    for name in SUB_VIEWS:
+        getattr(view, name, )
+    for name in POSTS_SUB_VIEWS:
+        getattr(view.posts, name, )
+    view.reg.warn, view.match.warn  # noqa
+    return view
+
+
+def create_per_update(user: UserModel, ) -> View:
+    """Typical handler touches a single sub view"""
+    view = View(user=user, )
+    view.posts.public  # noqa
+    return view
+
+
+def get_traced_mb() -> float:
+    gc_collect()
+    return tracemalloc.get_traced_memory()[0] / 1024 / 1024
+
+
+def main(users_num: int, ) -> None:
+    users = [
+        UserModel(id=user_id, ptb=PtbUser(id=user_id, first_name=f'user_{user_id}', is_bot=False, ), )
+        for user_id in range(users_num)
+    ]
+    for name, create in (('full tree', create_full_tree,), ('per update', create_per_update,),):
+        tracemalloc.start()
+        start = get_traced_mb()
+        started_at = perf_counter()
+        views = [create(user=user, ) for user in users]  # Kept to measure the memory of a single view
+        setup_time = perf_counter() - started_at
+        used_mb = get_traced_mb() - start
+        tracemalloc.stop()
+        del views
+        print(
+            f'{name:<10} {used_mb * 1024 * 1024 / users_num:.0f} B per view, '
+            f'{setup_time / users_num * 1_000_000:.1f} us per view'
+        )
+    print('Retained per idle user: full tree (before) - as above, per update (now) - 0 B', )
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--users', default=100_000, type=int, )
+    args = parser.parse_args()
+    main(users_num=args.users, )
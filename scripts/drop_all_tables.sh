@@ -16,5 +16,9 @@ DROP TABLE IF EXISTS public.shown_users CASCADE;
 DROP TABLE IF EXISTS public.user_photos CASCADE;
 DROP TABLE IF EXISTS public.users CASCADE;
 DROP TABLE IF EXISTS public.m2m_managers_chats CASCADE;
+DROP TABLE IF EXISTS public.inline_posts CASCADE;
+DROP TABLE IF EXISTS public.asset_file_ids CASCADE;
+DROP TABLE IF EXISTS public.bootstrap_manifest CASCADE;
+DROP TABLE IF EXISTS public.validated_file_ids CASCADE;
 "
 
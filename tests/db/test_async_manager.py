@@ -0,0 +1,125 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any as typing_Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.db import async_manager
+
+from tests.conftest import patch_object
+
+if TYPE_CHECKING:
+    pass
+
+
+@pytest.fixture(scope='function', )
+def mock_async_params() -> async_manager.AsyncParams:
+    yield async_manager.AsyncParams(pool=MagicMock(), )
+
+
+class TestAsyncPostgres:
+
+    @staticmethod
+    async def test_read(mock_async_params: async_manager.AsyncParams, ):
+        mock_connection = mock_async_params.pool.connection.return_value.__aenter__.return_value
+        mock_connection.execute = AsyncMock()
+        mock_connection.execute.return_value.fetchone = AsyncMock(return_value=(1, 2,), )
+        result = await async_manager.AsyncPostgres.read(statement='foo', values=(1,), db_params=mock_async_params, )
+        mock_connection.execute.acow('foo', (1,), )
+        assert result == 1
+
+    @staticmethod
+    async def test_read_empty(mock_async_params: async_manager.AsyncParams, ):
+        mock_connection = mock_async_params.pool.connection.return_value.__aenter__.return_value
+        mock_connection.execute = AsyncMock()
+        mock_connection.execute.return_value.fetchone = AsyncMock(return_value=None, )
+        result = await async_manager.AsyncPostgres.read(statement='foo', values=(1,), db_params=mock_async_params, )
+        assert result is None
+
+    @staticmethod
+    async def test_read_all(mock_async_params: async_manager.AsyncParams, ):
+        mock_connection = mock_async_params.pool.connection.return_value.__aenter__.return_value
+        mock_connection.execute = AsyncMock()
+        mock_connection.execute.return_value.fetchall = AsyncMock(return_value=[(1,), (2,), ], )
+        result = await async_manager.AsyncPostgres.read_all(
+            statement='foo',
+            values=(1,),
+            db_params=mock_async_params,
+        )
+        mock_connection.execute.acow('foo', (1,), )
+        assert result == [(1,), (2,), ]
+
+
+@pytest.mark.parametrize(argnames='is_idle', argvalues=(True, False,), )
+def test_read_all(is_idle: bool, ):
+    """Only the transaction opened by the read is ended"""
+    mock_db_params = MagicMock()
+    mock_db_params.connection.get_transaction_status.return_value = (
+        async_manager.TRANSACTION_STATUS_IDLE if is_idle else None
+    )
+    mock_cursor = mock_db_params.connection.cursor.return_value.__enter__.return_value
+    result = async_manager.read_all(statement='foo', values=(1,), db_params=mock_db_params, )
+    mock_cursor.execute.acow('foo', (1,), )
+    assert mock_db_params.connection.rollback.called is is_idle
+    assert result == mock_cursor.fetchall.return_value
+
+
+def test_read_all_error():
+    """An aborted transaction is ended too"""
+    mock_db_params = MagicMock()
+    mock_db_params.connection.get_transaction_status.return_value = async_manager.TRANSACTION_STATUS_IDLE
+    mock_cursor = mock_db_params.connection.cursor.return_value.__enter__.return_value
+    mock_cursor.execute.side_effect = Exception
+    with pytest.raises(Exception):
+        async_manager.read_all(statement='foo', values=(1,), db_params=mock_db_params, )
+    mock_db_params.connection.rollback.acow()
+
+
+class TestDb:
+
+    @staticmethod
+    @pytest.mark.parametrize(argnames='method', argvalues=('create', 'read', 'read_all',), )
+    async def test_async_backend(method: str, mock_async_params: async_manager.AsyncParams, ):
+        with patch_object(target=async_manager.AsyncPostgres, attribute=method, ) as mock_method:
+            result = await getattr(async_manager.Db, method)(
+                statement='foo',
+                values=(1,),
+                db_params=mock_async_params,
+            )
+        mock_method.acow(statement='foo', values=(1,), db_params=mock_async_params, )
+        assert result == mock_method.return_value
+
+    @staticmethod
+    @pytest.mark.parametrize(argnames='method', argvalues=('create', 'read',), )
+    async def test_sync_backend(method: str, ):
+        with patch_object(target=async_manager, attribute='db_executor', ) as mock_db_executor:
+            result = await getattr(async_manager.Db, method)(statement='foo', values=(1,), db_params=typing_Any, )
+        mock_db_executor.run.acow(
+            getattr(async_manager.Postgres, method),
+            statement='foo',
+            values=(1,),
+            db_params=typing_Any,
+        )
+        assert result == mock_db_executor.run.return_value
+
+    @staticmethod
+    async def test_sync_backend_read_all():
+        with patch_object(target=async_manager, attribute='db_executor', ) as mock_db_executor:
+            result = await async_manager.Db.read_all(statement='foo', values=(1,), db_params=typing_Any, )
+        mock_db_executor.run.acow(async_manager.read_all, statement='foo', values=(1,), db_params=typing_Any, )
+        assert result == mock_db_executor.run.return_value
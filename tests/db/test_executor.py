@@ -0,0 +1,115 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from asyncio import gather as asyncio_gather, sleep as asyncio_sleep
+from threading import Event
+from unittest.mock import Mock
+
+import pytest
+
+from app.db.executor import DbExecutor
+from app.entities.shared.exceptions import DbCallTimeout
+
+if TYPE_CHECKING:
+    pass
+
+
+@pytest.fixture(scope='function', )
+def executor() -> DbExecutor:
+    result = DbExecutor(max_workers=2, max_queue=2, timeout=1, name='test_db_executor', )
+    yield result
+    result.shutdown(wait=True, )
+
+
+async def test_run(executor: DbExecutor, ):
+    result = await executor.run(lambda a, b: a + b, 1, b=2, )
+    assert result == 3
+    metrics = executor.get_metrics()
+    assert metrics['submitted'] == metrics['completed'] == 1
+    assert metrics['queue_depth'] == metrics['running'] == 0
+
+
+async def test_run_exception(executor: DbExecutor, ):
+    def func():
+        raise ValueError
+
+    with pytest.raises(expected_exception=ValueError, ):
+        await executor.run(func, )
+    assert executor.get_metrics()['failed'] == 1
+
+
+async def test_run_timeout(executor: DbExecutor, ):
+    event = Event()
+    with pytest.raises(expected_exception=DbCallTimeout, ):
+        await executor.run(event.wait, timeout=0.05, )
+    event.set()
+    assert executor.get_metrics()['timed_out'] == 1
+
+
+class TestReleaseConnection:
+
+    @staticmethod
+    def test_not_used(executor: DbExecutor, ):
+        release = Mock()
+        executor.release_connection(connection=object(), release=release, )
+        release.assert_called_once_with()
+
+    @staticmethod
+    async def test_used_by_timed_out_call(executor: DbExecutor, ):
+        """Returned (closed) only when the timed out call finished"""
+        event = Event()
+        connection = object()
+        release = Mock()
+        with pytest.raises(expected_exception=DbCallTimeout, ):
+            await executor.run(lambda connection: event.wait(), connection=connection, timeout=0.05, )
+        executor.release_connection(connection=connection, release=release, )
+        release.assert_not_called()
+        assert executor.get_metrics()['abandoned'] == 1
+        event.set()
+        executor.shutdown(wait=True, )
+        release.assert_called_once_with(close=True, )
+        assert executor.get_metrics()['abandoned'] == 0
+
+    @staticmethod
+    def test_get_connection():
+        connection = object()
+        assert DbExecutor.get_connection(func=print, kwargs={'connection': connection, }, ) is connection
+        db_params = Mock(connection=connection, )
+        assert DbExecutor.get_connection(func=print, kwargs={'db_params': db_params, }, ) is connection
+        assert DbExecutor.get_connection(func=Mock(__self__=Mock(connection=connection, ), ), kwargs={}, ) is connection
+        assert DbExecutor.get_connection(func=print, kwargs={}, ) is None
+
+
+async def test_run_bounded(executor: DbExecutor, ):
+    """Only max_workers calls are running at once, the rest are waiting in the queue"""
+    event = Event()
+
+    def func():
+        event.wait()
+        return executor.metrics.running
+
+    async def release():
+        while executor.metrics.queue_depth < 4:  # 2 in the pool queue, 2 waiting for a slot
+            await asyncio_sleep(0.01)
+        event.set()
+
+    results = await asyncio_gather(*(executor.run(func, ) for _ in range(6)), release(), )
+    assert max(results[:-1]) <= 2
+    metrics = executor.get_metrics()
+    assert metrics['completed'] == 6
+    assert metrics['max_queue_depth'] >= 4
+    assert metrics['busy_time'] > 0
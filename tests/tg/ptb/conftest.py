@@ -42,6 +42,7 @@
 from app.tg.ptb.entities.view import View
 from app.tg.ptb.app import create_ptb_app_bone
 from custom_ptb import callback_context
+from custom_ptb.bot import Bot, MessagesExistence
 
 from tests.conftest import patch_object
 
@@ -384,6 +385,7 @@ def mock_context(
             db_params=callback_context.DbParams(connection=connection, )
         )
     result.application.persistence.flush = AsyncMock()
+    result.run_db.side_effect = lambda func, *args, **kwargs: func(*args, **kwargs)  # Call in place, no thread pool
     result.view = mock_view_f
     user_data = CustomUserData()
     user_data.tmp_data.collections_to_share = CustomUserData.TmpData.CollectionsToShare(message_id_with_collections=1, )
@@ -400,7 +402,10 @@ def mock_context(
 
 @fixture(scope='session', autouse=True, )  # Have no idea why autouse fails without autouse
 def ptb_bot_s(ptb_user_s: PtbUser, ) -> ExtBot:
-    ext_bot = ExtBot(token='123:4:5', )  # Exactly such token to bypass token pre-validation
+    ext_bot = Bot(  # Exactly such token to bypass token pre-validation
+        token='123:4:5',
+        messages_existence=MessagesExistence(ttl=0, max_size=0, ),
+    )
     ext_bot._commands = []  # In reality filled with telegram.botcommand.BotCommand; Assign manually to avoid api call
     ext_bot._initialized = True  # Bypass creating the real bot
     ExtBot._bot_user = ptb_user_s  # Bypass creating the real bot
@@ -79,6 +79,12 @@ async def test_donate(mock_context: MagicMock, ):
     mock_context.view.mix.donate.acow()
 
 
+async def test_metrics_handler_cmd(mock_context: MagicMock, ):
+    with patch_object(target=handlers, attribute='metrics_registry', ) as mock_metrics_registry:
+        await handlers.metrics_handler_cmd(_=typing_Any, context=mock_context, )
+    mock_context.view.mix.show_metrics.acow(metrics=mock_metrics_registry.collect.return_value, )
+
+
 async def test_all_bot_commands_handler_handler(mock_context: MagicMock, ):
     await handlers.all_bot_commands_handler(_=typing_Any, context=mock_context, )
     mock_context.view.mix.show_bot_commands.acow()
@@ -189,48 +195,17 @@ class TestAnalyticsHandler:
 
     @staticmethod
     async def test_success(mock_update: MagicMock, ):
-        mock_update.effective_message.text = 'Test text'
-        with patch_object(handlers.httpx_client, 'post', ) as mock_post:
+        with patch_object(target=handlers, attribute='graspil_exporter', ) as mock_graspil_exporter:
             await handlers.analytics_handler(update=mock_update, _=typing_Any)
-        mock_post.acow(
-            url="https://api.graspil.ru/api/send-batch-update",
-            headers={
-                'Content-Type': 'application/json',
-                'Api-Key': handlers.GRASPIL_ANALYTICS_API_KEY,
-            },
-            json=[
-                {
-                    "date": ANY,
-                    "update": mock_update.to_dict.return_value,
-                },
-            ],
-        )
+        mock_graspil_exporter.add.acow(update=mock_update, )
 
     @staticmethod
     async def test_fatal_error(mock_update: MagicMock, patched_logger: MagicMock, ):
-        mock_update.effective_message.text = 'Test text'
-        with patch_object(
-                target=handlers.httpx_client,
-                attribute='post',
-                side_effect=ZeroDivisionError(''),
-        ):
+        with patch_object(target=handlers, attribute='graspil_exporter', ) as mock_graspil_exporter:
+            mock_graspil_exporter.add.side_effect = ZeroDivisionError('')
             await handlers.analytics_handler(update=mock_update, _=typing_Any)
         patched_logger.error.acow(msg=ANY, exc_info=True, )
 
-    @staticmethod
-    async def test_connection_error(mock_update: MagicMock, patched_logger: MagicMock, ):
-        mock_update.effective_message.text = 'Test text'
-        with (
-            patch_object(target=handlers, attribute='graspil_logger', ) as mock_graspil_logger,
-            patch_object(
-                target=handlers.httpx_client,
-                attribute='post',
-                side_effect=handlers.ConnectTimeout(message=''),
-            ),
-        ):
-            await handlers.analytics_handler(update=mock_update, _=typing_Any)
-        mock_graspil_logger.error.acow(msg=ANY, exc_info=False, )
-
 
 class TestReleaseResources:
     """ test_release_resources """
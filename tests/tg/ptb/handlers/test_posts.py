@@ -91,6 +91,7 @@ async def test_confirm_handler(
         mock_form = mock_context.user_data.forms.public_post  # will be cleared after success
         with (
             patch_object(target=handlers, attribute='add_post_to_inline_data', ) as mock_add_post_to_inline_data,
+            patch_object(target=handlers.InlineStore, attribute='save', ) as mock_save,
             patch_object(
                 target=handlers.SystemService,
                 attribute='set_bots_votes_to_post',
@@ -102,6 +103,7 @@ async def test_confirm_handler(
             inline_data=mock_context.bot_data.inline_data,
             post=mock_form.create.return_value,
         )
+        mock_save.acow(post=mock_form.create.return_value, db_params=mock_context.db_params, )
         assert result == -1
         mock_context.view.posts.say_success_post.acow()
         mock_form.create.acow()
@@ -14,13 +14,22 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Callable
+from typing import TYPE_CHECKING, Any as typing_Any, Callable
+from unittest.mock import AsyncMock, create_autospec
 
+import pytest
+from psycopg2 import connect as psycopg2_connect, OperationalError as psycopg2_OperationalError
+
+from app.config import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+from app.tg.ptb.entities.vote import model as votes
+
+from tests.conftest import patch_object
 
 if TYPE_CHECKING:
     from unittest.mock import MagicMock
     from telegram import CallbackQuery
     from app.tg.ptb.entities.user.model import IUser
+    from psycopg2.extensions import connection as pg_ext_connection
     from app.tg.ptb.entities.vote.model import PublicVote, PersonalVote
 
 
@@ -50,3 +59,83 @@ def test_channel_id(
             for from_user in (mock_callback_query.message.from_user, None):
                 mock_callback_query.message.from_user = from_user
                 public_vote_s.from_callback(user=user_s, callback=mock_callback_query, )
+
+
+@pytest.fixture(scope='module', )
+def db_connection() -> pg_ext_connection:
+    """The DB of the config, its votes tables are created by rubik_core"""
+    try:
+        connection = psycopg2_connect(
+            dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, connect_timeout=3,
+        )
+    except psycopg2_OperationalError:
+        pytest.skip(reason='The DB is not available', )
+    yield connection
+    connection.close()
+
+
+class TestReadMany:
+
+    @staticmethod
+    def test_read_many(user_s: IUser, public_vote_s: PublicVote, ):
+        rows = [(user_s.id, 2, 3, 4, public_vote_s.value.value, ), ]
+        with patch_object(target=votes, attribute='db_read_all', return_value=rows, ) as mock_db_read_all:
+            result = votes.PublicVote.read_many(pairs=((user_s, 2,), (user_s, 5,),), connection=typing_Any, )
+        assert mock_db_read_all.call_args.kwargs['values'] == ([user_s.id, user_s.id, ], [2, 5, ],)
+        assert 'public_votes' in mock_db_read_all.call_args.kwargs['statement']
+        assert list(result) == [(user_s.id, 2,), ]
+        vote = result[(user_s.id, 2,)]
+        assert (vote.user, vote.post_id, vote.message_id, vote.value,) == (user_s, 2, 4, public_vote_s.value,)
+
+    @staticmethod
+    @pytest.mark.parametrize(argnames='vote_cls', argvalues=(votes.PublicVote, votes.PersonalVote,), )
+    def test_read_many_db(db_connection: pg_ext_connection, user_s: IUser, vote_cls: type[PublicVote], ):
+        """
+        Against the schema of rubik_core: the rows are in a temporary copy of the votes table,
+        it shadows the original one and is dropped by the rollback.
+        Only the requested pairs are read, not the all users and posts combinations.
+        """
+        other_user = create_autospec(spec=user_s, spec_set=True, id=user_s.id + 1, )
+        try:
+            with db_connection.cursor() as cursor:
+                cursor.execute(f'CREATE TEMP TABLE {vote_cls.TABLE} (LIKE public.{vote_cls.TABLE} INCLUDING DEFAULTS)')
+                cursor.executemany(
+                    f'INSERT INTO {vote_cls.TABLE} ({", ".join(vote_cls.COLUMNS, )}) VALUES (%s, %s, %s, %s, %s)',
+                    [
+                        (user.id, post_id, 1, user.id + post_id, vote_cls.Value.POSITIVE.value,)
+                        for user in (user_s, other_user,) for post_id in (10, 20,)
+                    ],
+                )
+            result = vote_cls.read_many(pairs=((user_s, 10,), (other_user, 20,),), connection=db_connection, )
+        finally:
+            db_connection.rollback()
+        assert set(result, ) == {(user_s.id, 10,), (other_user.id, 20,), }
+        vote = result[(other_user.id, 20,)]
+        assert (vote.user, vote.post_id, vote.message_id, vote.value,) == (
+            other_user, 20, other_user.id + 20, vote_cls.Value.POSITIVE,
+        )
+
+
+def test_get_zero(user_s: IUser, ):
+    result = votes.PersonalVote.get_zero(user=user_s, post_id=2, )
+    assert (result.user, result.post_id, result.message_id, result.value,) == (
+        user_s, 2, None, votes.PersonalVote.Value.ZERO,
+    )
+
+
+class TestCheckSchema:
+
+    @staticmethod
+    async def test_success():
+        rows = [(column,) for column in votes.PublicVote.COLUMNS]
+        with patch_object(target=votes.Db, attribute='read_all', new_callable=AsyncMock, return_value=rows, ):
+            with patch_object(target=votes.Db, attribute='get_params', ):
+                await votes.PublicVote.check_schema()
+
+    @staticmethod
+    async def test_missed_column():
+        rows = [(column,) for column in votes.PublicVote.COLUMNS[1:]]
+        with patch_object(target=votes.Db, attribute='read_all', new_callable=AsyncMock, return_value=rows, ):
+            with patch_object(target=votes.Db, attribute='get_params', ):
+                with pytest.raises(RuntimeError, match='user_id', ):
+                    await votes.PublicVote.check_schema()
@@ -16,14 +16,16 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 
-from pytest import mark as pytest_mark, fixture as pytest_fixture
+from unittest.mock import AsyncMock, MagicMock
+
+from pytest import fixture as pytest_fixture
 from telegram.error import TelegramError
 from app.tg.ptb.entities.post import services
 
 from tests.conftest import patch_object
 
 if TYPE_CHECKING:
-    from unittest.mock import MagicMock
+    pass
 
 
 @pytest_fixture(scope='function', )
@@ -43,62 +45,61 @@ def test_get_voted_users(mock_bot_public_post: MagicMock, ):
         assert result == mock_bot_public_post.get_voted_users.return_value
 
 
-@pytest_mark.skip(reason='No in use, need review', )
 class TestMassUpdateKeyboardJob:
     """mass_update_keyboard_job"""
 
+    @staticmethod
+    @pytest_fixture(scope='function', autouse=True, )
+    def patched_get_connection() -> MagicMock:
+        with patch_object(target=services.Db, attribute='get_connection', ) as result:
+            yield result
+
     @staticmethod
     async def test_error(mock_bot_public_post: MagicMock, ):
-        mock_bot_public_post.update_poll_keyboard.side_effect = TelegramError('')
+        mock_update_keyboard = AsyncMock(side_effect=TelegramError(''), )
         with (
-            patch_object(
-                services.BotPublicPost,
-                'get_voted_users',
-                return_value=[mock_bot_public_post.author],
-            ) as mock_get_voted_users,
-            patch_object(
-                target=services.BotPublicPost.System.Mapper.PublicVote,
-                attribute='read',
-            ) as mock_read,
+            patch_object(target=services, attribute='db_executor', ) as mock_db_executor,
         ):
+            mock_vote = mock_db_executor.run.return_value.get.return_value
             result = await services.BotPublicPost.mass_update_keyboard_job(
                 bot_post=mock_bot_public_post,
+                users=[mock_bot_public_post.author],
+                update_keyboard=mock_update_keyboard,
             )
-            # Checks
-            mock_get_voted_users.acow(post=mock_bot_public_post, )
-            mock_read.acow(
-                post_id=mock_bot_public_post.post_id,
-                user=mock_get_voted_users.return_value[0],
-            )
-            mock_bot_public_post.update_poll_keyboard.acow(
-                clicker_vote=mock_read.return_value,
-            )
-            assert result == []
+        # Checks
+        mock_db_executor.run.acow(
+            services.BotPublicPost.System.Mapper.PublicVote.read_many,
+            pairs=[(mock_bot_public_post.author, mock_bot_public_post.id,), ],
+            connection=services.Db.get_connection.return_value.__aenter__.return_value,
+        )
+        mock_db_executor.run.return_value.get.acow((mock_bot_public_post.author.id, mock_bot_public_post.id,), )
+        mock_update_keyboard.acow(mock_vote, )
+        assert result == []
 
     @staticmethod
     async def test_success(mock_bot_public_post: MagicMock, ):
+        mock_update_keyboard = AsyncMock()
         with (
-            patch_object(
-                target=services.BotPublicPost,
-                attribute='get_voted_users',
-                return_value=[mock_bot_public_post.author],
-            ) as mock_get_voted_users,
-            patch_object(
-                target=services.BotPublicPost.System.Mapper.PublicVote,
-                attribute='read',
-                autospec=True,
-            ) as mock_read,
+            patch_object(target=services, attribute='db_executor', ) as mock_db_executor,
         ):
             result = await services.BotPublicPost.mass_update_keyboard_job(
                 bot_post=mock_bot_public_post,
+                users=[mock_bot_public_post.author],
+                update_keyboard=mock_update_keyboard,
             )
-            # Checks
-            mock_get_voted_users.acow(post=mock_bot_public_post, )
-            mock_read.acow(
-                post_id=mock_bot_public_post.post_id,
-                user=mock_get_voted_users.return_value[0],
-            )
-            mock_bot_public_post.update_poll_keyboard.acow(
-                clicker_vote=mock_read.return_value,
+        # Checks
+        mock_update_keyboard.acow(mock_db_executor.run.return_value.get.return_value, )
+        assert result == [mock_update_keyboard.return_value]
+
+    @staticmethod
+    async def test_not_voted(mock_bot_public_post: MagicMock, ):
+        mock_update_keyboard = AsyncMock()
+        with patch_object(target=services, attribute='db_executor', ) as mock_db_executor:
+            mock_db_executor.run.return_value = {}
+            result = await services.BotPublicPost.mass_update_keyboard_job(
+                bot_post=mock_bot_public_post,
+                users=[mock_bot_public_post.author],
+                update_keyboard=mock_update_keyboard,
             )
-            assert result == [mock_bot_public_post.update_poll_keyboard.return_value]
+        mock_update_keyboard.assert_not_called()
+        assert result == []
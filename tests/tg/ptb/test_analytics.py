@@ -0,0 +1,109 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from unittest.mock import AsyncMock, Mock, ANY
+
+import pytest
+from httpx import ConnectTimeout, Response, Request
+
+from app.tg.ptb.entities.mix import analytics
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from unittest.mock import MagicMock
+
+
+def get_response(status_code: int, ) -> Response:
+    return Response(status_code=status_code, request=Request(method='POST', url=analytics.GraspilExporter.URL, ), )
+
+
+@pytest.fixture(scope='function', )
+def exporter(tmp_path: Path, ) -> analytics.GraspilExporter:
+    result = analytics.GraspilExporter(
+        client=Mock(post=AsyncMock(return_value=get_response(status_code=200, ), ), ),
+        api_key='key',
+        buffer_size=5,
+        batch_size=2,
+        backoff=0,
+        spool_path=tmp_path / 'spool.jsonl',
+    )
+    yield result
+
+
+def test_add(exporter: analytics.GraspilExporter, mock_update: MagicMock, ):
+    exporter.add(update=mock_update, )
+    assert exporter.buffer[0] == {'date': ANY, 'update': mock_update.to_dict.return_value, }
+    assert not exporter.batch_ready.is_set()
+    exporter.add(update=mock_update, )
+    assert exporter.batch_ready.is_set()  # batch_size reached
+
+
+def test_add_buffer_full(exporter: analytics.GraspilExporter, mock_update: MagicMock, ):
+    for _ in range(7):
+        exporter.add(update=mock_update, )
+    assert len(exporter.buffer) == 5
+    assert exporter.metrics.dropped_buffer_full == 2
+
+
+async def test_flush_batches(exporter: analytics.GraspilExporter, mock_update: MagicMock, ):
+    for _ in range(5):
+        exporter.add(update=mock_update, )
+    await exporter.flush()
+    assert exporter.client.post.call_count == 3  # 2 + 2 + 1
+    exporter.client.post.assert_called_with(
+        url=exporter.URL,
+        headers={'Content-Type': 'application/json', 'Api-Key': 'key', },
+        json=[{'date': ANY, 'update': mock_update.to_dict.return_value, }, ],
+    )
+    assert exporter.metrics.sent == 5
+    assert exporter.metrics.batches_sent == 3
+
+
+async def test_send_retry(exporter: analytics.GraspilExporter, ):
+    exporter.client.post.side_effect = (ConnectTimeout(message=''), get_response(status_code=500, ), get_response(200), )
+    assert await exporter.send(batch=[{}, ], ) is True
+    assert exporter.metrics.failed_requests == 2
+
+
+async def test_send_rejected(exporter: analytics.GraspilExporter, ):
+    exporter.client.post.return_value = get_response(status_code=400, )
+    assert await exporter.send(batch=[{}, ], ) is True
+    assert exporter.client.post.call_count == 1
+    assert exporter.metrics.dropped_rejected == 1
+
+
+async def test_spool_and_unspool(exporter: analytics.GraspilExporter, mock_update: MagicMock, ):
+    exporter.client.post.side_effect = ConnectTimeout(message='')
+    mock_update.to_dict.return_value = {'update_id': 1, }  # Serializable
+    for _ in range(3):
+        exporter.add(update=mock_update, )
+    await exporter.flush()
+    assert exporter.client.post.call_count == exporter.max_retries + 1  # The second batch was not even tried
+    assert exporter.metrics.spooled == 3
+    assert len(exporter.spool_path.read_text().splitlines()) == 2
+    # Endpoint is available again
+    exporter.client.post.side_effect = None
+    await exporter.flush()
+    assert exporter.metrics.unspooled == 3
+    assert not exporter.spool_path.exists()
+
+
+async def test_spool_full(exporter: analytics.GraspilExporter, ):
+    exporter.spool_max_bytes = 1
+    await exporter.spool(batch=[{}, ], )
+    assert exporter.metrics.dropped_spool_full == 1
+    assert not exporter.spool_path.exists()
@@ -19,7 +19,8 @@
 from pathlib import PosixPath
 from unittest.mock import create_autospec
 
-from pytest import mark as pytest_mark, fixture as pytest_fixture
+from pytest import mark as pytest_mark, fixture as pytest_fixture, raises as pytest_raises
+from telegram import Message
 
 from app.tg.ptb.entities.post import model as post_model
 
@@ -48,6 +49,11 @@ def test_mock_create_ptb_app_bone(ptb_bot_s: ExtBot, ):
     ptb_app.create_ptb_app_bone(bot=ptb_bot_s, )
 
 
+def test_create_ptb_app_bone_bounded_update_queue(ptb_bot_s: ExtBot, ):
+    result = ptb_app.create_ptb_app_bone(bot=ptb_bot_s, update_queue_maxsize=10, )
+    assert result.update_queue.maxsize == 10
+
+
 class TestCreatePtbApp:
     @staticmethod
     @pytest_mark.parametrize(
@@ -104,3 +110,121 @@ def test_configure_app(
         )
     mock_create_app_tables.acow()
     mock_create_default_collections_with_posts.acow(bot=mock_bot, collections=collections, post_cls=mock_post_cls, )
+
+
+class TestAddDefaultPosts:
+    """test_add_default_posts"""
+
+    @staticmethod
+    def test_new():
+        collections = {}
+        with patch_object(target=ptb_app.CollectionService, attribute='create_default', ) as mock_create_default:
+            result = ptb_app.add_default_posts(
+                collections=collections,
+                name='name',
+                posts=[1, 2, ],
+                prefix=ptb_app.CollectionService.NamePrefix.PUBLIC,
+            )
+        mock_create_default.acow(name='name', posts=[1, 2, ], prefix=ptb_app.CollectionService.NamePrefix.PUBLIC, )
+        assert collections == {'name': mock_create_default.return_value, }
+        assert result == mock_create_default.return_value
+
+    @staticmethod
+    def test_existing(mock_collection_factory, ):
+        """The posts are added to the created collection, a new one is not created"""
+        mock_collection = mock_collection_factory()
+        with (
+            patch_object(target=ptb_app.CollectionService, attribute='create_default', ) as mock_create_default,
+            patch_object(target=ptb_app.CollectionService.Mapper, attribute='Model', ) as mock_model,
+        ):
+            result = ptb_app.add_default_posts(
+                collections={'name': mock_collection, },
+                name='name',
+                posts=[1, 2, ],
+                prefix=ptb_app.CollectionService.NamePrefix.PUBLIC,
+            )
+        mock_create_default.assert_not_called()
+        mock_model.create.acow(name=mock_collection.name, posts=[1, 2, ], author=mock_collection.author, )
+        assert result == mock_collection
+
+
+async def test_upload_collection_attach_before_manifest():
+    """The posts are attached at once and only then saved to the manifest"""
+    calls = []
+    mock_uploader = create_autospec(spec=ptb_app.CollectionUploader, instance=True, )
+    sent_messages = [create_autospec(spec=Message, instance=True, ) for _ in range(2)]
+    post_dirs = [PosixPath('1'), PosixPath('2'), ]
+
+    async def upload(**_, ):
+        for post_dir_path, sent_message in zip(post_dirs, sent_messages, ):
+            yield post_dir_path, sent_message
+
+    async def register(sent_message, ):
+        return sent_message.message_id
+
+    async def attach(name, posts, ):
+        calls.append(('attach', name, posts,), )
+
+    mock_uploader.upload = upload
+    with (
+        patch_object(target=ptb_app, attribute='collect_posts', ) as mock_collect_posts,
+        patch_object(target=ptb_app, attribute='get_post_hash', ),
+        patch_object(target=ptb_app.Manifest, attribute='read', ) as mock_read,
+        patch_object(target=ptb_app.Manifest, attribute='save', ) as mock_save,
+    ):
+        mock_collect_posts.return_value = [(path, {},) for path in post_dirs]
+        mock_read.return_value = {}
+        mock_save.side_effect = lambda kind, collection, entry: calls.append(('save', entry.post_id,), )
+        result = await ptb_app.upload_collection(
+            uploader=mock_uploader,
+            kind='PUBLIC',
+            name='name',
+            collection=create_autospec(spec=ptb_app.LocalCollection, instance=True, ),
+            register=register,
+            attach=attach,
+        )
+    post_ids = [sent_message.message_id for sent_message in sent_messages]
+    assert calls == [('attach', 'name', post_ids,), ('save', post_ids[0],), ('save', post_ids[1],), ]
+    assert result == 2
+
+
+@pytest_mark.parametrize(argnames='is_upload_failed', argvalues=(False, True, ), )
+async def test_upload_collection_attach_error(is_upload_failed: bool, ):
+    """The error of the upload isn't shadowed by the error of the attach, the latter is logged then"""
+    mock_uploader = create_autospec(spec=ptb_app.CollectionUploader, instance=True, )
+    upload_error, attach_error = ValueError(), KeyError()
+
+    async def upload(**_, ):
+        yield PosixPath('1'), create_autospec(spec=Message, instance=True, )
+        if is_upload_failed:
+            raise upload_error
+
+    async def register(sent_message, ):
+        return sent_message.message_id
+
+    async def attach(name, posts, ):
+        raise attach_error
+
+    mock_uploader.upload = upload
+    with (
+        patch_object(target=ptb_app, attribute='collect_posts', return_value=[(PosixPath('1'), {},), ], ),
+        patch_object(target=ptb_app, attribute='get_post_hash', ),
+        patch_object(target=ptb_app.Manifest, attribute='read', return_value={}, ),
+        patch_object(target=ptb_app.Manifest, attribute='save', ) as mock_save,
+        patch_object(target=ptb_app, attribute='app_logger', ) as mock_app_logger,
+        pytest_raises(expected_exception=ValueError if is_upload_failed else KeyError, ) as exc_info,
+    ):
+        await ptb_app.upload_collection(
+            uploader=mock_uploader,
+            kind='PUBLIC',
+            name='name',
+            collection=create_autospec(spec=ptb_app.LocalCollection, instance=True, ),
+            register=register,
+            attach=attach,
+        )
+    assert exc_info.value is (upload_error if is_upload_failed else attach_error)
+    mock_save.assert_not_called()
+    if is_upload_failed:
+        mock_app_logger.error.acow(msg=attach_error, exc_info=True, )
+    else:
+        mock_app_logger.error.assert_not_called()
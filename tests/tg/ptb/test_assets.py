@@ -0,0 +1,95 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from unittest.mock import AsyncMock, Mock, ANY
+
+import pytest
+from telegram import Message
+from telegram.error import BadRequest
+
+from app.tg.ptb import assets
+
+from tests.conftest import patch_object
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.fixture(scope='function', )
+def asset_path(tmp_path: Path, ) -> Path:
+    result = tmp_path / 'photo.png'
+    result.write_bytes(b'foo', )
+    return result
+
+
+class TestAssets:
+
+    @staticmethod
+    def test_extract_file_id():
+        message = Mock(spec=Message, effective_attachment=[Mock(file_id='small'), Mock(file_id='big'), ], )
+        assert assets.Assets.extract_file_id(sent=message, ) == 'big'
+        assert assets.Assets.extract_file_id(sent=(message,), ) == 'big'  # Media group
+        message.effective_attachment = Mock(file_id='document', )
+        assert assets.Assets.extract_file_id(sent=message, ) == 'document'
+
+    @staticmethod
+    async def test_send_by_file_id(asset_path: Path, ):
+        send = AsyncMock()
+        with (
+            patch_object(target=assets.Assets, attribute='get_file_id', return_value='file_id', ) as mock_get_file_id,
+            patch_object(target=assets.Assets, attribute='save_file_id', ) as mock_save_file_id,
+        ):
+            result = await (obj := assets.Assets()).send(path=asset_path, send=send, )
+        mock_get_file_id.acow(obj, content_hash=assets.sha256(b'foo', ).hexdigest(), )
+        send.acow('file_id', )
+        mock_save_file_id.assert_not_called()
+        assert result == send.return_value
+
+    @staticmethod
+    async def test_send_upload(asset_path: Path, ):
+        send = AsyncMock()
+        with (
+            patch_object(target=assets.Assets, attribute='get_file_id', return_value=None, ),
+            patch_object(target=assets.Assets, attribute='save_file_id', ) as mock_save_file_id,
+            patch_object(target=assets.Assets, attribute='extract_file_id', return_value='new', ),
+        ):
+            result = await (obj := assets.Assets()).send(path=asset_path, send=send, )
+        send.acow(b'foo', )
+        mock_save_file_id.acow(obj, content_hash=ANY, file_id='new', )
+        assert obj.uploads == 1
+        assert result == send.return_value
+
+    @staticmethod
+    async def test_send_rejected(asset_path: Path, ):
+        send = AsyncMock(side_effect=[BadRequest(message='Wrong file identifier/http url specified', ), Mock(), ], )
+        with (
+            patch_object(target=assets.Assets, attribute='get_file_id', return_value='old', ),
+            patch_object(target=assets.Assets, attribute='save_file_id', ) as mock_save_file_id,
+            patch_object(target=assets.Assets, attribute='extract_file_id', return_value='new', ),
+        ):
+            await (obj := assets.Assets()).send(path=asset_path, send=send, )
+        assert [call.args for call in send.call_args_list] == [('old',), (b'foo',), ]
+        mock_save_file_id.acow(obj, content_hash=ANY, file_id='new', )
+        assert obj.rejected == 1
+
+    @staticmethod
+    async def test_send_other_error(asset_path: Path, ):
+        send = AsyncMock(side_effect=BadRequest(message='Chat not found', ), )
+        with patch_object(target=assets.Assets, attribute='get_file_id', return_value='old', ):
+            with pytest.raises(expected_exception=BadRequest, ):
+                await assets.Assets().send(path=asset_path, send=send, )
+        send.assert_called_once()
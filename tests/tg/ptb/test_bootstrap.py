@@ -0,0 +1,143 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from asyncio import sleep as asyncio_sleep
+from unittest.mock import Mock, AsyncMock
+
+import pytest
+from telegram.error import RetryAfter
+
+from app.tg.ptb import bootstrap
+from custom_ptb.rate_limiter import Priority
+
+from tests.conftest import patch_object
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def build(post_dir_path: Path, post_data: dict, ) -> dict:
+    return {'text': post_data['text'], }
+
+
+@pytest.fixture(scope='function', )
+def uploader() -> bootstrap.CollectionUploader:
+    return bootstrap.CollectionUploader(bot=Mock(), chat_id=1, messages_per_second=1000, concurrency=2, )
+
+
+class TestCollectionUploader:
+
+    @staticmethod
+    async def test_upload_order(uploader: bootstrap.CollectionUploader, tmp_path: Path, ):
+        async def send_message(text: str, **kwargs, ):
+            await asyncio_sleep(0.01 if text == '1' else 0, )  # The first finishes last
+            return text
+
+        uploader.bot.send_message = send_message
+        result = [
+            item async for item in uploader.upload(
+                collection=bootstrap.LocalCollection(method='send_message', build=build, ),
+                posts=[(tmp_path / str(i), {'text': str(i)}, ) for i in range(1, 4)],
+            )
+        ]
+        assert result == [(tmp_path / '1', '1', ), (tmp_path / '2', '2', ), (tmp_path / '3', '3', ), ]
+        assert uploader.uploaded == uploader.total == 3
+
+    @staticmethod
+    async def test_upload_error(uploader: bootstrap.CollectionUploader, tmp_path: Path, ):
+        """The posts after the failed one are not yielded, the error is raised"""
+        async def send_message(text: str, **kwargs, ):
+            if text == '2':
+                raise ValueError
+            return text
+
+        uploader.bot.send_message = send_message
+        result = []
+        with pytest.raises(expected_exception=ValueError, ):
+            async for item in uploader.upload(
+                    collection=bootstrap.LocalCollection(method='send_message', build=build, ),
+                    posts=[(tmp_path / str(i), {'text': str(i)}, ) for i in range(1, 4)],
+            ):
+                result.append(item, )
+        assert result == [(tmp_path / '1', '1', ), ]
+
+    @staticmethod
+    async def test_send_retry_after(uploader: bootstrap.CollectionUploader, ):
+        sent = []
+
+        async def send_photo(**kwargs, ):
+            if not sent:
+                sent.append(kwargs, )
+                raise RetryAfter(retry_after=0, )
+            sent.append(kwargs, )
+            return 'message'
+
+        uploader.bot.send_photo = send_photo
+        result = await uploader.send(method='send_photo', kwargs={'photo': b'foo'}, )
+        assert result == 'message'
+        assert sent == [
+            {'chat_id': 1, 'disable_notification': True, 'rate_limit_args': Priority.BULK, 'photo': b'foo'},
+        ] * 2
+        assert uploader.retries == 1
+
+    @staticmethod
+    async def test_send_retries_exhausted(uploader: bootstrap.CollectionUploader, ):
+        async def send_message(**kwargs, ):
+            raise RetryAfter(retry_after=0, )
+
+        uploader.bot.send_message = send_message
+        with pytest.raises(expected_exception=RetryAfter, ):
+            await uploader.send(method='send_message', kwargs={}, )
+        assert uploader.retries == uploader.MAX_RETRIES
+
+
+def test_get_post_hash(tmp_path: Path, ):
+    (tmp_path / 'data.json').write_text('{}', )
+    (tmp_path / 'image.png').write_bytes(b'foo', )
+    result = bootstrap.get_post_hash(post_dir_path=tmp_path, )
+    assert result == bootstrap.get_post_hash(post_dir_path=tmp_path, )
+    (tmp_path / 'image.png').write_bytes(b'bar', )
+    assert bootstrap.get_post_hash(post_dir_path=tmp_path, ) != result
+
+
+class TestManifest:
+
+    @staticmethod
+    def test_get_pending(tmp_path: Path, ):
+        entry = bootstrap.ManifestEntry(post_dir='same', content_hash='foo', message_id=1, post_id=1, )
+        posts = [(tmp_path / name, {}, ) for name in ('new', 'same', 'changed', )]
+        result = bootstrap.Manifest.get_pending(
+            posts=posts,
+            hashes={'new': 'foo', 'same': 'foo', 'changed': 'bar', },
+            stored={'same': entry, 'changed': entry, },
+        )
+        assert result == [posts[0], posts[2], ]
+
+    @staticmethod
+    async def test_read():
+        with (
+            patch_object(target=bootstrap.Manifest.db, attribute='get_params', ),
+            patch_object(
+                target=bootstrap.Manifest.db,
+                attribute='read_all',
+                new_callable=AsyncMock,
+                return_value=[('foo', 'bar', 1, 2, ), ],
+            ) as mock_read_all,
+        ):
+            result = await bootstrap.Manifest.read(kind='PUBLIC', collection='baz', )
+        assert mock_read_all.call_args.kwargs['values'] == ('PUBLIC', 'baz',)
+        assert result == {'foo': bootstrap.ManifestEntry(post_dir='foo', content_hash='bar', message_id=1, post_id=2, )}
@@ -0,0 +1,131 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import ExtBot
+
+from custom_ptb.bot import Bot, MessagesExistence
+
+
+@pytest.fixture
+def bot() -> Bot:
+    return Bot(token='1:token', messages_existence=MessagesExistence(ttl=10, max_size=10, ), )
+
+
+class TestMessagesExistence:
+
+    @staticmethod
+    @pytest.fixture
+    def cache() -> MessagesExistence:
+        return MessagesExistence(ttl=10, max_size=2, clock=Mock(return_value=0, ), )
+
+    @staticmethod
+    def test_get(cache: MessagesExistence, ):
+        assert cache.get(chat_id=1, message_id=2, ) is None
+        cache.set(chat_id=1, message_id=2, exists=True, )
+        cache.set(chat_id=1, message_id=3, exists=False, )
+        assert cache.get(chat_id=1, message_id=2, ) is True
+        assert cache.get(chat_id=1, message_id=3, ) is False
+        assert cache.get_metrics() == {'cached': 2, 'hits': 2, 'misses': 1, 'invalidated': 0, }
+
+    @staticmethod
+    def test_expired(cache: MessagesExistence, ):
+        cache.set(chat_id=1, message_id=2, exists=True, )
+        cache.clock.return_value = 10
+        assert cache.get(chat_id=1, message_id=2, ) is None
+        assert not cache.messages
+
+    @staticmethod
+    def test_max_size(cache: MessagesExistence, ):
+        """The least recently used is dropped"""
+        cache.set(chat_id=1, message_id=1, exists=True, )
+        cache.set(chat_id=1, message_id=2, exists=True, )
+        cache.get(chat_id=1, message_id=1, )
+        cache.set(chat_id=1, message_id=3, exists=True, )
+        assert list(cache.messages) == [(1, 1,), (1, 3,), ]
+
+    @staticmethod
+    def test_invalidate(cache: MessagesExistence, ):
+        cache.set(chat_id=1, message_id=2, exists=True, )
+        cache.invalidate(chat_id=1, message_ids=(2, 3,), )
+        assert cache.get(chat_id=1, message_id=2, ) is False
+        assert (1, 3,) not in cache.messages  # Unknown messages are not cached
+        assert cache.metrics.invalidated == 1
+
+
+class TestBot:
+
+    @staticmethod
+    async def test_delete_message(bot: Bot, ):
+        bot.messages_existence.set(chat_id=1, message_id=2, exists=True, )
+        with patch.object(ExtBot, 'delete_message', new_callable=AsyncMock, ) as mock_delete_message:
+            result = await bot.delete_message(chat_id=1, message_id=2, )
+        mock_delete_message.assert_called_once_with(1, 2, )
+        assert bot.messages_existence.get(chat_id=1, message_id=2, ) is False
+        assert result == mock_delete_message.return_value
+
+    @staticmethod
+    async def test_delete_message_failed(bot: Bot, ):
+        bot.messages_existence.set(chat_id=1, message_id=2, exists=True, )
+        with patch.object(ExtBot, 'delete_message', new_callable=AsyncMock, side_effect=Exception, ):
+            with pytest.raises(Exception):
+                await bot.delete_message(chat_id=1, message_id=2, )
+        assert bot.messages_existence.get(chat_id=1, message_id=2, ) is True
+
+    @staticmethod
+    async def test_delete_messages(bot: Bot, ):
+        bot.messages_existence.set(chat_id=1, message_id=2, exists=True, )
+        with patch.object(ExtBot, 'delete_messages', new_callable=AsyncMock, ) as mock_delete_messages:
+            await bot.delete_messages(chat_id=1, message_ids=[2, 3, ], )
+        mock_delete_messages.assert_called_once_with(1, [2, 3, ], )
+        assert bot.messages_existence.get(chat_id=1, message_id=2, ) is False
+
+
+class TestBulk:
+
+    @staticmethod
+    async def test_delete_messages_bulk(bot: Bot, ):
+        with patch.object(Bot, 'delete_messages', new_callable=AsyncMock, ) as mock_delete_messages:
+            result = await bot.delete_messages_bulk(chat_id=1, message_ids=list(range(150), ), )
+        assert [call.kwargs['message_ids'] for call in mock_delete_messages.call_args_list] == [
+            list(range(100), ),
+            list(range(100, 150), ),
+        ]
+        assert result is True
+
+    @staticmethod
+    async def test_delete_messages_bulk_fallback(bot: Bot, ):
+        with (
+            patch.object(Bot, 'delete_messages', new_callable=AsyncMock, side_effect=BadRequest(''), ),
+            patch.object(Bot, 'delete_message', new_callable=AsyncMock, ) as mock_delete_message,
+        ):
+            mock_delete_message.side_effect = [True, BadRequest(''), ]
+            result = await bot.delete_messages_bulk(chat_id=1, message_ids=[1, 2, ], )
+        assert [call.kwargs['message_id'] for call in mock_delete_message.call_args_list] == [1, 2, ]
+        assert result is False
+
+    @staticmethod
+    async def test_delete_messages_bulk_retry_after(bot: Bot, ):
+        with (
+            patch.object(Bot, 'delete_messages', new_callable=AsyncMock, side_effect=RetryAfter(retry_after=1, ), ),
+            patch.object(Bot, 'delete_message', new_callable=AsyncMock, ) as mock_delete_message,
+        ):
+            result = await bot.delete_messages_bulk(chat_id=1, message_ids=[1, 2, ], )
+        mock_delete_message.assert_not_called()
+        assert result is False
@@ -17,7 +17,7 @@
 
 from typing import TYPE_CHECKING, Callable, Iterable, Any as typing_Any
 from re import compile as re_compile, match as re_match
-from unittest.mock import create_autospec, ANY
+from unittest.mock import create_autospec, ANY, PropertyMock
 
 import pytest
 from telegram.constants import ChatType
@@ -25,6 +25,7 @@
 
 from app.tg.ptb.entities.match.constants import Cbks  # Just random cbk that have groups and matches by pattern
 from app.tg.ptb import custom
+from app.tg.ptb.entities.view import View
 from custom_ptb import callback_context
 
 from tests.conftest import patch_object
@@ -32,6 +33,7 @@
 if TYPE_CHECKING:
     from unittest.mock import MagicMock
     from telegram import UsersShared
+    from app.tg.ptb.entities.user.model import IUser
 
 
 @pytest.fixture(scope='module', )
@@ -554,3 +556,26 @@ def test_from_update(
             result = callback_context.CallbackContext.from_update(update=mock_update, application=mock_app, )
             mock_from_update.acow(update=mock_update, application=mock_app, )
             assert result == mock_context
+
+    @staticmethod
+    def test_view(mock_app: MagicMock, user_s: IUser, ):
+        with patch_object(
+                target=callback_context.CallbackContext,
+                attribute='user',
+                new_callable=PropertyMock,
+                return_value=user_s,
+                create=True,
+        ):
+            context = callback_context.CallbackContext(application=mock_app, )
+            result = context.view
+        assert isinstance(result, View, )
+        assert result.user is user_s
+        assert context.view is result  # Built once per update
+
+
+def test_view_sub_views_are_lazy(user_s: IUser, ):
+    result = View(user=user_s, )
+    assert not {'reg', 'match', 'posts', 'collections', 'mix', 'cjm', 'warn', } & result.__dict__.keys()
+    assert result.collections.posts_view is result.posts
+    assert result.posts.shared is result
+    assert result.posts.public.id == user_s.id
@@ -0,0 +1,96 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from unittest.mock import Mock
+
+from telegram.ext import ConversationHandler, MessageHandler, filters
+
+from app.tg.ptb.eviction import IdleUsers
+from app.tg.ptb.structures import CustomUserData
+
+
+def get_hydrated() -> CustomUserData:
+    return CustomUserData(
+        connection=Mock(),
+        view=Mock(),
+        model=Mock(),
+        forms=CustomUserData.Forms(new_user=Mock(), ),
+        tmp_data=CustomUserData.TmpData(collections_to_share=Mock(), ),
+    )
+
+
+class TestIdleUsers:
+
+    @staticmethod
+    def test_evict_idle():
+        clock = Mock(return_value=0, )
+        idle_users = IdleUsers(ttl=10, max_hydrated=100, clock=clock, )
+        user_data = {1: get_hydrated(), 2: get_hydrated(), }
+        idle_users.touch(user_id=1, )
+        clock.return_value = 5
+        idle_users.touch(user_id=2, )
+        assert idle_users.evict(user_data=user_data, now=12, ) == 1
+        assert user_data[1].model is user_data[1].view is user_data[1].connection is None
+        assert user_data[1].forms == CustomUserData.Forms()
+        assert user_data[1].tmp_data.collections_to_share is not None  # Kept
+        assert user_data[2].model is not None
+        assert list(idle_users.last_seen) == [2]
+
+    @staticmethod
+    def test_evict_lru():
+        idle_users = IdleUsers(ttl=100, max_hydrated=2, clock=Mock(return_value=0, ), )
+        user_data = {user_id: get_hydrated() for user_id in range(4)}
+        for user_id in (3, 0, 2, 1,):
+            idle_users.touch(user_id=user_id, )
+        assert idle_users.evict(user_data=user_data, now=1, ) == 2
+        assert user_data[3].model is None and user_data[0].model is None
+        assert list(idle_users.last_seen) == [2, 1]
+
+    @staticmethod
+    def test_evict_busy():
+        idle_users = IdleUsers(ttl=10, max_hydrated=100, clock=Mock(return_value=0, ), )
+        user_data = {1: get_hydrated(), 2: get_hydrated(), }
+        idle_users.touch(user_id=1, )
+        idle_users.touch(user_id=2, )
+        assert idle_users.evict(user_data=user_data, busy_ids={1}, now=20, ) == 1
+        assert user_data[1].model is not None
+        assert idle_users.last_seen == {1: 20}  # Returned as recently active
+        assert idle_users.metrics.skipped_busy == 1
+
+    @staticmethod
+    def test_touch_moves_to_end():
+        idle_users = IdleUsers(ttl=10, max_hydrated=100, clock=Mock(return_value=0, ), )
+        idle_users.touch(user_id=1, )
+        idle_users.touch(user_id=2, )
+        idle_users.touch(user_id=1, )
+        assert list(idle_users.last_seen) == [2, 1]
+
+    @staticmethod
+    def test_get_conversation_keys():
+        nested = ConversationHandler(
+            entry_points=[MessageHandler(filters=filters.ALL, callback=Mock(), )],
+            states={},
+            fallbacks=[],
+            map_to_parent={},
+        )
+        ch = ConversationHandler(
+            entry_points=[MessageHandler(filters=filters.ALL, callback=Mock(), )],
+            states={1: [nested]},
+            fallbacks=[],
+        )
+        ch._conversations[(1, 1,)] = 1
+        nested._conversations[(2, 2,)] = 1
+        assert IdleUsers.get_conversation_keys(handlers=[ch, Mock()], ) == {1, 2}
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any as typing_Any
+from unittest.mock import create_autospec, Mock
+from itertools import islice as itertools_islice
 
 import pytest
 from telegram.constants import MessageType
@@ -15,7 +17,7 @@
 )
 from telegram.ext import ApplicationHandlerStop
 
-from app.tg.ptb.structures import InlineData, PostsCategories, InlinePost
+from app.tg.ptb.structures import InlineData, PostsCategories, InlinePost, TextIndex
 from app.tg.ptb import inline_mode
 
 from tests.conftest import patch_object
@@ -165,6 +167,15 @@ def test_add_post_to_inline_data(
     patched_get_effective_message_type.return_value = message_type
     inline_mode.add_post_to_inline_data(inline_data=inline_data_f, post=public_post_s, )
     assert getattr(inline_data_f.posts, category_name, ) == [InlinePost(post=public_post_s, )]
+    assert inline_data_f.text_index.inline_posts == [InlinePost(post=public_post_s, )]
+    assert inline_data_f.version == 1
+
+
+def test_add_post_to_inline_data_forward(inline_data_f: InlineData, public_post_s: IPublicPost, ):
+    inline_data_f.forward = create_autospec(spec=lambda post: None, )
+    inline_mode.add_post_to_inline_data(inline_data=inline_data_f, post=public_post_s, )
+    inline_data_f.forward.acow(public_post_s, )
+    assert inline_data_f.posts.all == []
 
 
 class TestGetInlinePostKeyboardsVote:
@@ -238,8 +249,7 @@ def test_limit_posts_in_collections(collection_s: ICollection, ):
         assert list(result) == list(expected)  # zip can't be compared directly, need a list
 
     @staticmethod
-    # @pytest.mark.skip(reason='Cache temporary disabled', )
-    def test_get_cached_inline_results(inline_data_f: InlineData, patched_get_effective_message_type: MagicMock, ):
+    def test_build_inline_results(inline_data_f: InlineData, patched_get_effective_message_type: MagicMock, ):
         """
         No triggering `get_category_inline_results` cuz categories lists empty but no problem
         cuz `get_category_inline_results` already tested.
@@ -247,7 +257,7 @@ def test_get_cached_inline_results(inline_data_f: InlineData, patched_get_effect
         patched_get_effective_message_type.return_value = MessageType.TEXT  # No matter
         collection = inline_data_f.collections[0]
         post = collection.posts[0]
-        result = inline_mode.GetInlinePost.get_cached_inline_results(inline_data=inline_data_f, )
+        result = inline_mode.GetInlinePost.build_inline_results(inline_data=inline_data_f, )
         assert result == [inline_mode.get_inline_result(
             request_id=f'0 {post.id}',
             post=post,
@@ -255,25 +265,241 @@ def test_get_cached_inline_results(inline_data_f: InlineData, patched_get_effect
             reply_markup=inline_mode.GetInlinePost.Keyboards.Vote.build(post_id=post.id, ),
         ), ]
 
+    @staticmethod
+    def test_get_cached_inline_results(inline_data_f: InlineData, ):
+        with patch_object(
+                target=inline_mode.GetInlinePost,
+                attribute='build_inline_results',
+                side_effect=lambda inline_data: [],  # New list every call
+        ) as mock_build_inline_results:
+            result_1 = inline_mode.GetInlinePost.get_cached_inline_results(inline_data=inline_data_f, )
+            result_2 = inline_mode.GetInlinePost.get_cached_inline_results(inline_data=inline_data_f, )
+            assert result_1 is result_2
+            mock_build_inline_results.acow(inline_data=inline_data_f, )
+            inline_data_f.invalidate()
+            result_3 = inline_mode.GetInlinePost.get_cached_inline_results(inline_data=inline_data_f, )
+        assert result_3 is not result_1
+        assert mock_build_inline_results.call_count == 2
+        assert inline_data_f.cached_version == inline_data_f.version == 1
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        argnames='offset, expected',
+        argvalues=(
+                ('', (0, (),),),
+                ('mix 7', (0, (7,),),),
+                ('ranked -7 3', (1, (-7, 3,),),),
+                ('ranked', (1, (),),),
+                ('ranked foo', (0, (),),),
+                ('foo 1', (0, (),),),
+        ),
+    )
+    def test_decode_offset(offset: str, expected: tuple[int, tuple[int, ...]], ):
+        result = inline_mode.GetInlinePost.decode_offset(offset=offset, streams=inline_mode.GetInlinePost.STREAMS, )
+        assert result == expected
+
+    @staticmethod
+    def test_iter_stream_search(
+            inline_data_f: InlineData,
+            public_post_s: IPublicPost,
+            patched_get_effective_message_type: MagicMock,
+    ):
+        patched_get_effective_message_type.return_value = MessageType.TEXT  # No matter
+        with patch_object(
+                target=TextIndex,  # Slotted instance can't be patched
+                attribute='search',
+                return_value=[InlinePost(post=public_post_s, ), InlinePost(post=public_post_s, ), ],
+        ) as mock_search:
+            result = list(inline_mode.GetInlinePost.iter_stream(
+                stream=inline_mode.GetInlinePost.Streams.SEARCH,
+                inline_data=inline_data_f,
+                query='foo',
+                cursor=(1, ),
+            ))
+        mock_search.acow(inline_data_f.text_index, query='foo', limit=1 + inline_mode.GetInlinePost.PAGE_SIZE, )
+        assert result == [((2, ), inline_mode.get_inline_result(
+            request_id=f'ranked_post 1 {public_post_s.id}',
+            post=public_post_s,
+            description='Найденный пост',
+            reply_markup=inline_mode.GetInlinePost.Keyboards.Vote.build(post_id=public_post_s.id, ),
+        ),), ]
+
+    @staticmethod
+    @pytest.mark.parametrize(argnames='is_shown', argvalues=(False, True), )
+    def test_iter_stream_collections(
+            inline_data_f: InlineData,
+            patched_get_effective_message_type: MagicMock,
+            is_shown: bool,
+    ):
+        """The posts of the mix are skipped"""
+        patched_get_effective_message_type.return_value = MessageType.TEXT  # No matter
+        collection = inline_data_f.collections[0]
+        post = collection.posts[0]
+        with patch_object(
+                target=inline_mode.GetInlinePost,
+                attribute='get_cached_inline_results',
+                return_value=[Mock(id=f'0 {post.id}', ), ] if is_shown else [],
+        ):
+            result = list(inline_mode.GetInlinePost.iter_stream(
+                stream=inline_mode.GetInlinePost.Streams.COLLECTIONS,
+                inline_data=inline_data_f,
+                query='',
+                cursor=(),
+            ))
+        expected = [] if is_shown else [((collection.id, post.id, ), inline_mode.get_inline_result(
+            request_id=f'0 {post.id}',
+            post=post,
+            description=f'{collection.name.capitalize()} - стандартная коллекция',
+            reply_markup=inline_mode.GetInlinePost.Keyboards.Vote.build(post_id=post.id, ),
+        ),), ]
+        assert result == expected
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        argnames='cursor, expected_post_ids',
+        argvalues=(
+                ((), [1, 2, 3, ],),
+                ((1, 1,), [2, 3, ],),
+                ((1, 3,), [],),
+                ((1, 404,), [],),
+                ((404, 1,), [1, 2, 3, ],),
+        ),
+    )
+    def test_iter_stream_collections_cursor(
+            inline_data_f: InlineData,
+            cursor: tuple[int, ...],
+            expected_post_ids: list[int],
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        """Resumes after the post of the cursor, unknown post - the next collection, unknown collection - the start"""
+        collection = inline_data_f.collections[0]
+        monkeypatch.setattr(collection, 'posts', [Mock(id=post_id, ) for post_id in (1, 2, 3, )], )  # Session fixture
+        with (
+            patch_object(target=inline_mode.GetInlinePost, attribute='get_cached_inline_results', return_value=[], ),
+            patch_object(target=inline_mode, attribute='get_inline_result', ),
+        ):
+            result = list(inline_mode.GetInlinePost.iter_stream(
+                stream=inline_mode.GetInlinePost.Streams.COLLECTIONS,
+                inline_data=inline_data_f,
+                query='',
+                cursor=cursor,
+            ))
+        assert [post_id for (_, post_id, ), _ in result] == expected_post_ids
+
+    @staticmethod
+    def test_get_cached_ranking(inline_data_f: InlineData, ):
+        """Sorted by the priority and then by the post id (the newest first), the mix posts are skipped"""
+        inline_posts = [
+            InlinePost(post=Mock(id=post_id, ), priority=priority, )
+            for post_id, priority in ((1, 5,), (2, 0,), (3, 5,), (4, 9,),)
+        ]
+        inline_data_f.posts.texts.extend(inline_posts)
+        with patch_object(
+                target=inline_mode.GetInlinePost,
+                attribute='get_cached_inline_results',
+                return_value=[Mock(id='0 4', ), ],
+        ) as mock_get_cached_inline_results:
+            result_1 = inline_mode.GetInlinePost.get_cached_ranking(inline_data=inline_data_f, )
+            result_2 = inline_mode.GetInlinePost.get_cached_ranking(inline_data=inline_data_f, )
+        assert result_1 is result_2
+        mock_get_cached_inline_results.acow(inline_data=inline_data_f, )
+        assert result_1 == [(-5, -3, inline_posts[2],), (-5, -1, inline_posts[0],), (0, -2, inline_posts[1],), ]
+        assert inline_data_f.cached_ranking_version == inline_data_f.version
+
+    @staticmethod
+    def test_iter_stream_ranked(inline_data_f: InlineData, ):
+        """A priority change between the pages neither duplicates nor skips the rest of the posts"""
+        inline_posts = [InlinePost(post=Mock(id=post_id, ), priority=10 - post_id, ) for post_id in (1, 2, 3, 4,)]
+        inline_data_f.posts.texts.extend(inline_posts)
+        with (
+            patch_object(target=inline_mode.GetInlinePost, attribute='get_cached_inline_results', return_value=[], ),
+            patch_object(target=inline_mode, attribute='get_inline_result', ),
+        ):
+            first_page = list(itertools_islice(
+                inline_mode.GetInlinePost.iter_stream(
+                    stream=inline_mode.GetInlinePost.Streams.RANKED,
+                    inline_data=inline_data_f,
+                    query='',
+                    cursor=(),
+                ),
+                2,
+            ))
+            assert [cursor for cursor, _ in first_page] == [(9, 1,), (8, 2,), ]
+            inline_posts[3].priority += 10  # The last post becomes the first one
+            inline_data_f.invalidate()
+            second_page = list(inline_mode.GetInlinePost.iter_stream(
+                stream=inline_mode.GetInlinePost.Streams.RANKED,
+                inline_data=inline_data_f,
+                query='',
+                cursor=first_page[-1][0],
+            ))
+        assert [cursor for cursor, _ in second_page] == [(7, 3,), ]
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        argnames='offset, expected_results_num, expected_offset',
+        argvalues=(('', 2, 'mix 2',), ('mix 2', 2, 'ranked 8 2',), ('ranked 9 1', 1, '',)),
+    )
+    def test_get_page(
+            inline_data_f: InlineData,
+            offset: str,
+            expected_results_num: int,
+            expected_offset: str,
+    ):
+        """mix: 3 results, ranked: 1 not shown post and 1 result, collections: empty"""
+        streams = {
+            inline_mode.GetInlinePost.Streams.MIX: [((1,), Mock(),), ((2,), Mock(),), ((3,), Mock(),), ],
+            inline_mode.GetInlinePost.Streams.RANKED: [((9, 1,), None,), ((8, 2,), Mock(),), ],
+            inline_mode.GetInlinePost.Streams.COLLECTIONS: [],
+        }
+
+        def iter_stream(stream: str, cursor: tuple[int, ...], **_, ):
+            """Resume after the cursor"""
+            keys = [key for key, _ in streams[stream]]
+            return iter(streams[stream][keys.index(cursor) + 1 if cursor else 0:])
+
+        with (
+            patch_object(target=inline_mode.GetInlinePost, attribute='PAGE_SIZE', new=2, create=True, ),
+            patch_object(
+                target=inline_mode.GetInlinePost,
+                attribute='iter_stream',
+                side_effect=iter_stream,
+            ),
+        ):
+            results, next_offset = inline_mode.GetInlinePost.get_page(
+                inline_data=inline_data_f,
+                query='',
+                offset=offset,
+            )
+        assert len(results) == expected_results_num
+        assert None not in results
+        assert next_offset == expected_offset
+
     @staticmethod
     async def test_callback(mock_update: MagicMock, mock_context: MagicMock, ):
+        mock_update.inline_query.query = ' foo '
         with (
             patch_object(
                 target=inline_mode.GetInlinePost,
-                attribute='get_cached_inline_results',
-            ) as mock_get_cached_inline_results,
+                attribute='get_page',
+                return_value=([], 'search 50', ),
+            ) as mock_get_page,
             pytest.raises(expected_exception=ApplicationHandlerStop, ),
         ):
             await inline_mode.GetInlinePost.callback(update=mock_update, context=mock_context, )
-        mock_get_cached_inline_results.acow(inline_data=mock_context.bot_data.inline_data, )
+        mock_get_page.acow(
+            inline_data=mock_context.bot_data.inline_data,
+            query='foo',
+            offset=mock_update.inline_query.offset,
+        )
         mock_update.inline_query.answer.acow(
-            results=mock_get_cached_inline_results.return_value,
+            results=[],
             button=inline_mode.InlineQueryResultsButton(
                 text='Поместить сюда свой пост!',
                 start_parameter=inline_mode.CREATE_PUBLIC_POST_S,
             ),
             cache_time=10,
-            auto_pagination=True,
+            next_offset='search 50',
         )
 
 
@@ -286,6 +512,7 @@ async def test_callback(mock_update: MagicMock, mock_context: MagicMock, public_
         with pytest.raises(expected_exception=ApplicationHandlerStop, ):
             await inline_mode.InlinePostFeedback.callback(update=mock_update, context=mock_context, )
         assert inline_post.priority == 2
+        mock_context.bot_data.inline_data.invalidate.acow()
 
 
 class TestVoteCbkHandler:
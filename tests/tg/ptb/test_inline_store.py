@@ -0,0 +1,93 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from unittest.mock import Mock
+
+from app.tg.ptb import inline_store
+from app.tg.ptb.structures import InlineData, InlinePost, PostsCategories
+
+from tests.conftest import patch_object
+
+if TYPE_CHECKING:
+    from unittest.mock import MagicMock
+    from telegram.ext import ExtBot
+    from app.tg.ptb.entities.post.model import IPublicPost
+
+
+def test_serialize_deserialize_post(public_post_s: IPublicPost, ptb_bot_s: ExtBot, ):
+    result = inline_store.deserialize_post(data=inline_store.serialize_post(post=public_post_s, ), bot=ptb_bot_s, )
+    assert result.id == public_post_s.id
+    assert result.author.id == public_post_s.author.id
+    assert result.channel_id == public_post_s.channel_id
+    assert result.message_id == public_post_s.message_id
+    assert result.message == public_post_s.message
+
+
+class TestInlineStore:
+
+    @staticmethod
+    async def test_save(public_post_s: IPublicPost, ):
+        db_params = Mock()
+        with patch_object(target=inline_store.InlineStore.db, attribute='create', ) as mock_create:
+            await inline_store.InlineStore.save(post=public_post_s, db_params=db_params, collection_id=5, )
+        mock_create.acow(
+            statement=inline_store.InlineStore.SQLS.CREATE,
+            values=(
+                public_post_s.id,
+                5,
+                inline_store.json_dumps(inline_store.serialize_post(post=public_post_s, ), ),
+            ),
+            db_params=db_params,
+        )
+
+    @staticmethod
+    async def test_warm_start(public_post_s: IPublicPost, ptb_bot_s: ExtBot, ):
+        """The live post (id 1) is kept, the user post (id 2) and the collection post (id 3) are loaded"""
+        live_inline_post = InlinePost(post=public_post_s, priority=7, )
+        inline_data = InlineData(posts=PostsCategories(texts=[live_inline_post, ], ), )
+        data = inline_store.serialize_post(post=public_post_s, )
+        rows = [(None, data | {'id': post_id}, ) for post_id in (1, 2, )] + [(10, data | {'id': 3}, ), ]
+        collection = Mock(id=10, )
+
+        async def iter_pages(page_size: int, ):
+            yield rows[:page_size]
+            yield rows[page_size:]
+
+        with (
+            patch_object(target=inline_store.InlineStore, attribute='iter_pages', side_effect=iter_pages, ),
+            patch_object(target=inline_store, attribute='get_category', side_effect=lambda posts, post: posts.texts),
+            patch_object(target=inline_store.db_executor, attribute='run', return_value=[collection, ], ),
+        ):
+            result = await inline_store.InlineStore.warm_start(inline_data=inline_data, bot=ptb_bot_s, page_size=2, )
+        assert result == 3
+        assert sorted(inline_post.post.id for inline_post in inline_data.posts.texts) == [1, 2, ]
+        assert live_inline_post in inline_data.posts.texts
+        assert set(inline_data.posts.index) == {1, 2, }
+        assert set(inline_data.text_index.numbers) == {2, }
+        assert inline_data.collections == [collection, ]
+        assert [post.id for post in collection.posts] == [3, ]
+        assert inline_data.version == 1
+
+    @staticmethod
+    async def test_warm_start_job_error(mock_context: MagicMock, ):
+        with (
+            patch_object(target=inline_store.InlineStore, attribute='warm_start', side_effect=Exception, ),
+            patch_object(target=inline_store, attribute='logger', ) as mock_logger,
+        ):
+            await inline_store.InlineStore.warm_start_job(context=mock_context, )
+        mock_logger.error.assert_called_once()
+        mock_logger.info.assert_not_called()
@@ -0,0 +1,161 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+from telegram import Bot, Chat, Message
+from telegram.ext import ContextTypes, ExtBot
+
+from custom_ptb.persistence import DbPersistence, SqliteStorage
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@dataclass
+class UserData:
+    connection: object | None = None  # Transient
+    data: dict = field(default_factory=dict, )
+
+
+@pytest.fixture(scope='function', )
+def persistence(tmp_path: Path, ) -> DbPersistence:
+    result = DbPersistence(
+        storage=SqliteStorage(path=str(tmp_path / 'persistence.sqlite3'), ),
+        context_types=ContextTypes(user_data=UserData, ),
+        batch_size=2,
+        transient_user_fields=('connection',),
+    )
+    result.set_bot(bot=Mock(spec=ExtBot, ), )
+    return result
+
+
+def reopen(persistence: DbPersistence, ) -> DbPersistence:
+    result = DbPersistence(
+        storage=SqliteStorage(path=persistence.storage.connection.execute('PRAGMA database_list').fetchone()[2], ),
+        context_types=persistence.context_types,
+        transient_user_fields=persistence.transient_user_fields,
+    )
+    result.set_bot(bot=persistence.bot, )
+    return result
+
+
+class TestDbPersistence:
+
+    @staticmethod
+    async def test_user_data_round_trip(persistence: DbPersistence, ):
+        assert await persistence.get_user_data() == {}  # Lazy
+        await persistence.refresh_user_data(user_id=1, user_data=UserData(), )
+        await persistence.update_user_data(user_id=1, data=UserData(connection=object(), data={'foo': 'bar'}, ), )
+        new_persistence = reopen(persistence=persistence, )
+        await persistence.flush()
+        user_data = UserData(connection='live', )
+        await new_persistence.refresh_user_data(user_id=1, user_data=user_data, )
+        assert user_data == UserData(connection='live', data={'foo': 'bar'}, )  # Transient field is kept
+        await new_persistence.flush()
+
+    @staticmethod
+    async def test_update_before_load(persistence: DbPersistence, ):
+        """The stored data must not be overwritten by the data of the not refreshed user"""
+        await persistence.update_user_data(user_id=1, data=UserData(), )
+        assert persistence.dirty == {}
+        await persistence.flush()
+
+    @staticmethod
+    async def test_unchanged_not_written(persistence: DbPersistence, ):
+        await persistence.refresh_user_data(user_id=1, user_data=UserData(), )
+        for _ in range(3):
+            await persistence.update_user_data(user_id=1, data=UserData(data={'foo': 'bar'}, ), )
+        await persistence.write_task
+        assert persistence.metrics.marked == 1
+        assert persistence.metrics.skipped == 2
+        await persistence.flush()
+
+    @staticmethod
+    async def test_batches(persistence: DbPersistence, ):
+        for user_id in range(5):
+            await persistence.refresh_user_data(user_id=user_id, user_data=UserData(), )
+        for user_id in range(5):  # Like a single persistence update
+            await persistence.update_user_data(user_id=user_id, data=UserData(data={'id': user_id}, ), )
+        await persistence.flush()
+        assert persistence.metrics.written == 5
+        assert persistence.metrics.batches == 3  # batch_size=2
+
+    @staticmethod
+    async def test_drop_user_data(persistence: DbPersistence, ):
+        await persistence.refresh_user_data(user_id=1, user_data=UserData(), )
+        await persistence.update_user_data(user_id=1, data=UserData(data={'foo': 'bar'}, ), )
+        await persistence.write_task
+        await persistence.drop_user_data(user_id=1, )
+        await persistence.write_task
+        assert persistence.storage.read(kind=persistence.USER, key='1', ) is None
+        await persistence.flush()
+
+    @staticmethod
+    async def test_conversations(persistence: DbPersistence, ):
+        await persistence.update_conversation(name='foo', key=(1, 2,), new_state=3, )
+        await persistence.update_conversation(name='foo', key=(4, 5,), new_state=None, )  # Ended
+        await persistence.write_task
+        assert await persistence.get_conversations(name='foo', ) == {(1, 2,): 3}
+        await persistence.flush()
+
+    @staticmethod
+    async def test_failed_write_requeued(persistence: DbPersistence, ):
+        await persistence.refresh_user_data(user_id=1, user_data=UserData(), )
+        persistence.storage.write = Mock(side_effect=Exception, )
+        await persistence.update_user_data(user_id=1, data=UserData(data={'foo': 'bar'}, ), )
+        await persistence.write_task
+        assert list(persistence.dirty) == [(persistence.USER, '1',)]
+        assert persistence.metrics.failed_batches == 1
+
+    @staticmethod
+    async def test_flush_keeps_storage_open(persistence: DbPersistence, ):
+        """The admin command flushes the running app, the next writes must not fail"""
+        await persistence.refresh_user_data(user_id=1, user_data=UserData(), )
+        await persistence.flush()
+        await persistence.update_user_data(user_id=1, data=UserData(data={'foo': 'bar'}, ), )
+        await persistence.flush()
+        assert persistence.metrics.failed_batches == 0
+        assert persistence.storage.read(kind=persistence.USER, key='1', ) is not None
+        await persistence.close()
+
+
+class TestPickling:
+    """The local picklers replace the bot like PicklePersistence, breaks if PTB changes TelegramObject pickling"""
+
+    @staticmethod
+    def test_telegram_object(persistence: DbPersistence, ):
+        message = Message(
+            message_id=1,
+            date=datetime(2024, 1, 1, tzinfo=timezone.utc, ),
+            chat=Chat(id=2, type=Chat.PRIVATE, ),
+            text='foo',
+        )
+        message.set_bot(bot=persistence.bot, )
+        result = persistence.loads(data=persistence.dumps(obj={'message': message}, ), )['message']
+        assert result == message
+        assert result.text == 'foo'
+        assert result.get_bot() is persistence.bot
+        assert result.chat.id == 2
+
+    @staticmethod
+    def test_unknown_bot(persistence: DbPersistence, ):
+        other_bot = Bot(token='1:token', )
+        assert persistence.loads(data=persistence.dumps(obj={'bot': other_bot, }, ), ) == {'bot': None, }
@@ -0,0 +1,86 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from app.tg.ptb import photos_validator
+
+from tests.conftest import patch_object
+
+
+@pytest.fixture(scope='function', )
+def validator() -> photos_validator.PhotosValidator:
+    result = photos_validator.PhotosValidator(concurrency=2, max_age=100, clock=Mock(return_value=1000, ), )
+    with (
+        patch_object(target=result, attribute='read_validated_at', return_value={}, ),
+        patch_object(target=result, attribute='save_validated_at', ),
+    ):
+        yield result
+
+
+@pytest.fixture(scope='function', )
+def mock_bot() -> Mock:
+    return Mock(get_file=AsyncMock(), )
+
+
+class TestPhotosValidator:
+
+    @staticmethod
+    async def test_check(validator: photos_validator.PhotosValidator, mock_bot: Mock, ):
+        assert await validator.check(bot=mock_bot, file_id='foo', ) is True
+        mock_bot.get_file.side_effect = BadRequest(message='Wrong file_id', )
+        assert await validator.check(bot=mock_bot, file_id='foo', ) is False
+        mock_bot.get_file.side_effect = NetworkError(message='foo', )
+        assert await validator.check(bot=mock_bot, file_id='foo', ) is None
+
+    @staticmethod
+    async def test_check_retry_after(validator: photos_validator.PhotosValidator, mock_bot: Mock, ):
+        mock_bot.get_file.side_effect = [RetryAfter(retry_after=0, ), Mock(), ]
+        assert await validator.check(bot=mock_bot, file_id='foo', ) is True
+        assert mock_bot.get_file.call_count == 2
+
+    @staticmethod
+    async def test_validate(validator: photos_validator.PhotosValidator, mock_bot: Mock, ):
+        photos = [{'link': 'fresh'}, {'link': 'stale'}, {'link': 'new'}, {'link': 'invalid'}, {'link': 'unknown'}, ]
+        validator.read_validated_at.return_value = {'fresh': 950, 'stale': 800, }
+        responses = {
+            'stale': Mock(),
+            'new': Mock(),
+            'invalid': BadRequest(message='foo', ),
+            'unknown': NetworkError(message='foo', ),
+        }
+
+        async def get_file(file_id: str, ):
+            if isinstance(response := responses[file_id], Exception, ):
+                raise response
+            return response
+
+        mock_bot.get_file = get_file
+        validated, invalid = await validator.validate(bot=mock_bot, photos=photos, )
+        assert validated == [photos[0], photos[1], photos[2], photos[4], ]
+        assert invalid == [photos[3], ]
+        validator.save_validated_at.assert_called_once_with(file_ids=['stale', 'new', ], validated_at=1000, )
+        assert validator.get_metrics() == {'checked': 4, 'skipped': 1, 'invalid': 1, }
+
+    @staticmethod
+    async def test_validate_no_max_age(validator: photos_validator.PhotosValidator, mock_bot: Mock, ):
+        """All are checked"""
+        await validator.validate(bot=mock_bot, photos=[{'link': 'foo'}, ], max_age=0, )
+        validator.read_validated_at.assert_not_called()
+        mock_bot.get_file.assert_awaited_once_with(file_id='foo', )
@@ -0,0 +1,197 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from asyncio import (
+    ensure_future as asyncio_ensure_future,
+    get_running_loop as asyncio_get_running_loop,
+    gather as asyncio_gather,
+    sleep as asyncio_sleep,
+)
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from telegram.error import RetryAfter
+
+from custom_ptb import rate_limiter
+from custom_ptb.rate_limiter import TokenBucket
+
+
+class TestTokenBucket:
+
+    @staticmethod
+    def test_try_acquire():
+        clock = Mock(return_value=0, )
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock, )
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 0  # Burst
+        assert bucket.try_acquire() == 0.5
+        clock.return_value = 0.5
+        assert bucket.try_acquire() == 0
+
+    @staticmethod
+    def test_capacity():
+        clock = Mock(return_value=0, )
+        bucket = TokenBucket(rate=1, capacity=1, clock=clock, )
+        clock.return_value = 100  # Idle, not more than capacity accumulated
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 1
+
+    @staticmethod
+    def test_pause():
+        clock = Mock(return_value=0, )
+        bucket = TokenBucket(rate=1, capacity=5, clock=clock, )
+        bucket.pause(seconds=3, )
+        assert bucket.try_acquire() == 3
+        clock.return_value = 3
+        assert bucket.try_acquire() == 1  # Nothing accumulated during the pause
+        clock.return_value = 4
+        assert bucket.try_acquire() == 0
+
+    @staticmethod
+    async def test_acquire():
+        bucket = TokenBucket(rate=1000, capacity=1, )
+        for _ in range(3):
+            await bucket.acquire()
+        assert bucket.tokens < 1
+
+
+class TestPriorityBucket:
+
+    @staticmethod
+    async def test_acquire_by_priority():
+        bucket = rate_limiter.PriorityBucket(bucket=rate_limiter.TokenBucket(rate=100, capacity=1, ), )
+        assert await bucket.acquire(priority=rate_limiter.Priority.BULK, ) is False  # The token is free
+        served = []
+
+        async def acquire(name: str, priority: int, ):
+            await bucket.acquire(priority=priority, )
+            served.append(name, )
+
+        await asyncio_gather(
+            acquire(name='bulk_1', priority=rate_limiter.Priority.BULK, ),
+            acquire(name='bulk_2', priority=rate_limiter.Priority.BULK, ),
+            acquire(name='interactive', priority=rate_limiter.Priority.INTERACTIVE, ),
+        )
+        assert served == ['interactive', 'bulk_1', 'bulk_2', ]
+
+    @staticmethod
+    async def test_acquire_cancelled():
+        """The token of the cancelled waiter goes to the next one"""
+        bucket = rate_limiter.PriorityBucket(bucket=rate_limiter.TokenBucket(rate=100, capacity=1, ), )
+        await bucket.acquire(priority=0, )
+        cancelled = asyncio_ensure_future(bucket.acquire(priority=0, ), )
+        await asyncio_sleep(0, )
+        cancelled.cancel()
+        assert await bucket.acquire(priority=1, ) is True
+        assert not bucket.waiters
+
+    @staticmethod
+    async def test_pump_capacity():
+        """The token of the cancelled last waiter is returned, but not above the capacity"""
+        clock = Mock(return_value=0, )
+        bucket = rate_limiter.PriorityBucket(bucket=rate_limiter.TokenBucket(rate=1, capacity=1, clock=clock, ), )
+        future = asyncio_get_running_loop().create_future()
+        future.cancel()
+        bucket.waiters.append((0, 0, future, ), )
+        await bucket.pump()
+        assert bucket.bucket.tokens == 1
+
+
+class TestPriorityRateLimiter:
+
+    @staticmethod
+    @pytest.fixture(scope='function', )
+    def limiter() -> rate_limiter.PriorityRateLimiter:
+        return rate_limiter.PriorityRateLimiter(chat_rate=100, max_retries=1, )  # Fast refill
+
+    @staticmethod
+    def test_get_priority(limiter: rate_limiter.PriorityRateLimiter, ):
+        assert limiter.get_priority(endpoint='answerCallbackQuery', rate_limit_args=None, ) == 0
+        assert limiter.get_priority(endpoint='sendMessage', rate_limit_args=None, ) == 1
+        assert limiter.get_priority(endpoint='sendMessage', rate_limit_args=2, ) == 2
+
+    @staticmethod
+    def test_get_chat_bucket(limiter: rate_limiter.PriorityRateLimiter, ):
+        assert limiter.get_chat_bucket(chat_id=1, ).bucket.rate == limiter.chat_rate
+        assert limiter.get_chat_bucket(chat_id=-1, ).bucket.rate == limiter.group_rate
+        assert limiter.get_chat_bucket(chat_id='@channel', ).bucket.rate == limiter.group_rate
+        assert limiter.get_chat_bucket(chat_id=1, ) is limiter.chats[1]
+
+    @staticmethod
+    async def test_private_chats_not_limited():
+        """By default like AIORateLimiter, only the overall limit"""
+        limiter = rate_limiter.PriorityRateLimiter()
+        assert limiter.get_chat_bucket(chat_id=1, ) is None
+        assert limiter.get_chat_bucket(chat_id=-1, ) is not None
+        callback = AsyncMock()
+        for _ in range(10):
+            await limiter.process_request(
+                callback=callback,
+                args=(),
+                kwargs={},
+                endpoint='copyMessage',
+                data={'chat_id': 1},
+                rate_limit_args=None,
+            )
+        assert limiter.get_metrics() == {'requests': 10, 'queued': 0, 'throttled': 0, 'retry_after': 0, 'chats': 1, }
+
+    @staticmethod
+    def test_get_chat_bucket_prune(limiter: rate_limiter.PriorityRateLimiter, ):
+        limiter.MAX_BUCKETS = 2
+        limiter.get_chat_bucket(chat_id=1, )
+        limiter.get_chat_bucket(chat_id=2, ).bucket.try_acquire()  # Not idle
+        limiter.get_chat_bucket(chat_id=3, )
+        assert limiter.chats.keys() == {2, 3, }
+
+    @staticmethod
+    async def test_process_request(limiter: rate_limiter.PriorityRateLimiter, ):
+        callback = AsyncMock()
+        for _ in range(limiter.chat_burst + 1):
+            result = await limiter.process_request(
+                callback=callback,
+                args=(1,),
+                kwargs={},
+                endpoint='sendMessage',
+                data={'chat_id': '1'},
+                rate_limit_args=None,
+            )
+        callback.assert_awaited_with(1, )
+        assert result == callback.return_value
+        assert limiter.get_metrics() == {'requests': 4, 'queued': 0, 'throttled': 1, 'retry_after': 0, 'chats': 1, }
+
+    @staticmethod
+    async def test_process_request_no_chat_id(limiter: rate_limiter.PriorityRateLimiter, ):
+        """The answers of the queries have no chat_id, the global limit only"""
+        limiter.overall.bucket.tokens = 0
+        await limiter.process_request(
+            callback=AsyncMock(),
+            args=(),
+            kwargs={},
+            endpoint='answerInlineQuery',
+            data={'inline_query_id': '1'},
+            rate_limit_args=None,
+        )
+        assert limiter.get_metrics() == {'requests': 1, 'queued': 0, 'throttled': 1, 'retry_after': 0, 'chats': 0, }
+
+    @staticmethod
+    async def test_process_request_retry_after(limiter: rate_limiter.PriorityRateLimiter, ):
+        callback = AsyncMock(side_effect=[RetryAfter(retry_after=0, ), True, ], )
+        kwargs = {'endpoint': 'sendMessage', 'data': {'chat_id': 1}, 'rate_limit_args': None, }
+        assert await limiter.process_request(callback=callback, args=(), kwargs={}, **kwargs, ) is True
+        callback.side_effect = RetryAfter(retry_after=0, )
+        with pytest.raises(expected_exception=RetryAfter, ):
+            await limiter.process_request(callback=callback, args=(), kwargs={}, **kwargs, )
+        assert limiter.retry_after == 3
@@ -0,0 +1,108 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from unittest.mock import Mock
+
+import pytest
+
+from app.tg.ptb import sharding
+
+from tests.conftest import patch_object
+
+if TYPE_CHECKING:
+    from unittest.mock import MagicMock
+    from app.tg.ptb.entities.post.model import IPublicPost
+
+
+class TestGetShard:
+    """test_get_shard"""
+
+    @staticmethod
+    def test_inline(mock_update: MagicMock, ):
+        mock_update.inline_query = True
+        mock_update.effective_user.id = 3
+        assert sharding.get_shard(update=mock_update, shards_num=2, ) == sharding.MAIN_SHARD
+
+    @staticmethod
+    @pytest.mark.parametrize(argnames='user_id, expected', argvalues=((3, 1), (4, 0), ), )
+    def test_user(mock_update: MagicMock, user_id: int, expected: int, ):
+        mock_update.inline_query = mock_update.chosen_inline_result = None
+        mock_update.effective_user.id = user_id
+        assert sharding.get_shard(update=mock_update, shards_num=2, ) == expected
+
+    @staticmethod
+    def test_channel(mock_update: MagicMock, ):
+        mock_update.inline_query = mock_update.chosen_inline_result = mock_update.effective_user = None
+        mock_update.effective_chat.id = -1001
+        assert sharding.get_shard(update=mock_update, shards_num=3, ) == -1001 % 3
+
+
+class TestSupervisor:
+
+    @staticmethod
+    @pytest.fixture(scope='function', )
+    def supervisor() -> sharding.Supervisor:
+        with patch_object(target=sharding, attribute='multiprocessing_get_context', ):
+            yield sharding.Supervisor(workers_num=2, )
+
+    @staticmethod
+    def test_start_worker(supervisor: sharding.Supervisor, ):
+        """The spawned process config reads the shard and the shards number from the environment"""
+        environs = []
+        supervisor.context.Process.return_value.start.side_effect = lambda: environs.append(
+            (sharding.os_environ['SHARD_ID'], sharding.os_environ['SHARDS_NUM'],),
+        )
+        supervisor.start_worker(shard_id=1, )
+        assert environs == [('1', '2',), ]
+        assert 'SHARD_ID' not in sharding.os_environ and 'SHARDS_NUM' not in sharding.os_environ
+        assert supervisor.processes[1] is supervisor.context.Process.return_value
+
+    @staticmethod
+    def test_route(supervisor: sharding.Supervisor, mock_update: MagicMock, ):
+        with patch_object(target=sharding, attribute='get_shard', return_value=1, ) as mock_get_shard:
+            supervisor.route(update=mock_update, )
+        mock_get_shard.acow(update=mock_update, shards_num=2, )
+        supervisor.queues[1].put.acow((sharding.UPDATE, mock_update.to_dict.return_value,), )
+        assert supervisor.routed == [0, 1, ]
+
+    @staticmethod
+    async def test_route_updates(supervisor: sharding.Supervisor, mock_update: MagicMock, ):
+        update_queue = sharding.asyncio_Queue()
+        for update in (mock_update, mock_update, None, ):
+            update_queue.put_nowait(update, )
+        with patch_object(target=supervisor, attribute='route', ) as mock_route:
+            await supervisor.route_updates(update_queue=update_queue, )
+        assert mock_route.call_count == 2
+
+
+async def test_handle_worker_messages(mock_app: MagicMock, public_post_s: IPublicPost, ):
+    messages = (
+        (sharding.UPDATE, {'update_id': 1, }, ),
+        (sharding.INLINE_POST, sharding.serialize_post(post=public_post_s, ), ),
+        None,
+    )
+    with (
+        patch_object(target=sharding, attribute='add_post_to_inline_data', ) as mock_add_post_to_inline_data,
+        patch_object(target=sharding.Update, attribute='de_json', ) as mock_de_json,
+    ):
+        await sharding.handle_worker_messages(
+            application=mock_app,
+            queue=Mock(get=Mock(side_effect=messages, ), ),  # Process queue
+        )
+    mock_de_json.acow(data={'update_id': 1, }, bot=mock_app.bot, )
+    mock_app.update_queue.put.acow(mock_de_json.return_value, )
+    mock_add_post_to_inline_data.assert_called_once()
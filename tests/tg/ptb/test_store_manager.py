@@ -51,8 +51,8 @@ class TestSave:
         """ test_save """
 
         @staticmethod
-        def test_chat(chat_s: Chat, patched_db: MagicMock, ):
-            store_manager.Model.save(source=chat_s, target=chat_s, db_params=typing_Any, )
+        async def test_chat(chat_s: Chat, patched_db: MagicMock, ):
+            await store_manager.Model.save(source=chat_s, target=chat_s, db_params=typing_Any, )
             patched_db.create.acow(
                 statement=store_manager.Model.SQLS.CREATE,
                 values=(chat_s.id, chat_s.id, str(chat_s.type), str(chat_s.type), True, True,),
@@ -60,9 +60,9 @@ def test_chat(chat_s: Chat, patched_db: MagicMock, ):
             )
 
         @staticmethod
-        def test_chat_full_info(chat_full_info_s: ChatFullInfo, patched_db: MagicMock, ):
+        async def test_chat_full_info(chat_full_info_s: ChatFullInfo, patched_db: MagicMock, ):
             source = target = chat_full_info_s
-            store_manager.Model.save(source=source, target=target, db_params=typing_Any, )
+            await store_manager.Model.save(source=source, target=target, db_params=typing_Any, )
             patched_db.create.acow(
                 statement=store_manager.Model.SQLS.CREATE,
                 values=(source.id, target.id, str(source.type), str(target.type), False, False,),
@@ -70,8 +70,8 @@ def test_chat_full_info(chat_full_info_s: ChatFullInfo, patched_db: MagicMock, )
             )
 
     @staticmethod
-    def test_read_target(patched_db: MagicMock, ):
-        result = store_manager.Model.read_target(source=1, db_params=typing_Any, )
+    async def test_read_target(patched_db: MagicMock, ):
+        result = await store_manager.Model.read_target(source=1, db_params=typing_Any, )
         patched_db.read.acow(
             statement=store_manager.Model.SQLS.READ_TARGET_BY_SOURCE,
             values=(1,),
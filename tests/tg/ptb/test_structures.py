@@ -0,0 +1,127 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from random import Random
+from array import array
+from unittest.mock import Mock
+
+import pytest
+
+from app.tg.ptb.structures import PostsCategories, InlinePost, TextIndex
+
+
+def create_inline_post(post_id: int, priority: int = 0, text: str | None = None, ) -> InlinePost:
+    return InlinePost(post=Mock(id=post_id, message=Mock(text=text, caption=None, ), ), priority=priority, )
+
+
+def assert_consistent(posts_categories: PostsCategories, ) -> None:
+    """Every category is a valid min heap and every post is indexed by its real position"""
+    for category in posts_categories:
+        for position, inline_post in enumerate(category, ):
+            assert posts_categories.index[inline_post.post.id] == (category, position, )
+            if position:
+                assert not inline_post < category[(position - 1) // 2]
+    assert len(posts_categories.index) == len(posts_categories.all)
+
+
+class TestPostsCategories:
+
+    @staticmethod
+    def test_init():
+        posts_categories = PostsCategories(texts=[create_inline_post(post_id=1, priority=5, ), create_inline_post(post_id=2, ), ], )
+        assert posts_categories.texts[0].post.id == 2
+        assert_consistent(posts_categories=posts_categories, )
+
+    @staticmethod
+    def test_push():
+        posts_categories = PostsCategories()
+        posts_categories.push(category=posts_categories.photos, inline_post=create_inline_post(post_id=1, ), )
+        posts_categories.push(category=posts_categories.photos, inline_post=create_inline_post(post_id=1, ), )
+        assert len(posts_categories.photos) == 1
+        assert_consistent(posts_categories=posts_categories, )
+
+    @staticmethod
+    def test_increase_priority():
+        random = Random(0, )
+        posts_categories = PostsCategories()
+        for post_id in range(300):
+            posts_categories.push(
+                category=random.choice(list(posts_categories), ),
+                inline_post=create_inline_post(post_id=post_id, priority=random.randint(0, 10, ), ),
+            )
+        for _ in range(1000):
+            post_id = random.randrange(300, )
+            category, position = posts_categories.index[post_id]
+            priority = category[position].priority
+            result = posts_categories.increase_priority(post_id=post_id, value=random.randint(1, 3, ), )
+            assert result.post.id == post_id and result.priority > priority
+        assert_consistent(posts_categories=posts_categories, )
+
+    @staticmethod
+    def test_increase_priority_no_post():
+        assert PostsCategories().increase_priority(post_id=1, ) is None
+
+    @staticmethod
+    @pytest.mark.parametrize(argnames='texts', argvalues=([], [create_inline_post(post_id=1, )], ), )
+    def test_reindex(texts: list[InlinePost], ):
+        posts_categories = PostsCategories()
+        posts_categories.texts += texts
+        posts_categories.reindex()
+        assert_consistent(posts_categories=posts_categories, )
+
+
+class TestTextIndex:
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        argnames='text, is_prefix, expected',
+        argvalues=(
+                ('Cat', False, {' ca', 'cat', 'at '}),
+                ('Cat', True, {' ca', 'cat'}),
+                ('a cat', True, {' a ', ' ca', 'cat'}),
+                ('a', True, set()),
+                ('', False, set()),
+        ),
+    )
+    def test_get_trigrams(text: str, is_prefix: bool, expected: set[str], ):
+        assert TextIndex.get_trigrams(text=text, is_prefix=is_prefix, ) == expected
+
+    @staticmethod
+    def test_add():
+        text_index = TextIndex()
+        inline_post = create_inline_post(post_id=5, text='cat', )
+        text_index.add(inline_post=inline_post, )
+        text_index.add(inline_post=inline_post, )
+        assert text_index.inline_posts == [inline_post, ]
+        assert text_index.numbers == {5: 0}
+        assert text_index.postings == {' ca': array('I', [0]), 'cat': array('I', [0]), 'at ': array('I', [0])}
+
+    @staticmethod
+    def test_search():
+        text_index = TextIndex()
+        inline_posts = (
+            create_inline_post(post_id=1, text='A black cat', ),
+            create_inline_post(post_id=2, text='A dog and a cat', priority=1, ),
+            create_inline_post(post_id=3, text='Catalog', ),
+            create_inline_post(post_id=4, text='A dog', ),
+        )
+        for inline_post in inline_posts:
+            text_index.add(inline_post=inline_post, )
+        assert text_index.search(query='cat', limit=10, ) == [inline_posts[1], inline_posts[0], inline_posts[2], ]
+        assert text_index.search(query='cat', limit=1, ) == [inline_posts[1], ]
+        assert text_index.search(query='black cta', limit=10, ) == [inline_posts[0], ]  # Typo tolerated
+        assert text_index.search(query='bird', limit=10, ) == []
+        assert text_index.search(query='', limit=10, ) == []
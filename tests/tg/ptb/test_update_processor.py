@@ -0,0 +1,100 @@
+# Copyright (C) 2023 David Shiko
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from asyncio import gather as asyncio_gather, sleep as asyncio_sleep, Event as asyncio_Event
+
+import pytest
+
+from custom_ptb import update_processor
+from custom_ptb.update_processor import PerKeyUpdateProcessor
+
+from tests.conftest import patch_object
+
+if TYPE_CHECKING:
+    from unittest.mock import MagicMock
+
+
+@pytest.fixture(scope='function', )
+def processor() -> PerKeyUpdateProcessor:
+    """Update is the key itself"""
+    with patch_object(target=PerKeyUpdateProcessor, attribute='get_key', side_effect=lambda update: update, ):
+        yield PerKeyUpdateProcessor(max_concurrent_updates=4, )
+
+
+def test_get_key(mock_update: MagicMock, ):
+    assert PerKeyUpdateProcessor.get_key(update=mock_update, ) == mock_update.effective_user.id
+    mock_update.effective_user = None
+    assert PerKeyUpdateProcessor.get_key(update=mock_update, ) == mock_update.effective_chat.id
+    assert PerKeyUpdateProcessor.get_key(update=object(), ) is None
+
+
+async def test_same_key_fifo(processor: PerKeyUpdateProcessor, ):
+    result = []
+
+    async def handle(num: int, ):
+        await asyncio_sleep(0.01 * (5 - num), )  # The first is the slowest
+        result.append(num, )
+
+    await asyncio_gather(*(processor.process_update(update=1, coroutine=handle(num=num, ), ) for num in range(5)), )
+    assert result == [0, 1, 2, 3, 4, ]
+    assert processor.get_metrics()['max_key_queue_depth'] == 4
+    assert processor.get_metrics()['processed'] == 5
+    assert processor.queues == {}
+
+
+async def test_same_key_error(processor: PerKeyUpdateProcessor, ):
+    """The error is logged, the queued updates of the key are processed anyway"""
+    result = []
+    error = ValueError()
+
+    async def handle(num: int, ):
+        await asyncio_sleep(0, )
+        if num == 0:
+            raise error
+        result.append(num, )
+
+    with patch_object(target=update_processor, attribute='logger', ) as mock_logger:
+        await asyncio_gather(*(processor.process_update(update=1, coroutine=handle(num=num, ), ) for num in range(3)), )
+    mock_logger.error.acow(msg=error, exc_info=True, )
+    assert result == [1, 2, ]
+    assert processor.get_metrics()['processed'] == 3
+    assert processor.queues == {}
+
+
+async def test_different_keys_concurrent(processor: PerKeyUpdateProcessor, ):
+    event = asyncio_Event()
+    started = []
+
+    async def handle(key: int, ):
+        started.append(key, )
+        if len(started) == 2:  # Deadlock if not concurrent
+            event.set()
+        await event.wait()
+
+    await asyncio_gather(*(processor.process_update(update=key, coroutine=handle(key=key, ), ) for key in (1, 2)), )
+    assert sorted(started) == [1, 2, ]
+
+
+async def test_metrics(processor: PerKeyUpdateProcessor, ):
+    event = asyncio_Event()
+    tasks = asyncio_gather(*(processor.process_update(update=1, coroutine=event.wait(), ) for _ in range(3)), )
+    await asyncio_sleep(0, )
+    metrics = processor.get_metrics()
+    assert metrics['active_keys'] == 1
+    assert metrics['queued_updates'] == metrics['key_1_queue_depth'] == 2
+    event.set()
+    await tasks
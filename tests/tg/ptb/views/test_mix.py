@@ -15,14 +15,18 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING
+from unittest.mock import ANY
 
 from telegram.constants import ParseMode
 from telegram import BotCommand
 
+from app.tg.ptb.entities.mix import view as mix_view
 from app.tg.ptb.entities.mix.view import Mix as View, DONATE_IMAGE_PATH
 from app.tg.ptb.entities.mix import texts
 from app.tg.ptb.entities.texts import PUBLIC_COMMANDS
 
+from tests.conftest import patch_object
+
 if TYPE_CHECKING:
     from unittest.mock import MagicMock
 
@@ -67,11 +71,20 @@ async def test_faq(mock_view_f: MagicMock, ):
 
 
 async def test_donate(mock_view_f: MagicMock, ):
-    result = await View.donate(self=mock_view_f, )
-    mock_view_f.bot.send_photo.acow(chat_id=mock_view_f.id, caption=texts.DONATE, photo=DONATE_IMAGE_PATH, )
-    assert result == mock_view_f.bot.send_photo.return_value
+    with patch_object(target=mix_view.assets, attribute='send', ) as mock_send:
+        result = await View.donate(self=mock_view_f, )
+    mock_send.acow(path=DONATE_IMAGE_PATH, send=ANY, )
+    await mock_send.call_args.kwargs['send']('file_id', )
+    mock_view_f.bot.send_photo.acow(chat_id=mock_view_f.id, caption=texts.DONATE, photo='file_id', )
+    assert result == mock_send.return_value
+
+
+async def test_show_metrics(mock_view_f: MagicMock, ):
+    result = await View.show_metrics(self=mock_view_f, metrics={'foo': {'a': 1, 'b': 2, }, 'bar': {'c': 3, }, }, )
+    mock_view_f.bot.send_message.acow(chat_id=mock_view_f.id, text='foo:\na: 1\nb: 2\n\nbar:\nc: 3', )
+    assert result == mock_view_f.bot.send_message.return_value
 
 
 async def test_drop_hide_btn(mock_view_f: MagicMock, ):
     await View.drop_hide_btn(self=mock_view_f, message_ids=[1, ], )
-    mock_view_f.bot.delete_message.acow(chat_id=mock_view_f.id, message_id=1, )
+    mock_view_f.bot.delete_messages_bulk.acow(chat_id=mock_view_f.id, message_ids=[1, ], )
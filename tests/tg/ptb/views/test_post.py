@@ -14,8 +14,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from __future__ import annotations
-from unittest.mock import call, ANY
-from typing import TYPE_CHECKING, Any as typing_Any
+from unittest.mock import call, ANY, MagicMock
+from typing import Any as typing_Any
 
 import pytest
 from telegram.error import TelegramError
@@ -28,10 +28,6 @@
 
 from tests.conftest import patch_object
 
-if TYPE_CHECKING:
-    from unittest.mock import MagicMock
-
-
 class TestBotPublicPost:
 
     @staticmethod
@@ -99,6 +95,14 @@ def test_get_keyboard(
         )
         assert result == expected
 
+    @staticmethod
+    def test_get_keyboard_cached(public_post_s: model.IPublicPost, public_vote_s: model.IPublicVote, monkeypatch, ):
+        monkeypatch.setattr(target=public_vote_s, name='value', value=VoteValue.POSITIVE, )
+        result = view.Posts.Public.get_keyboard(post=public_post_s, clicker_vote=public_vote_s, )
+        assert view.Posts.Public.get_keyboard(post=public_post_s, clicker_vote=public_vote_s, ) is result
+        monkeypatch.setattr(target=public_vote_s, name='value', value=VoteValue.NEGATIVE, )
+        assert view.Posts.Public.get_keyboard(post=public_post_s, clicker_vote=public_vote_s, ) != result
+
     @staticmethod
     async def test_show(
             mock_view_f: MagicMock,
@@ -168,6 +172,14 @@ def test_get_keyboard(channel_public_post_s: model.IChannelPublicPost, ):
         actual_keyboard = view.ChannelPublicPost.get_keyboard(post=channel_public_post_s, )
         assert actual_keyboard == expected_keyboard
 
+    @staticmethod
+    def test_get_keyboard_cached(channel_public_post_s: model.IChannelPublicPost, monkeypatch, ):
+        result = view.ChannelPublicPost.get_keyboard(post=channel_public_post_s, )
+        assert view.ChannelPublicPost.get_keyboard(post=channel_public_post_s, ) is result
+        monkeypatch.setattr(target=channel_public_post_s, name='likes_count', value=100, )
+        new_result = view.ChannelPublicPost.get_keyboard(post=channel_public_post_s, )
+        assert new_result.inline_keyboard[0][1].text == f'{view.ChannelPublicPost.POS_EMOJI} 100'
+
     @staticmethod
     async def test_update_poll_keyboard(mock_view_f: MagicMock, channel_public_post_s: model.IChannelPublicPost, ):
         result = await view.ChannelPublicPost.update_poll_keyboard(
@@ -365,6 +377,13 @@ def patched_logger() -> MagicMock:
         yield mock_logger
 
 
+def test_get_keyboards_cache_metrics():
+    result = view.get_keyboards_cache_metrics()
+    assert set(result) == {
+        f'{name}_{metric}' for name in ('public', 'channel', 'personal',) for metric in ('hits', 'misses', 'size',)
+    }
+
+
 async def test_store_in_channel(mock_view_f: MagicMock, ):
     result = await view.Posts.store_in_channel(self=mock_view_f, message_id=1, )
     mock_view_f.bot.copy_message.acow(
@@ -509,83 +528,137 @@ async def test_personal(mock_view_f: MagicMock, mock_personal_post_form: MagicMo
         assert result == mock_view_f.posts.bot.copy_message.return_value
 
 
-class TestShare:
-    """share"""
+async def test_share_personal_posts(mock_view_f: MagicMock, mock_personal_post: MagicMock, mock_user: MagicMock, ):
+    mock_vote = mock_user.get_vote.return_value
+    mock_view_f.posts.show_shared_posts.return_value = [mock_vote]
+    with patch_object(target=view, attribute='db_executor', ) as mock_db_executor:
+        mock_db_executor.run.side_effect = [[(mock_vote, mock_vote,), ], None, ]
+        result = await view.Posts.share_posts(
+            self=mock_view_f.posts,
+            posts=(mock_personal_post,),
+            sender=mock_user,
+            recipient=mock_user,
+        )
+    assert mock_db_executor.run.call_args_list == [
+        call(
+            mock_view_f.posts.read_votes_pairs,
+            sender=mock_user,
+            recipient=mock_user,
+            posts=[mock_personal_post, ],
+        ),
+        call(mock_view_f.posts.upsert_messages_ids, votes=[mock_vote, mock_vote, ], ),
+    ]
+    assert mock_view_f.posts.delete_shared_post.call_args_list == [
+        call(chat_id=mock_vote.user.id, message_id=mock_vote.message_id, semaphore=ANY, ),
+        call(chat_id=mock_vote.user.id, message_id=mock_vote.message_id, semaphore=ANY, ),
+    ]
+    voted_post = view.model.VotedPersonalPost(
+        post=mock_personal_post,
+        clicker_vote=mock_vote,
+        opposite_vote=mock_vote,
+    )
+    assert mock_view_f.posts.show_shared_posts.call_args_list == [
+        call(posts=[voted_post], failed={}, ),
+        call(posts=[voted_post], failed={}, ),
+    ]
+    assert result is True
 
-    @staticmethod
-    async def test_error(
-            mock_view_f: MagicMock,
-            mock_personal_post: MagicMock,
-            mock_user: MagicMock,
-            patched_logger: MagicMock,
-    ):
-        mock_view_f.posts.show_post.side_effect = TelegramError('')
-        result = await view.Posts.share_post(
+
+async def test_share_personal_posts_failed(
+        mock_view_f: MagicMock,
+        mock_personal_post: MagicMock,
+        mock_user: MagicMock,
+        patched_logger: MagicMock,
+):
+    """The post failed to the one chat only is counted once"""
+    mock_vote = mock_user.get_vote.return_value
+
+    async def show_shared_posts(posts: list, failed: dict, ) -> list:
+        failed[(1, mock_personal_post.id,)] = TelegramError(message='', )
+        return []
+
+    mock_view_f.posts.show_shared_posts.side_effect = show_shared_posts
+    with patch_object(target=view, attribute='db_executor', ) as mock_db_executor:
+        mock_db_executor.run.side_effect = [[(mock_vote, mock_vote,), ], None, ]
+        await view.Posts.share_posts(
             self=mock_view_f.posts,
-            post=mock_personal_post,
-            post_sender=mock_user,
-            post_recipient=mock_user,
+            posts=(mock_personal_post,),
+            sender=mock_user,
+            recipient=mock_user,
         )
-        patched_logger.error.acow(msg=mock_view_f.posts.show_post.side_effect, exc_info=True, )
-        mock_user.get_vote.return_value.CRUD.upsert_message_id.assert_not_called()
-        assert result is None
+    assert patched_logger.warning.call_args.kwargs['msg'].startswith('Shared 0/1 posts', )
+
+
+class TestShareHelpers:
 
     @staticmethod
-    async def test_success(
-            mock_view_f: MagicMock,
-            mock_personal_post: MagicMock,
-            mock_user: MagicMock,
-    ):
-        orig_sender_message_id = orig_recipient_message_id = mock_user.get_vote.return_value.message_id
-        await view.Posts.share_post(
+    async def test_delete_shared_post(mock_view_f: MagicMock, ):
+        mock_view_f.posts.delete_post.side_effect = TelegramError(message='', )
+        await view.Posts.delete_shared_post(
             self=mock_view_f.posts,
-            post=mock_personal_post,
-            post_sender=mock_user,
-            post_recipient=mock_user,
+            chat_id=1,
+            message_id=2,
+            semaphore=view.asyncio_Semaphore(),
+        )  # Not raised
+        mock_view_f.posts.delete_post.acow(chat_id=1, message_id=2, )
+
+    @staticmethod
+    async def test_delete_shared_post_no_message(mock_view_f: MagicMock, ):
+        await view.Posts.delete_shared_post(
+            self=mock_view_f.posts,
+            chat_id=1,
+            message_id=None,
+            semaphore=view.asyncio_Semaphore(),
         )
-        # Check get_vote calls
-        assert mock_user.get_vote.call_args_list == [
-            call(post=mock_personal_post, ),
-            call(post=mock_personal_post, ),
-        ]
-        assert mock_view_f.posts.delete_post.call_args_list == [
-            call(chat_id=mock_user.id, message_id=orig_sender_message_id, ),
-            call(chat_id=mock_user.id, message_id=orig_recipient_message_id, ),
-        ]
-        # Check send calls
-        assert mock_view_f.posts.show_post.call_args_list == [
-            call(
-                post=view.model.VotedPersonalPost(
-                    post=mock_personal_post,
-                    clicker_vote=mock_user.get_vote.return_value,
-                    opposite_vote=mock_user.get_vote.return_value,
-                )
-            ),
-            call(
-                post=view.model.VotedPersonalPost(
-                    post=mock_personal_post,
-                    clicker_vote=mock_user.get_vote.return_value,
-                    opposite_vote=mock_user.get_vote.return_value,
-                )
-            ),
-        ]
-        # Check upsert_message_id calls
-        assert mock_user.get_vote.return_value.upsert_message_id.call_args_list == [call(), call(), ]
-
-
-async def test_share_personal_posts(mock_view_f: MagicMock, ):
-    result = await view.Posts.share_posts(
-        self=mock_view_f.posts,
-        posts=(typing_Any,),
-        sender=typing_Any,
-        recipient=typing_Any,
-    )
-    mock_view_f.posts.share_post.acow(
-        post=typing_Any,
-        post_sender=typing_Any,
-        post_recipient=typing_Any,
-    )
-    assert result is True
+        mock_view_f.posts.delete_post.assert_not_called()
+
+    @staticmethod
+    async def test_show_shared_posts(mock_view_f: MagicMock, ):
+        """The failed post doesn't stop the next ones, its deleted old message is cleared"""
+        posts = [MagicMock(), MagicMock(), MagicMock(), MagicMock(), ]
+        posts[3].clicker_vote.message_id = None  # Had no message
+        error = TelegramError(message='', )
+        mock_view_f.posts.show_post.side_effect = [MagicMock(message_id=1, ), error, MagicMock(message_id=3, ), error, ]
+        failed = {}
+        result = await view.Posts.show_shared_posts(self=mock_view_f.posts, posts=posts, failed=failed, )
+        assert mock_view_f.posts.show_post.call_args_list == [call(post=post, ) for post in posts]
+        assert result == [posts[0].clicker_vote, posts[1].clicker_vote, posts[2].clicker_vote, ]
+        assert [post.clicker_vote.message_id for post in posts] == [1, None, 3, None, ]
+        assert failed == {
+            (posts[1].clicker_vote.user.id, posts[1].post.id,): error,
+            (posts[3].clicker_vote.user.id, posts[3].post.id,): error,
+        }
+
+    @staticmethod
+    def test_read_votes_pairs(mock_personal_post: MagicMock, ):
+        """The vote missed by the bulk read is zero, without a query"""
+        sender, recipient = MagicMock(id=1, ), MagicMock(id=2, )
+        sender_vote = MagicMock()
+        sender.PersonalVote.read_many.return_value = {(1, mock_personal_post.id,): sender_vote, }
+        result = view.Posts.read_votes_pairs(sender=sender, recipient=recipient, posts=[mock_personal_post, ], )
+        sender.PersonalVote.read_many.acow(
+            pairs=[(sender, mock_personal_post.id,), (recipient, mock_personal_post.id,), ],
+            connection=sender.connection,
+        )
+        recipient.PersonalVote.get_zero.acow(user=recipient, post_id=mock_personal_post.id, )
+        recipient.get_vote.assert_not_called()
+        assert result == [(sender_vote, recipient.PersonalVote.get_zero.return_value,), ]
+
+    @staticmethod
+    def test_upsert_messages_ids():
+        votes = [MagicMock(), MagicMock(), ]
+        view.Posts.upsert_messages_ids(votes=votes, )
+        for vote in votes:
+            vote.upsert_message_id.acow()
+
+
+async def test_share_personal_posts_no_posts(mock_view_f: MagicMock, mock_user: MagicMock, ):
+    with patch_object(target=view, attribute='db_executor', ) as mock_db_executor:
+        mock_db_executor.run.return_value = []
+        result = await view.Posts.share_posts(self=mock_view_f.posts, sender=mock_user, recipient=mock_user, )
+    mock_db_executor.run.acow(mock_user.get_personal_posts, )
+    mock_view_f.posts.show_shared_posts.assert_not_called()
+    assert result is False
 
 
 async def test_ask_who_to_request_personal_posts(mock_view_f: MagicMock, ):
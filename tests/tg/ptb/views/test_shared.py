@@ -15,10 +15,11 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, Any as typing_Any
+from unittest.mock import ANY
 
 from pytest import mark as pytest_mark, fixture as pytest_fixture
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.error import TelegramError, BadRequest
 from telegram.helpers import mention_html
 from telegram import (
     InputMediaPhoto,
@@ -235,12 +236,15 @@ class TestCheckMessageExistence:
 
     @staticmethod
     async def test_exist(mock_view_f: MagicMock, ):
+        mock_view_f.bot.messages_existence.get.return_value = None
         result = await view.Shared.check_message_existence(self=mock_view_f, chat_id=1, message_id=2, )
+        mock_view_f.bot.messages_existence.get.acow(chat_id=1, message_id=2, )
         mock_view_f.bot.copy_message.acow(
             chat_id=view.PostsChannels.STORE.value,
             from_chat_id=1,
             message_id=2,
         )
+        mock_view_f.bot.messages_existence.set.acow(chat_id=1, message_id=2, exists=True, )
         mock_view_f.bot.delete_message.acow(
             chat_id=view.PostsChannels.STORE.value,
             message_id=mock_view_f.bot.copy_message.return_value.message_id,
@@ -249,10 +253,39 @@ async def test_exist(mock_view_f: MagicMock, ):
 
     @staticmethod
     async def test_not_exist(mock_view_f: MagicMock, ):
+        mock_view_f.bot.messages_existence.get.return_value = None
+        mock_view_f.bot.copy_message.side_effect = BadRequest('')
+        result = await view.Shared.check_message_existence(self=mock_view_f, chat_id=1, message_id=2, )
+        mock_view_f.bot.messages_existence.set.acow(chat_id=1, message_id=2, exists=False, )
+        assert result is False
+
+    @staticmethod
+    async def test_error(mock_view_f: MagicMock, ):
+        """Not BadRequest error is not cached"""
+        mock_view_f.bot.messages_existence.get.return_value = None
         mock_view_f.bot.copy_message.side_effect = TelegramError('')
         result = await view.Shared.check_message_existence(self=mock_view_f, chat_id=1, message_id=2, )
+        mock_view_f.bot.messages_existence.set.assert_not_called()
         assert result is False
 
+    @staticmethod
+    async def test_copy_not_deleted(mock_view_f: MagicMock, ):
+        """The message exists anyway, the left copy is logged"""
+        mock_view_f.bot.messages_existence.get.return_value = None
+        mock_view_f.bot.delete_message.side_effect = error = TelegramError('')
+        with patch_object(target=view, attribute='known_exceptions_logger', ) as mock_logger:
+            result = await view.Shared.check_message_existence(self=mock_view_f, chat_id=1, message_id=2, )
+        mock_logger.warning.acow(msg=error, exc_info=True, )
+        assert result is True
+
+    @staticmethod
+    @pytest_mark.parametrize(argnames='is_exists', argvalues=(True, False,))
+    async def test_cached(mock_view_f: MagicMock, is_exists: bool, ):
+        mock_view_f.bot.messages_existence.get.return_value = is_exists
+        result = await view.Shared.check_message_existence(self=mock_view_f, chat_id=1, message_id=2, )
+        mock_view_f.bot.copy_message.assert_not_called()
+        assert result is is_exists
+
 
 class TestInternalError:
     """test_internal_error"""
@@ -414,6 +447,24 @@ async def test_send(profile: IProfileBase, ):
         )
 
 
+    @staticmethod
+    async def test_send_default_photo(profile: IProfileBase, ):
+        with (
+            patch_object(target=profile, attribute='get_payload', ) as mock_get_payload,
+            patch_object(target=profile, attribute='prepare_photos_to_send', return_value=[], ),
+            patch_object(target=view.assets, attribute='send', ) as mock_send,
+        ):
+            mock_get_payload.return_value.photos = []
+            await view.ProfileBase.send(self=profile, )
+        mock_send.acow(path=view.ProfileBase.DEFAULT_PHOTO_PATH, send=ANY, )
+        await mock_send.call_args.kwargs['send']('file_id', )
+        profile.bot.send_media_group.acow(
+            chat_id=profile.id,
+            media=[InputMediaPhoto(media='file_id', parse_mode=ParseMode.HTML, )],
+            parse_mode=ParseMode.HTML,
+        )
+        profile.bot.send_message.assert_not_called()
+
 class TestKeyboards:
     @staticmethod
     def test_get_close_btn(mock_view_f: MagicMock, ):